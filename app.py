@@ -1,5 +1,8 @@
+import atexit
 import json
 import os
+import queue
+import threading
 import sys
 import re
 import logging
@@ -8,25 +11,178 @@ from multiprocessing import current_process, process
 import pprint
 import telegram
 import telegram.ext
-from flask import Flask, escape, redirect, request
+from flask import Flask, Response, escape, redirect, request
 
 from service.userEventStatusService import UserEventStatusService
+from service.extendedPropertiesUserEventStatusService import ExtendedPropertiesUserEventStatusService
 from service.eventFormatter import GoogleEventFormatter
 from service import calendarBotHandler as cbh
 from service import googleCalendarService as gcs
-from support.properties import BOT_TOKEN, CALENDER_ID, LOG_LEVEL, LOG_DATE_FORMAT, LOG_FORMAT, ENABLE_FLASK_SERVER
+from service.asyncGoogleCalendarService import AsyncGoogleCalendarService
+from service.calendarCallbackQueryHandler import CalendarCallbackQueryHandler
+from service.calendarIoExecutor import CalendarIoExecutor
+from service.calendarWatchService import CalendarWatchService
+from service.chatCalendarRegistry import ChatCalendarRegistry
+from service.listingSnapshotCache import ListingSnapshotCache
+from service.memoryBudget import MemoryBudget
+from service.metrics import REGISTRY
+from service.eventLoopThread import EventLoopThread
+from service.outboundMessageQueue import OutboundMessageQueue
+from service.rsvpButtons import RsvpButtons
+from service.rsvpWriteBuffer import RsvpWriteBuffer
+from service.sqliteEventStore import SqliteEventStore
+from service.renderedMessageCache import RenderedMessageCache
+from service.resilientCalendarService import ResilientCalendarService
+from service.telegramWebhookReceiver import TelegramWebhookReceiver
+from service.updateProfiler import UpdateProfiler
+from support.properties import BOT_TOKEN, CALENDER_ID, LOG_LEVEL, LOG_DATE_FORMAT, LOG_FORMAT, ENABLE_FLASK_SERVER, \
+    CALENDAR_WATCH_ADDRESS, CALENDAR_WATCH_TOKEN, CALENDAR_WATCH_TTL, CALENDAR_WATCH_RENEW_BEFORE, \
+    TELEGRAM_DELIVERY_MODE, TELEGRAM_WEBHOOK_URL, TELEGRAM_WEBHOOK_SECRET, TELEGRAM_UPDATE_QUEUE_SIZE, \
+    ENABLE_ASYNC_CALENDAR_CLIENT, CALENDAR_MAX_CONNECTIONS, CALENDAR_MAX_CONNECTIONS_PER_HOST, \
+    RSVP_WRITE_BUFFER_DELAY, RSVP_WRITE_BUFFER_MAX_PENDING, ATTENDEE_STATUS_STORE, RENDER_ATTENDEE_SUMMARY_IN_DESCRIPTION, \
+    RENDERED_MESSAGE_CACHE_SIZE, TELEGRAM_API_URL, ENABLE_OUTBOUND_MESSAGE_QUEUE, TELEGRAM_MESSAGES_PER_SECOND, \
+    TELEGRAM_CHAT_MESSAGES_PER_SECOND, TELEGRAM_CHAT_MESSAGE_BURST, TELEGRAM_GROUP_MESSAGES_PER_MINUTE, TELEGRAM_SEND_MAX_RETRIES, \
+    CHAT_CALENDARS, CHAT_CALENDARS_FILE, ADMIN_USER_IDS, CACHE_MEMORY_BUDGET_MB, PROFILE_DIR, \
+    EVENT_LIST_PAGE_SIZE, EVENT_STORE_FILE, CIRCUIT_BREAKER_FAILURES, CALENDAR_IO_WORKERS, CALENDAR_IO_MAX_PENDING, \
+    LISTING_SNAPSHOT_TTL, LISTING_SNAPSHOT_MAX_CHATS, ENABLE_RSVP_BUTTONS
 
 app = Flask(__name__)
 app.secret_key = "secretToken"
+_CACHE_HITS = REGISTRY.counter("cache_hits_total", "Cache lookups that found an entry", ("cache",))
+_CACHE_MISSES = REGISTRY.counter("cache_misses_total", "Cache lookups that found no entry", ("cache",))
+_OUTBOUND_QUEUE_DEPTH = REGISTRY.gauge("outbound_message_queue_depth", "Messages waiting to be sent", ("priority",))
+_MEMORY_BUDGET_USED = REGISTRY.gauge("cache_memory_budget_used_bytes", "Bytes charged to the shared cache memory budget")
+_CALENDAR_IO_PENDING = REGISTRY.gauge("calendar_io_pending_tasks", "Calendar tasks queued or running on the I/O workers")
+_MEMORY_BUDGET_EVICTIONS = REGISTRY.counter("cache_memory_budget_evictions_total",
+                                            "Cache entries dropped to stay within the memory budget")
 
-def startBot():
-    updater = telegram.ext.Updater(token=BOT_TOKEN, use_context=True)
-    updater.start_polling(poll_interval=1)
-    updater.dispatcher.add_handler(cbh.CalendarBotHandler(calendarService, CALENDER_ID, userEventStatusService, GoogleEventFormatter()))
+def registerMetrics(renderedMessageCache, outboundMessageQueue=None, calendarIoExecutor=None, listingSnapshotCache=None):
+    """Exposes the counters the caches and the outbound queue already keep, read when /metrics is scraped."""
+    _CACHE_HITS.labels("upcomingEvents").setFunction(lambda: calendarService.getUpcomingEventsCacheStats()["hits"])
+    _CACHE_MISSES.labels("upcomingEvents").setFunction(lambda: calendarService.getUpcomingEventsCacheStats()["misses"])
+    _CACHE_HITS.labels("renderedMessages").setFunction(lambda: renderedMessageCache.getStats()["hits"])
+    _CACHE_MISSES.labels("renderedMessages").setFunction(lambda: renderedMessageCache.getStats()["misses"])
+    if listingSnapshotCache != None:
+        _CACHE_HITS.labels("listingSnapshots").setFunction(lambda: listingSnapshotCache.getStats()["hits"])
+        _CACHE_MISSES.labels("listingSnapshots").setFunction(lambda: listingSnapshotCache.getStats()["misses"])
+    if outboundMessageQueue != None:
+        _OUTBOUND_QUEUE_DEPTH.labels("interactive").setFunction(lambda: outboundMessageQueue.getStats()["interactiveDepth"])
+        _OUTBOUND_QUEUE_DEPTH.labels("bulk").setFunction(lambda: outboundMessageQueue.getStats()["bulkDepth"])
+    if calendarIoExecutor != None:
+        _CALENDAR_IO_PENDING.setFunction(lambda: calendarIoExecutor.getStats()["pending"])
+    if memoryBudget != None:
+        _MEMORY_BUDGET_USED.setFunction(lambda: memoryBudget.getStats()["usedBytes"])
+        _MEMORY_BUDGET_EVICTIONS.setFunction(lambda: memoryBudget.getStats()["evictions"])
+
+def startBot(botToken=BOT_TOKEN, calendarId=CALENDER_ID, telegramApiUrl=TELEGRAM_API_URL, pollInterval=1,
+             chatCalendarRegistry=None):
+    """Starts handling bot commands and returns the updater or dispatcher so it can be stopped.
+
+    Chats use calendarId unless chatCalendarRegistry links them to another calendar.
+    """
+    if chatCalendarRegistry == None:
+        chatCalendarRegistry = ChatCalendarRegistry(calendarId)
+    renderedMessageCache = RenderedMessageCache(RENDERED_MESSAGE_CACHE_SIZE, memoryBudget)
+    calendarService.addInvalidationListener(renderedMessageCache.invalidateCalendar)
+    outboundMessageQueue = None
+    if ENABLE_OUTBOUND_MESSAGE_QUEUE:
+        outboundMessageQueue = OutboundMessageQueue(TELEGRAM_MESSAGES_PER_SECOND, TELEGRAM_CHAT_MESSAGES_PER_SECOND,
+                                                    TELEGRAM_CHAT_MESSAGE_BURST, TELEGRAM_GROUP_MESSAGES_PER_MINUTE,
+                                                    TELEGRAM_SEND_MAX_RETRIES)
+    # a slow Google call in one chat then does not hold up the other chats' commands
+    calendarIoExecutor = CalendarIoExecutor(CALENDAR_IO_WORKERS, CALENDAR_IO_MAX_PENDING) if CALENDAR_IO_WORKERS > 0 \
+        else None
+    listingSnapshotCache = ListingSnapshotCache(LISTING_SNAPSHOT_TTL, LISTING_SNAPSHOT_MAX_CHATS) \
+        if LISTING_SNAPSHOT_TTL > 0 else None
+    registerMetrics(renderedMessageCache, outboundMessageQueue, calendarIoExecutor, listingSnapshotCache)
+    updateProfiler = UpdateProfiler(PROFILE_DIR) if len(ADMIN_USER_IDS) > 0 else None
+    rsvpButtons = RsvpButtons() if ENABLE_RSVP_BUTTONS else None
+    if ENABLE_ASYNC_CALENDAR_CLIENT:
+        # one token, refreshed and saved by calendarService, for both clients
+        asyncCalendarService = AsyncGoogleCalendarService(userEventStatusService, CALENDAR_MAX_CONNECTIONS,
+                                                          CALENDAR_MAX_CONNECTIONS_PER_HOST,
+                                                          credentialSource=calendarService)
+        eventLoopThread = EventLoopThread()
+        handler = cbh.CalendarBotHandler(asyncCalendarService, calendarId, userEventStatusService, GoogleEventFormatter(),
+                                         eventLoopThread=eventLoopThread, renderedMessageCache=renderedMessageCache,
+                                         outboundMessageQueue=outboundMessageQueue, chatCalendarRegistry=chatCalendarRegistry,
+                                         adminUserIds=ADMIN_USER_IDS, updateProfiler=updateProfiler,
+                                         calendarIoExecutor=calendarIoExecutor, listingSnapshotCache=listingSnapshotCache,
+                                         rsvpButtons=rsvpButtons)
+        callbackQueryHandler = CalendarCallbackQueryHandler(asyncCalendarService, calendarId, rsvpButtons,
+                                                            eventLoopThread=eventLoopThread,
+                                                            chatCalendarRegistry=chatCalendarRegistry,
+                                                            calendarIoExecutor=calendarIoExecutor)
+    else:
+        # handlers get bounded retries, a circuit breaker and the last good events during Google outages
+        handlerCalendarService = ResilientCalendarService(calendarService) if CIRCUIT_BREAKER_FAILURES > 0 \
+            else calendarService
+        rsvpWriteBuffer = None
+        if RSVP_WRITE_BUFFER_DELAY > 0:
+            rsvpWriteBuffer = RsvpWriteBuffer(handlerCalendarService, RSVP_WRITE_BUFFER_DELAY,
+                                              RSVP_WRITE_BUFFER_MAX_PENDING)
+        handler = cbh.CalendarBotHandler(handlerCalendarService, calendarId, userEventStatusService, GoogleEventFormatter(),
+                                         rsvpWriteBuffer=rsvpWriteBuffer, renderedMessageCache=renderedMessageCache,
+                                         outboundMessageQueue=outboundMessageQueue, chatCalendarRegistry=chatCalendarRegistry,
+                                         adminUserIds=ADMIN_USER_IDS, updateProfiler=updateProfiler,
+                                         calendarIoExecutor=calendarIoExecutor, listingSnapshotCache=listingSnapshotCache,
+                                         rsvpButtons=rsvpButtons)
+        callbackQueryHandler = CalendarCallbackQueryHandler(handlerCalendarService, calendarId, rsvpButtons,
+                                                            rsvpWriteBuffer=rsvpWriteBuffer,
+                                                            chatCalendarRegistry=chatCalendarRegistry,
+                                                            calendarIoExecutor=calendarIoExecutor)
+    # button presses only arrive when the listings carry buttons
+    handlers = [handler, callbackQueryHandler] if rsvpButtons != None else [handler]
+    if TELEGRAM_DELIVERY_MODE == "webhook":
+        return startWebhookBot(handlers, botToken, telegramApiUrl)
+    updater = telegram.ext.Updater(token=botToken, base_url=telegramApiUrl, use_context=True)
+    updater.start_polling(poll_interval=pollInterval)
+    for handler in handlers:
+        updater.dispatcher.add_handler(handler)
+    return updater
+
+def startWebhookBot(handlers, botToken=BOT_TOKEN, telegramApiUrl=TELEGRAM_API_URL, webhookUrl=TELEGRAM_WEBHOOK_URL,
+                    webhookSecret=TELEGRAM_WEBHOOK_SECRET):
+    global telegramWebhookReceiver
+    # checked before anything starts, Telegram would otherwise be sent a webhook nobody can reach
+    if not webhookUrl:
+        raise ValueError("TELEGRAM_WEBHOOK_URL must be set to the bot's public https address in webhook mode")
+    if not webhookSecret:
+        raise ValueError("TELEGRAM_WEBHOOK_SECRET must be set to a hard to guess path in webhook mode")
+    bot = telegram.Bot(botToken, base_url=telegramApiUrl)
+    updateQueue = queue.Queue(maxsize=TELEGRAM_UPDATE_QUEUE_SIZE)
+    dispatcher = telegram.ext.Dispatcher(bot, updateQueue, use_context=True)
+    for handler in handlers:
+        dispatcher.add_handler(handler)
+    threading.Thread(target=dispatcher.start, name="dispatcher", daemon=True).start()
+
+    telegramWebhookReceiver = TelegramWebhookReceiver(bot, updateQueue, webhookSecret)
+    bot.set_webhook(url="%s/telegram/%s" % (webhookUrl.rstrip("/"), webhookSecret))
+    return dispatcher
+
+@app.route("/telegram/<secretPath>", methods=["POST"])
+def telegramWebhook(secretPath):
+    if telegramWebhookReceiver == None:
+        return "", 404
+    return "", telegramWebhookReceiver.receive(secretPath, request.get_json(silent=True))
 
 @app.route("/test")
 def test():
-    return pprint.pformat(calendarService.getCalendarEvents(CALENDER_ID))
+    # streamed page by page so memory stays flat however large the calendar is
+    events = calendarService.iterCalendarEvents(CALENDER_ID, pageSize=EVENT_LIST_PAGE_SIZE)
+    return Response((pprint.pformat(event) + "\n" for event in events), mimetype="text/plain")
+
+@app.route("/metrics")
+def metrics():
+    if not REGISTRY.enabled:
+        return "", 404
+    return REGISTRY.render(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
+@app.route("/calendarNotifications", methods=["POST"])
+def calendarNotifications():
+    if calendarWatchService == None:
+        return "", 404
+    return "", calendarWatchService.handleNotification(request.headers)
 
 @app.route('/auth')
 def authorize():
@@ -51,15 +207,37 @@ def configureLogger():
         level=logging.INFO
         )
 
+calendarWatchService = None
+telegramWebhookReceiver = None
+memoryBudget = None
+
 if __name__ == '__main__':
     # This allows us to use a plain HTTP callback
     os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = "1"
 
     if current_process().name == "MainProcess":
-        userEventStatusService = UserEventStatusService()
-        calendarService = gcs.GoogleCalendarService(userEventStatusService)
+        if ATTENDEE_STATUS_STORE == "extendedProperties":
+            userEventStatusService = ExtendedPropertiesUserEventStatusService(RENDER_ATTENDEE_SUMMARY_IN_DESCRIPTION)
+        else:
+            userEventStatusService = UserEventStatusService()
+        # every chat's calendar is served by the same service, caches and connection pool
+        memoryBudget = MemoryBudget(CACHE_MEMORY_BUDGET_MB * 1024 * 1024)
+        # calendars are served from the store when Google is unavailable and after a restart
+        eventStore = SqliteEventStore(EVENT_STORE_FILE, userEventStatusService.getAttendeeStatusStringForEvent) \
+            if EVENT_STORE_FILE else None
+        calendarService = gcs.GoogleCalendarService(userEventStatusService, memoryBudget=memoryBudget,
+                                                    eventStore=eventStore)
+        # once the bot's own threads have finished
+        atexit.register(calendarService.close)
+        chatCalendarRegistry = ChatCalendarRegistry(CALENDER_ID, CHAT_CALENDARS_FILE,
+                                                    ChatCalendarRegistry.parseMapping(CHAT_CALENDARS))
+        if CALENDAR_WATCH_ADDRESS:
+            calendarWatchService = CalendarWatchService(calendarService, CALENDAR_WATCH_ADDRESS, CALENDAR_WATCH_TOKEN,
+                                                        CALENDAR_WATCH_TTL, CALENDAR_WATCH_RENEW_BEFORE)
+            calendarWatchService.start(chatCalendarRegistry.getCalendarIds())
+            chatCalendarRegistry.addListener(lambda chatId, calendarId: calendarWatchService.ensureWatched(calendarId))
         if not ENABLE_FLASK_SERVER:
-            startBot()
+            startBot(chatCalendarRegistry=chatCalendarRegistry)
 
     configureLogger()
     LOG = logging.getLogger(__name__)
@@ -68,3 +246,6 @@ if __name__ == '__main__':
     # for your API project in the Google API Console.
     if ENABLE_FLASK_SERVER:
         app.run('0.0.0.0', 8080, debug=True)
+    elif calendarWatchService != None or telegramWebhookReceiver != None or REGISTRY.enabled:
+        # webhooks and /metrics still need an HTTP endpoint while the bot is running
+        app.run('0.0.0.0', 8080)
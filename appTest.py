@@ -0,0 +1,99 @@
+import app
+from service.calendarWatchService import CalendarWatchService
+from service.calendarBotHandler import CalendarBotHandler
+from service.eventFormatter import GoogleEventFormatter
+from service.telegramWebhookReceiver import TelegramWebhookReceiver
+from service.userEventStatusService import UserEventStatusService
+from service.metrics import REGISTRY
+import unittest
+from unittest import mock
+import json
+import queue
+import telegram.ext
+
+class AppTest(unittest.TestCase):
+
+    def setUp(self):
+        with open("./service/calendarNotificationsTest.json") as notificationsText:
+            self.notifications = json.load(notificationsText)
+        self.calendarService = mock.MagicMock()
+        self.calendarService.watchCalendar.return_value = {
+            "resourceId": self.notifications[0]["X-Goog-Resource-ID"],
+            "expiration": "1792869631000"
+        }
+        app.calendarWatchService = CalendarWatchService(self.calendarService, "https://bot/calendarNotifications",
+                                                        "channelToken", 604800, 3600)
+        with mock.patch("service.calendarWatchService.uuid.uuid4", return_value=self.notifications[0]["X-Goog-Channel-ID"]):
+            app.calendarWatchService.registerChannel("calendarId")
+        self.client = app.app.test_client()
+
+        with open("./service/telegramUpdateTest.json") as updateText:
+            self.update = json.load(updateText)
+        self.bot = mock.MagicMock()
+        self.bot.username = "botName"
+        self.bot.name = "@botName"
+        self.updateQueue = queue.Queue(maxsize=1)
+        app.telegramWebhookReceiver = TelegramWebhookReceiver(self.bot, self.updateQueue, "secretPath")
+
+    def tearDown(self):
+        app.calendarWatchService = None
+        app.telegramWebhookReceiver = None
+
+    def test_recorded_calendar_notifications(self):
+        for notification in self.notifications:
+            response = self.client.post("/calendarNotifications", headers=notification)
+            self.assertEqual(response.status_code, 200)
+
+        app.calendarWatchService.stop()
+        self.calendarService.refreshCalendar.assert_called_once_with("calendarId")
+
+    def test_calendar_notification_with_invalid_token(self):
+        notification = dict(self.notifications[1], **{"X-Goog-Channel-Token": "invalid"})
+        response = self.client.post("/calendarNotifications", headers=notification)
+        self.assertEqual(response.status_code, 403)
+
+    def test_telegram_update_is_dispatched_to_handler(self):
+        response = self.client.post("/telegram/secretPath", json=self.update)
+        self.assertEqual(response.status_code, 200)
+
+        dispatcher = telegram.ext.Dispatcher(self.bot, self.updateQueue, use_context=True)
+        dispatcher.add_handler(CalendarBotHandler(mock.MagicMock(), "calendarId", UserEventStatusService(), GoogleEventFormatter()))
+        dispatcher.process_update(self.updateQueue.get_nowait())
+
+        chatId = self.update["message"]["chat"]["id"]
+        self.assertEqual(self.bot.send_message.call_args.args[0], chatId)
+        self.assertTrue(self.bot.send_message.call_args.args[1].startswith("I currently support the following commands"))
+
+    def test_telegram_update_with_wrong_secret_path(self):
+        response = self.client.post("/telegram/wrongSecret", json=self.update)
+        self.assertEqual(response.status_code, 404)
+        self.assertTrue(self.updateQueue.empty())
+
+    def test_telegram_update_rejected_when_queue_is_full(self):
+        self.assertEqual(self.client.post("/telegram/secretPath", json=self.update).status_code, 200)
+        self.assertEqual(self.client.post("/telegram/secretPath", json=self.update).status_code, 503)
+        self.assertEqual(self.client.post("/telegram/secretPath", data="not json").status_code, 400)
+
+    @mock.patch("app.telegram.Bot")
+    def test_webhook_bot_requires_url_and_secret(self, mockBot):
+        with self.assertRaisesRegex(ValueError, "TELEGRAM_WEBHOOK_URL"):
+            app.startWebhookBot([], "botToken", webhookUrl=None, webhookSecret="secretPath")
+        with self.assertRaisesRegex(ValueError, "TELEGRAM_WEBHOOK_SECRET"):
+            app.startWebhookBot([], "botToken", webhookUrl="https://bot/", webhookSecret=None)
+        mockBot.assert_not_called()
+
+    def test_metrics_are_served_when_enabled(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 404)
+        with mock.patch.object(REGISTRY, "enabled", True):
+            REGISTRY.counter("bot_test_total", "Counted by the test").inc()
+            response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith("text/plain; version=0.0.4"))
+        self.assertIn("bot_test_total 1", response.get_data(as_text=True).splitlines())
+
+    def test_test_endpoint_streams_events(self):
+        app.calendarService = mock.MagicMock()
+        app.calendarService.iterCalendarEvents.return_value = iter([{"id": "1"}, {"id": "2"}])
+        response = self.client.get("/test")
+        self.assertEqual(response.get_data(as_text=True), "{'id': '1'}\n{'id': '2'}\n")
+        del app.calendarService
@@ -0,0 +1,46 @@
+"""Generated calendar data for the benchmarks, derived from service/eventResponseTest.json."""
+import copy
+import json
+from datetime import datetime, timedelta
+from service.userEventStatusService import UserEventStatusService
+from service.googleCalendarService import _GOING, _NOT, _UNDECIDED
+
+_STATUSES = [_GOING, _NOT, _UNDECIDED]
+
+def loadTemplateEvents():
+    with open("./service/eventResponseTest.json") as eventResponseText:
+        return json.load(eventResponseText)["items"]
+
+def _shift_time(time, days):
+    shifted = dict(time)
+    if "dateTime" in time:
+        start = datetime.strptime(time["dateTime"], "%Y-%m-%dT%H:%M:%S%z") + timedelta(days=days)
+        shifted["dateTime"] = start.strftime("%Y-%m-%dT%H:%M:%S%z")
+        shifted["dateTime"] = shifted["dateTime"][:-2] + ":" + shifted["dateTime"][-2:]
+    else:
+        start = datetime.strptime(time["date"], "%Y-%m-%d") + timedelta(days=days)
+        shifted["date"] = start.strftime("%Y-%m-%d")
+    return shifted
+
+def generateEvents(count, startingFrom=None):
+    """Repeats the template events a day apart, moved to start on the date startingFrom when given."""
+    templates = loadTemplateEvents()
+    dayOffset = 0
+    if startingFrom != None:
+        firstStart = templates[0]["start"]
+        firstDay = datetime.strptime(firstStart.get("dateTime", firstStart.get("date"))[:10], "%Y-%m-%d").date()
+        dayOffset = (startingFrom - firstDay).days
+    events = []
+    for i in range(count):
+        event = copy.deepcopy(templates[i % len(templates)])
+        days = dayOffset + i // len(templates)
+        event["id"] = "%s%d" % (event["id"], i)
+        event["etag"] = "\"%d\"" % i
+        event["start"] = _shift_time(event["start"], days)
+        event["end"] = _shift_time(event["end"], days)
+        events.append(event)
+    return events
+
+def generateDescriptionWithAttendees(attendeeCount):
+    userStatuses = {"User %d" % i: _STATUSES[i % len(_STATUSES)] for i in range(attendeeCount)}
+    return UserEventStatusService().getUpdatedDescToUpdateUserStatuses("description.", userStatuses)
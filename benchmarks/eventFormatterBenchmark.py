@@ -0,0 +1,77 @@
+"""Per event cost of formatting /upcoming lines before and after parsing events once.
+
+Run from the repository root: python -m benchmarks.eventFormatterBenchmark
+"""
+import json
+import timeit
+from datetime import datetime
+from service.calendarEvent import CalendarEvent
+from service.eventFormatter import GoogleEventFormatter
+
+class LegacyGoogleEventFormatter(object):
+    """GoogleEventFormatter as it was before CalendarEvent, parsing the times on every call."""
+
+    def isAllDayEvent(self, event):
+        return 'date' in event['start']
+
+    def isStartAndEndOnSameDate(self, event):
+        return self.getFormattedStartDate(event) == self.getFormattedEndDate(event)
+
+    def getTime(self, event, key):
+        time = None
+        if 'dateTime' in event[key]:
+            time = datetime.strptime(event[key]['dateTime'], "%Y-%m-%dT%H:%M:%S%z")
+        elif 'date' in event[key]:
+            time = datetime.strptime(event[key]['date'], "%Y-%m-%d")
+        return time
+
+    def getSummaryWLinkTelegram(self, event):
+        return "[%s](%s)" % (event['summary'], event['htmlLink'])
+
+    def getFormattedStartDate(self, event):
+        return self.getTime(event, 'start').strftime("%m/%d/%Y")
+
+    def getFormattedEndDate(self, event):
+        return self.getTime(event, 'end').strftime("%m/%d/%Y")
+
+    def getFormattedStartTime(self, event):
+        return self.getTime(event, 'start').strftime("%I:%M:%S%p")
+
+    def getFormattedEndTime(self, event):
+        return self.getTime(event, 'end').strftime("%I:%M:%S%p")
+
+    def getFormattedDateOrDatesForEvent(self, index, event):
+        eventFormatted = str(index + 1) + ". " + self.getSummaryWLinkTelegram(event) + " - " + self.getFormattedStartDate(event)
+        if not self.isStartAndEndOnSameDate(event):
+            eventFormatted += " to " + self.getFormattedEndDate(event)
+
+        if not self.isAllDayEvent(event):
+            eventFormatted += "\n\t\t\t\t\t\t\t" + self.getFormattedStartTime(event) + " - " + self.getFormattedEndTime(event)
+
+        return eventFormatted
+
+def loadEvents():
+    with open("./service/eventResponseTest.json") as eventResponseText:
+        return json.load(eventResponseText)["items"]
+
+def timePerEvent(function, events, repeat=5, number=200):
+    best = min(timeit.repeat(function, repeat=repeat, number=number))
+    return best / (number * len(events))
+
+def main():
+    events = loadEvents()
+    legacyFormatter = LegacyGoogleEventFormatter()
+    formatter = GoogleEventFormatter()
+
+    before = timePerEvent(lambda: [legacyFormatter.getFormattedDateOrDatesForEvent(i, e) for i, e in enumerate(events)], events)
+    after = timePerEvent(lambda: [formatter.getFormattedDateOrDatesForEvent(i, CalendarEvent.fromGoogleEvent(e))
+                                  for i, e in enumerate(events)], events)
+    models = [CalendarEvent.fromGoogleEvent(e) for e in events]
+    parsed = timePerEvent(lambda: [formatter.getFormattedDateOrDatesForEvent(i, e) for i, e in enumerate(models)], events)
+
+    print("parse on every call (before):   %7.2f us/event" % (before * 1e6))
+    print("parse once then format (after): %7.2f us/event" % (after * 1e6))
+    print("format already parsed events:   %7.2f us/event" % (parsed * 1e6))
+
+if __name__ == '__main__':
+    main()
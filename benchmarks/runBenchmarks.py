@@ -0,0 +1,146 @@
+"""Times the bot's hot paths and compares them against saved baseline results.
+
+Run from the repository root:
+    python -m benchmarks.runBenchmarks --save-baseline   # record the current timings
+    python -m benchmarks.runBenchmarks                   # fail if a case got slower than the threshold
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+from types import SimpleNamespace
+
+from benchmarks.benchmarkData import generateEvents, generateDescriptionWithAttendees
+from service.calendarBotHandler import CalendarBotHandler
+from service.calendarEvent import CalendarEvent
+from service.eventFormatter import GoogleEventFormatter
+from service.googleCalendarService import _GOING
+from service.userEventStatusService import UserEventStatusService
+
+_DEFAULT_BASELINE_FILE = os.path.join(os.path.dirname(__file__), "baseline.json")
+_DEFAULT_THRESHOLD = 0.25
+# keep each case's measurement around this many seconds
+_TARGET_RUN_TIME = 0.2
+
+class _StubCalendarService(object):
+    def __init__(self, events):
+        self._events = events
+
+    def getUpcomingEvents(self, calendarId):
+        return self._events
+
+    def setGoingToEvent(self, calendarId, eventId, usersName, event=None):
+        pass
+
+    def setNotGoingToEvent(self, calendarId, eventId, usersName, event=None):
+        pass
+
+    def setUndecidedAboutEvent(self, calendarId, eventId, usersName, event=None):
+        pass
+
+    def quickCreateEvent(self, calendarId, quickCreateString):
+        return {"summary": quickCreateString, "htmlLink": "htmlLink"}
+
+def _handler_cases():
+    handler = CalendarBotHandler(_StubCalendarService(generateEvents(10)), "calendarId",
+                                 UserEventStatusService(), GoogleEventFormatter())
+    bot = SimpleNamespace(name="@botName", send_message=lambda *args, **kwargs: None)
+    commands = ["/upcoming", "/going 2", "/not 2", "/undecided 2", "/details 2", "/create Event on Friday 1-2pm", "/help"]
+
+    cases = {}
+    for command in commands:
+        update = SimpleNamespace(effective_chat=SimpleNamespace(id="chatId"),
+                                 effective_message=SimpleNamespace(text=command),
+                                 effective_user=SimpleNamespace(full_name="full name"))
+        context = SimpleNamespace(bot=bot, args=command.split()[1:])
+        name = "handler_callback[%s]" % command.split()[0][1:]
+        cases[name] = (lambda update=update, context=context: handler._callback(update, context))
+    return cases
+
+def _formatter_cases(sizes):
+    formatter = GoogleEventFormatter()
+    cases = {}
+    for size in sizes:
+        events = generateEvents(size)
+        cases["formatter_upcoming[%d]" % size] = (lambda events=events: [
+            formatter.getFormattedDateOrDatesForEvent(index, CalendarEvent.fromGoogleEvent(event))
+            for index, event in enumerate(events)])
+    return cases
+
+def _attendee_cases(sizes):
+    userEventStatusService = UserEventStatusService()
+    cases = {}
+    for size in sizes:
+        description = generateDescriptionWithAttendees(size)
+        # update a user in the middle of the list so the lookup is not trivially short
+        usersName = "User %d" % (size // 2)
+        cases["attendee_update[%d]" % size] = (lambda description=description, usersName=usersName:
+            userEventStatusService.getUpdatedDescToUpdateUserStatus(description, usersName, _GOING))
+    return cases
+
+def getCases(formatterSizes=(10, 1000, 100000), attendeeSizes=(1, 10, 100, 1000, 10000)):
+    cases = {}
+    cases.update(_handler_cases())
+    cases.update(_formatter_cases(formatterSizes))
+    cases.update(_attendee_cases(attendeeSizes))
+    return cases
+
+def timeCase(function, repeat=5):
+    """Returns the best seconds per call out of `repeat` runs."""
+    timer = timeit.Timer(function)
+    number, elapsed = timer.autorange()
+    if elapsed / number > _TARGET_RUN_TIME * repeat:
+        # a single call already takes seconds, repeating it would not make the result much more reliable
+        return elapsed / number
+    number = max(1, int(number * _TARGET_RUN_TIME / max(elapsed, 1e-9)))
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+def compare(results, baseline, threshold):
+    """Returns the names of the cases that are slower than the baseline by more than threshold."""
+    regressions = []
+    for name, seconds in sorted(results.items()):
+        if name not in baseline:
+            print("%-40s %12.2f us  (no baseline)" % (name, seconds * 1e6))
+            continue
+        change = seconds / baseline[name] - 1
+        regressed = change > threshold
+        print("%-40s %12.2f us  %+7.1f%%%s" % (name, seconds * 1e6, change * 100, "  REGRESSION" if regressed else ""))
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--baseline", default=_DEFAULT_BASELINE_FILE, help="baseline results file")
+    parser.add_argument("--save-baseline", action="store_true", help="save the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=_DEFAULT_THRESHOLD,
+                        help="allowed slowdown before a case counts as a regression (0.25 = 25%%)")
+    parser.add_argument("--filter", default="", help="only run cases whose name contains this text")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name, function in getCases().items():
+        if args.filter in name:
+            results[name] = timeCase(function)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as baselineFile:
+            baseline = json.load(baselineFile)
+    regressions = compare(results, baseline, args.threshold)
+
+    if args.save_baseline:
+        baseline.update(results)
+        with open(args.baseline, "w+") as baselineFile:
+            json.dump(baseline, baselineFile, indent=4, sort_keys=True)
+        print("Saved baseline to %s" % args.baseline)
+        return 0
+
+    if len(regressions) > 0:
+        print("%d case(s) regressed by more than %d%%" % (len(regressions), args.threshold * 100))
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,174 @@
+import copy
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+
+from loadtest.fakeHttpServer import FakeHttpServer, FakeResponse
+from service.calendarMirror import _get_event_time
+
+_DEFAULT_PAGE_SIZE = 250
+_DATE_TIME_FORMAT = "%Y-%m-%dT%H:%M:%S%z"
+
+def _format_date_time(time):
+    formatted = time.strftime(_DATE_TIME_FORMAT)
+    return formatted[:-2] + ":" + formatted[-2:]
+
+def _parse_time_min(timeMin):
+    return datetime.fromisoformat(timeMin.replace("Z", "+00:00")).astimezone(timezone.utc)
+
+def parseFields(fields):
+    """Parses a partial response selector like "items(id,start),nextPageToken" into nested dicts."""
+    selection, position = _parse_field_list(fields, 0)
+    return selection
+
+def _parse_field_list(fields, position):
+    selection = {}
+    name = ""
+    while position < len(fields):
+        character = fields[position]
+        position += 1
+        if character == "(":
+            selection[name.strip()], position = _parse_field_list(fields, position)
+            name = ""
+        elif character == ")":
+            break
+        elif character == ",":
+            if name.strip():
+                selection[name.strip()] = None
+            name = ""
+        else:
+            name += character
+    if name.strip():
+        selection[name.strip()] = None
+    return selection, position
+
+def project(value, selection):
+    """Keeps only the selected fields of value, applying the selection to every element of lists."""
+    if isinstance(value, list):
+        return [project(element, selection) for element in value]
+    if not isinstance(value, dict):
+        return value
+    return {name: value[name] if subSelection == None else project(value[name], subSelection)
+            for name, subSelection in selection.items() if name in value}
+
+class FakeGoogleCalendarServer(FakeHttpServer):
+    """The Calendar v3 events endpoints GoogleCalendarService uses, kept in memory.
+
+    Point the service at it with baseUrl=server.url + "/calendar/v3".
+    """
+    routes = [
+        ("GET", r"/calendar/v3/calendars/([^/]+)/events", "listEvents"),
+        ("POST", r"/calendar/v3/calendars/([^/]+)/events/quickAdd", "quickAddEvent"),
+        ("GET", r"/calendar/v3/calendars/([^/]+)/events/([^/]+)", "getEvent"),
+        ("PATCH", r"/calendar/v3/calendars/([^/]+)/events/([^/]+)", "patchEvent")
+    ]
+
+    def __init__(self, latencySeconds=0, errorRate=0, seed=None):
+        super().__init__(latencySeconds, errorRate, seed)
+        self._lock = threading.Lock()
+        self._calendars = {}
+        # every change gets the next sequence number, sync tokens are the last number a client has seen
+        self._sequence = 0
+        self._sequences = {}
+
+    @property
+    def calendarApiUrl(self):
+        return self.url + "/calendar/v3"
+
+    def dispatch(self, method, path, query, headers, body):
+        response = super().dispatch(method, path, query, headers, body)
+        if "fields" in query and response.status < 400 and response.body != None:
+            response.body = project(response.body, parseFields(query["fields"]))
+        return response
+
+    def shouldCompress(self, headers):
+        # like Google, responses are only gzipped for user agents that mention gzip
+        return "gzip" in headers.get("Accept-Encoding", "") and "gzip" in headers.get("User-Agent", "")
+
+    def _store(self, calendarId, event):
+        self._sequence += 1
+        event["etag"] = "\"%d\"" % self._sequence
+        event["updated"] = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+        self._calendars.setdefault(calendarId, {})[event["id"]] = event
+        self._sequences[(calendarId, event["id"])] = self._sequence
+
+    def addEvents(self, calendarId, events):
+        with self._lock:
+            for event in events:
+                self._store(calendarId, copy.deepcopy(event))
+
+    def getStoredEvent(self, calendarId, eventId):
+        with self._lock:
+            return copy.deepcopy(self._calendars.get(calendarId, {}).get(eventId))
+
+    def _not_found(self):
+        return FakeResponse(404, {"error": {"code": 404, "message": "Not Found"}})
+
+    def listEvents(self, query, headers, body, calendarId):
+        with self._lock:
+            events = list(self._calendars.get(calendarId, {}).values())
+            if "syncToken" in query:
+                if not query["syncToken"].isdigit() or int(query["syncToken"]) > self._sequence:
+                    return FakeResponse(410, {"error": {"code": 410, "message": "Sync token is no longer valid"}})
+                events = [event for event in events
+                          if self._sequences[(calendarId, event["id"])] > int(query["syncToken"])]
+            syncToken = str(self._sequence)
+
+        if "timeMin" in query:
+            timeMin = _parse_time_min(query["timeMin"])
+            events = [event for event in events if _get_event_time(event, "end") > timeMin]
+        if "timeMax" in query:
+            timeMax = _parse_time_min(query["timeMax"])
+            events = [event for event in events if _get_event_time(event, "start") < timeMax]
+        if query.get("orderBy") == "startTime":
+            events.sort(key=lambda event: _get_event_time(event, "start"))
+
+        start = int(query.get("pageToken", 0))
+        end = start + int(query.get("maxResults", _DEFAULT_PAGE_SIZE))
+        page = {"kind": "calendar#events", "items": copy.deepcopy(events[start:end])}
+        if end < len(events) and "orderBy" not in query:
+            page["nextPageToken"] = str(end)
+        elif "orderBy" not in query:
+            page["nextSyncToken"] = syncToken
+        return FakeResponse(200, page)
+
+    def getEvent(self, query, headers, body, calendarId, eventId):
+        event = self.getStoredEvent(calendarId, eventId)
+        return FakeResponse(200, event) if event != None else self._not_found()
+
+    def patchEvent(self, query, headers, body, calendarId, eventId):
+        eventUpdate = json.loads(body)
+        with self._lock:
+            event = self._calendars.get(calendarId, {}).get(eventId)
+            if event == None:
+                return self._not_found()
+            if "If-Match" in headers and headers["If-Match"] != event["etag"]:
+                return FakeResponse(412, {"error": {"code": 412, "message": "Precondition Failed"}})
+
+            event = copy.deepcopy(event)
+            for key, value in eventUpdate.items():
+                if key == "extendedProperties":
+                    # PATCH merges the properties instead of replacing them
+                    for scope, properties in value.items():
+                        event.setdefault(key, {}).setdefault(scope, {}).update(properties)
+                else:
+                    event[key] = value
+            self._store(calendarId, event)
+            return FakeResponse(200, copy.deepcopy(event))
+
+    def quickAddEvent(self, query, headers, body, calendarId):
+        # the text is not parsed, every quick added event is an hour long and starts tomorrow
+        start = (datetime.now(timezone.utc) + timedelta(days=1)).replace(microsecond=0)
+        with self._lock:
+            eventId = "quickadd%d" % (self._sequence + 1)
+            event = {
+                "kind": "calendar#event",
+                "id": eventId,
+                "status": "confirmed",
+                "htmlLink": "https://calendar.example.com/event?eid=%s" % eventId,
+                "summary": query.get("text", ""),
+                "start": {"dateTime": _format_date_time(start)},
+                "end": {"dateTime": _format_date_time(start + timedelta(hours=1))}
+            }
+            self._store(calendarId, event)
+            return FakeResponse(200, copy.deepcopy(event))
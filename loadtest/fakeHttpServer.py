@@ -0,0 +1,140 @@
+import gzip
+import json
+import logging
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl, unquote
+
+LOG = logging.getLogger(__name__)
+
+class FakeResponse(object):
+    def __init__(self, status, body=None, headers=None):
+        self.status = status
+        self.body = body
+        self.headers = headers if headers != None else {}
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # headers and body are written separately, without this every response waits on a delayed ACK
+    disable_nagle_algorithm = True
+
+    def _handle(self):
+        url = urlsplit(self.path)
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length) if length > 0 else b""
+        response = self.server.fakeServer.dispatch(self.command, url.path, dict(parse_qsl(url.query)), self.headers, body)
+
+        content = json.dumps(response.body).encode("utf-8") if response.body != None else b""
+        compress = len(content) > 0 and self.server.fakeServer.shouldCompress(self.headers)
+        if compress:
+            content = gzip.compress(content)
+        self.send_response(response.status)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        if compress:
+            self.send_header("Content-Encoding", "gzip")
+        for name, value in response.headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        # counted first so a client reading the stats after its response sees it
+        self.server.fakeServer.recordBytesSent(len(content))
+        self.wfile.write(content)
+
+    do_GET = _handle
+    do_POST = _handle
+    do_PATCH = _handle
+    do_PUT = _handle
+    do_DELETE = _handle
+
+    def log_message(self, format, *args):
+        LOG.debug(format % args)
+
+class FakeHttpServer(object):
+    """Serves an API on a local port from a background thread, adding latency and errors when asked to.
+
+    Subclasses list their endpoints in routes as (method, path regex, method name). The named method
+    is called with the query parameters, headers, body and the groups matched in the path.
+    """
+    routes = []
+
+    def __init__(self, latencySeconds=0, errorRate=0, seed=None):
+        self.latencySeconds = latencySeconds
+        self.errorRate = errorRate
+        self._random = random.Random(seed)
+        self._randomLock = threading.Lock()
+        self._statsLock = threading.Lock()
+        self._requestCounts = Counter()
+        self._errorCounts = Counter()
+        self._bytesSent = 0
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return "http://%s:%d" % (host, port)
+
+    def start(self):
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _RequestHandler)
+        self._server.daemon_threads = True
+        self._server.fakeServer = self
+        self._thread = threading.Thread(target=self._server.serve_forever, name=type(self).__name__, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server != None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _should_fail(self):
+        with self._randomLock:
+            return self.errorRate > 0 and self._random.random() < self.errorRate
+
+    def dispatch(self, method, path, query, headers, body):
+        for routeMethod, pattern, endpoint in self.routes:
+            match = re.fullmatch(pattern, path)
+            if routeMethod == method and match != None:
+                break
+        else:
+            return FakeResponse(404, {"error": {"code": 404, "message": "Not Found"}})
+
+        if self.latencySeconds > 0:
+            time.sleep(self.latencySeconds)
+        with self._statsLock:
+            self._requestCounts[endpoint] += 1
+        if self._should_fail():
+            with self._statsLock:
+                self._errorCounts[endpoint] += 1
+            return self.errorResponse()
+        return getattr(self, endpoint)(query, headers, body, *[unquote(group) for group in match.groups()])
+
+    def recordBytesSent(self, count):
+        with self._statsLock:
+            self._bytesSent += count
+
+    def shouldCompress(self, headers):
+        """Whether the response to a request with these headers is gzipped."""
+        return False
+
+    def errorResponse(self):
+        return FakeResponse(503, {"error": {"code": 503, "message": "Injected error"}})
+
+    def getStats(self):
+        with self._statsLock:
+            return {
+                "requests": dict(self._requestCounts),
+                "errors": dict(self._errorCounts),
+                "bytesSent": self._bytesSent
+            }
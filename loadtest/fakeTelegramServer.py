@@ -0,0 +1,116 @@
+import json
+import threading
+import time
+
+from loadtest.fakeHttpServer import FakeHttpServer, FakeResponse
+
+_BOT_USER = {"id": 100000, "is_bot": True, "first_name": "Fake Calendar Bot", "username": "FakeCalendarBot"}
+_MAX_UPDATES_PER_POLL = 100
+
+class FakeTelegramServer(FakeHttpServer):
+    """The parts of the Bot API the bot uses: long polled getUpdates, sendMessage and getMe.
+
+    Other methods succeed without doing anything. Point the bot at it with base_url=server.botApiUrl.
+    Injected errors are 429s, the error Telegram answers with when a bot sends too fast.
+    """
+    routes = [
+        ("GET", r"/bot([^/]+)/getMe", "getMe"),
+        ("POST", r"/bot([^/]+)/getMe", "getMe"),
+        ("POST", r"/bot([^/]+)/getUpdates", "getUpdates"),
+        ("POST", r"/bot([^/]+)/sendMessage", "sendMessage"),
+        ("POST", r"/bot([^/]+)/(\w+)", "otherMethod")
+    ]
+    botUsername = _BOT_USER["username"]
+
+    def __init__(self, latencySeconds=0, errorRate=0, seed=None):
+        super().__init__(latencySeconds, errorRate, seed)
+        self._updatesChanged = threading.Condition()
+        self._updates = []
+        self._nextUpdateId = 1
+        self._longPollsEnded = False
+        self._messageLock = threading.Lock()
+        self._nextMessageId = 1
+        self._messageListeners = []
+        self.sentMessages = []
+
+    @property
+    def botApiUrl(self):
+        return self.url + "/bot"
+
+    def addMessageListener(self, listener):
+        """listener is called with (chat id, text, time.monotonic() when sent) for every message the bot sends."""
+        self._messageListeners.append(listener)
+
+    def _next_message_id(self):
+        with self._messageLock:
+            messageId = self._nextMessageId
+            self._nextMessageId += 1
+        return messageId
+
+    def endLongPolls(self):
+        """Answers getUpdates straight away from now on, so a polling bot can be stopped quickly."""
+        with self._updatesChanged:
+            self._longPollsEnded = True
+            self._updatesChanged.notify_all()
+
+    def enqueueCommand(self, chatId, userId, text):
+        """Queues a group message from a user for the bot to receive, returns its update id."""
+        command = text.split()[0]
+        message = {
+            "message_id": self._next_message_id(),
+            "date": int(time.time()),
+            "chat": {"id": chatId, "type": "group", "title": "Group %d" % chatId},
+            "from": {"id": userId, "is_bot": False, "first_name": "User", "last_name": str(userId)},
+            "text": text,
+            "entities": [{"type": "bot_command", "offset": 0, "length": len(command)}]
+        }
+        with self._updatesChanged:
+            updateId = self._nextUpdateId
+            self._nextUpdateId += 1
+            self._updates.append({"update_id": updateId, "message": message})
+            self._updatesChanged.notify_all()
+        return updateId
+
+    def _ok(self, result):
+        return FakeResponse(200, {"ok": True, "result": result})
+
+    def errorResponse(self):
+        return FakeResponse(429, {"ok": False, "error_code": 429, "description": "Too Many Requests: retry after 1",
+                                  "parameters": {"retry_after": 1}})
+
+    def _parse_body(self, body):
+        return json.loads(body) if len(body) > 0 else {}
+
+    def getMe(self, query, headers, body, token):
+        return self._ok(_BOT_USER)
+
+    def getUpdates(self, query, headers, body, token):
+        parameters = self._parse_body(body)
+        offset = int(parameters.get("offset", 0))
+        limit = int(parameters.get("limit", _MAX_UPDATES_PER_POLL))
+        deadline = time.monotonic() + float(parameters.get("timeout", 0))
+        with self._updatesChanged:
+            # updates before the offset have been confirmed by the bot
+            self._updates = [update for update in self._updates if update["update_id"] >= offset]
+            while len(self._updates) == 0 and not self._longPollsEnded and time.monotonic() < deadline:
+                self._updatesChanged.wait(deadline - time.monotonic())
+            return self._ok(self._updates[:limit])
+
+    def sendMessage(self, query, headers, body, token):
+        parameters = self._parse_body(body)
+        chatId = int(parameters["chat_id"])
+        sentAt = time.monotonic()
+        with self._messageLock:
+            self.sentMessages.append((chatId, parameters["text"], sentAt))
+        for listener in self._messageListeners:
+            listener(chatId, parameters["text"], sentAt)
+        return self._ok({
+            "message_id": self._next_message_id(),
+            "date": int(time.time()),
+            "chat": {"id": chatId, "type": "group", "title": "Group %d" % chatId},
+            "from": _BOT_USER,
+            "text": parameters["text"]
+        })
+
+    def otherMethod(self, query, headers, body, token, method):
+        return self._ok(True)
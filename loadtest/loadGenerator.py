@@ -0,0 +1,237 @@
+"""Replays synthetic group chat commands against the bot and reports throughput and command latency.
+
+The bot runs through app.startBot with a GoogleCalendarService, both pointed at in-process fake
+Google Calendar and Telegram servers, so nothing leaves the machine. Run from the repository root
+(client_secret.json is read from there, a token.json there would be sent to the fake server):
+    python -m loadtest.loadGenerator --rate 20 --duration 30 --chats 10 --google-latency 0.1
+
+A command's latency is the time from the update being available to the bot until the bot's reply
+to that chat reaches the fake Telegram server. Like a user waiting for an answer, a chat only sends
+its next command once its previous one was answered, so --rate is the most commands sent per second.
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import date, timedelta
+
+import app
+from benchmarks.benchmarkData import generateEvents
+from loadtest.fakeGoogleCalendarServer import FakeGoogleCalendarServer
+from loadtest.fakeTelegramServer import FakeTelegramServer
+from service.calendarBotHandler import _UPDATE_FAILED_MESSAGE
+from service.googleCalendarService import GoogleCalendarService, _MAX_UPCOMING_EVENTS
+from service.userEventStatusService import UserEventStatusService
+
+LOG = logging.getLogger(__name__)
+_BOT_TOKEN = "123456:fake-load-test-token"
+_CALENDAR_ID = "loadtest@group.calendar.google.com"
+_USERS_PER_CHAT = 20
+# (command, relative weight), %d is replaced with an event number
+_COMMAND_MIX = [
+    ("/upcoming", 30),
+    ("/details %d", 25),
+    ("/going %d", 15),
+    ("/not %d", 8),
+    ("/undecided %d", 8),
+    ("/help", 10),
+    ("/create Load test event tomorrow 7-9pm", 4)
+]
+_ERROR_REPLIES = ("An exception occurred", _UPDATE_FAILED_MESSAGE, "Could not quick create event")
+
+class _LatencyRecorder(object):
+    """Sends the commands and matches the bot's replies to the commands they answer.
+
+    The bot handles updates on several worker threads and confirms RSVPs once they are written, so
+    replies to a chat can arrive in any order. Each chat therefore has at most one command waiting
+    for its reply, a command for a chat that is still waiting is held back until the reply arrives
+    and its latency is counted from when it is sent. A command whose reply and error reply both fail
+    to send holds back the rest of its chat's commands, which then count as timed out.
+    """
+
+    def __init__(self, sendCommand):
+        self._sendCommand = sendCommand
+        self._lock = threading.Lock()
+        # chat id to when the command waiting for a reply was sent
+        self._outstanding = {}
+        self._heldBack = defaultdict(deque)
+        self._completed = threading.Condition(self._lock)
+        self.latencies = []
+        self.lastReplyAt = None
+        self.errorReplies = 0
+        self.unmatchedReplies = 0
+
+    def send(self, chatId, userId, text):
+        with self._lock:
+            if chatId in self._outstanding:
+                self._heldBack[chatId].append((userId, text))
+                return
+            self._outstanding[chatId] = time.monotonic()
+        self._sendCommand(chatId, userId, text)
+
+    def replyReceived(self, chatId, text, receivedAt):
+        nextCommand = None
+        with self._lock:
+            sentAt = self._outstanding.pop(chatId, None)
+            if sentAt == None:
+                self.unmatchedReplies += 1
+                return
+            self.latencies.append(receivedAt - sentAt)
+            self.lastReplyAt = receivedAt
+            if text.startswith(_ERROR_REPLIES):
+                self.errorReplies += 1
+            if len(self._heldBack[chatId]) > 0:
+                nextCommand = self._heldBack[chatId].popleft()
+                self._outstanding[chatId] = time.monotonic()
+            self._completed.notify_all()
+        if nextCommand != None:
+            self._sendCommand(chatId, *nextCommand)
+
+    def _count_outstanding(self):
+        return len(self._outstanding) + sum(len(commands) for commands in self._heldBack.values())
+
+    def outstanding(self):
+        with self._lock:
+            return self._count_outstanding()
+
+    def waitForReplies(self, timeoutSeconds):
+        deadline = time.monotonic() + timeoutSeconds
+        with self._lock:
+            while self._count_outstanding() > 0 and time.monotonic() < deadline:
+                self._completed.wait(deadline - time.monotonic())
+
+def percentile(values, percent):
+    """Nearest rank percentile of values."""
+    if len(values) == 0:
+        return None
+    ordered = sorted(values)
+    rank = max(1, int(round(percent / 100.0 * len(ordered))))
+    return ordered[min(rank, len(ordered)) - 1]
+
+def generateCommands(count, chats, eventCount, seed=None):
+    """Returns (chat id, user id, text) tuples for a mix of group chat commands."""
+    generator = random.Random(seed)
+    commandTemplates = [command for command, weight in _COMMAND_MIX]
+    weights = [weight for command, weight in _COMMAND_MIX]
+    commands = []
+    for i in range(count):
+        # group chat ids are negative
+        chatId = -1000 - generator.randrange(chats)
+        userId = abs(chatId) * _USERS_PER_CHAT + generator.randrange(_USERS_PER_CHAT)
+        text = generator.choices(commandTemplates, weights)[0]
+        if "%d" in text:
+            text = text % generator.randint(1, min(eventCount, _MAX_UPCOMING_EVENTS))
+        if generator.random() < 0.3:
+            # commands picked from the group's command list are addressed to the bot
+            command, _, arguments = text.partition(" ")
+            text = ("%s@%s %s" % (command, FakeTelegramServer.botUsername, arguments)).strip()
+        commands.append((chatId, userId, text))
+    return commands
+
+def runLoad(rate, durationSeconds, chats=10, eventCount=20, googleLatency=0, telegramLatency=0,
+            googleErrorRate=0, telegramErrorRate=0, pollInterval=0, drainTimeout=30, seed=None):
+    """Runs the bot against fake servers at rate commands per second and returns the results."""
+    # the fake servers are plain HTTP
+    os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = "1"
+    google = FakeGoogleCalendarServer(googleLatency, googleErrorRate, seed).start()
+    telegramServer = FakeTelegramServer(telegramLatency, telegramErrorRate, seed).start()
+    google.addEvents(_CALENDAR_ID, generateEvents(eventCount, startingFrom=date.today() + timedelta(days=1)))
+
+    recorder = _LatencyRecorder(telegramServer.enqueueCommand)
+    telegramServer.addMessageListener(recorder.replyReceived)
+
+    app.userEventStatusService = UserEventStatusService()
+    app.calendarService = GoogleCalendarService(app.userEventStatusService, baseUrl=google.calendarApiUrl)
+    updater = app.startBot(botToken=_BOT_TOKEN, calendarId=_CALENDAR_ID,
+                           telegramApiUrl=telegramServer.botApiUrl, pollInterval=pollInterval)
+    try:
+        # one command first so the bot's start up is not counted as latency
+        recorder.send(-1, 1, "/help")
+        recorder.waitForReplies(drainTimeout)
+        recorder.latencies.clear()
+        recorder.errorReplies = 0
+
+        commands = generateCommands(int(rate * durationSeconds), chats, eventCount, seed)
+        started = time.monotonic()
+        for i, (chatId, userId, text) in enumerate(commands):
+            delay = started + i / float(rate) - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            recorder.send(chatId, userId, text)
+        sendingFinished = time.monotonic()
+        recorder.waitForReplies(drainTimeout)
+    finally:
+        telegramServer.endLongPolls()
+        updater.stop()
+        app.calendarService.close()
+        telegramServer.stop()
+        google.stop()
+
+    latencies = list(recorder.latencies)
+    # replies that never arrive should not stretch the run to the drain timeout
+    finished = recorder.lastReplyAt if recorder.lastReplyAt != None else sendingFinished
+    return {
+        "commandsSent": len(commands),
+        "commandsCompleted": len(latencies),
+        "commandsTimedOut": recorder.outstanding(),
+        "errorReplies": recorder.errorReplies,
+        "sendSeconds": sendingFinished - started,
+        "totalSeconds": finished - started,
+        "throughput": len(latencies) / (finished - started),
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "max": max(latencies) if len(latencies) > 0 else None,
+        "google": google.getStats(),
+        "telegram": telegramServer.getStats()
+    }
+
+def _format_seconds(seconds):
+    return "%8.1f ms" % (seconds * 1000) if seconds != None else "       n/a"
+
+def printResults(results):
+    print("Commands sent:      %d in %.1fs" % (results["commandsSent"], results["sendSeconds"]))
+    print("Commands completed: %d (%d timed out, %d error replies)" % (
+        results["commandsCompleted"], results["commandsTimedOut"], results["errorReplies"]))
+    print("Throughput:         %.1f commands/s" % results["throughput"])
+    for name in ("p50", "p95", "p99", "max"):
+        print("Latency %-4s        %s" % (name + ":", _format_seconds(results[name])))
+    for serverName in ("google", "telegram"):
+        stats = results[serverName]
+        print("%s requests: %s" % (serverName.capitalize(), ", ".join(
+            "%s=%d" % (endpoint, count) for endpoint, count in sorted(stats["requests"].items()))))
+        if len(stats["errors"]) > 0:
+            print("%s injected errors: %s" % (serverName.capitalize(), ", ".join(
+                "%s=%d" % (endpoint, count) for endpoint, count in sorted(stats["errors"].items()))))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=float, default=10, help="commands per second")
+    parser.add_argument("--duration", type=float, default=10, help="seconds to send commands for")
+    parser.add_argument("--chats", type=int, default=10, help="number of group chats sending commands")
+    parser.add_argument("--events", type=int, default=20, help="number of events in the fake calendar")
+    parser.add_argument("--google-latency", type=float, default=0, help="seconds added to every Google request")
+    parser.add_argument("--telegram-latency", type=float, default=0, help="seconds added to every Telegram request")
+    parser.add_argument("--google-error-rate", type=float, default=0, help="fraction of Google requests failing with 503")
+    parser.add_argument("--telegram-error-rate", type=float, default=0,
+                        help="fraction of Telegram requests failing with 429")
+    parser.add_argument("--poll-interval", type=float, default=1,
+                        help="seconds the bot waits between getUpdates calls, startBot's default is 1")
+    parser.add_argument("--drain-timeout", type=float, default=30, help="seconds to wait for outstanding replies")
+    parser.add_argument("--seed", type=int, default=None, help="seed for the command stream and injected errors")
+    parser.add_argument("--verbose", action="store_true", help="show the bot's logging")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO if args.verbose else logging.WARNING)
+    results = runLoad(args.rate, args.duration, args.chats, args.events, args.google_latency, args.telegram_latency,
+                      args.google_error_rate, args.telegram_error_rate, args.poll_interval, args.drain_timeout,
+                      args.seed)
+    printResults(results)
+    return 0 if results["commandsTimedOut"] == 0 else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
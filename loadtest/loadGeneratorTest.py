@@ -0,0 +1,126 @@
+from loadtest.fakeGoogleCalendarServer import FakeGoogleCalendarServer, parseFields, project
+from loadtest.payloadComparison import comparePayloads
+from loadtest.loadGenerator import runLoad, percentile, generateCommands, _LatencyRecorder
+from benchmarks.benchmarkData import generateEvents
+from service.googleCalendarService import GoogleCalendarService, _GOING, _NOT
+from service.userEventStatusService import UserEventStatusService
+import unittest
+import os
+import time
+from datetime import date, datetime, timedelta
+
+class FakeGoogleCalendarServerTest(unittest.TestCase):
+
+    def setUp(self):
+        os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = "1"
+        self.calendarId = "calendarId"
+        self.server = FakeGoogleCalendarServer().start()
+        self.server.addEvents(self.calendarId, generateEvents(300, startingFrom=date.today() + timedelta(days=1)))
+        self.googleCalendarService = self.createService(baseUrl=self.server.calendarApiUrl)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def createService(self, **kwargs):
+        googleCalendarService = GoogleCalendarService(UserEventStatusService(), **kwargs)
+        self.addCleanup(googleCalendarService.close)
+        return googleCalendarService
+
+    def test_get_upcoming_events(self):
+        events = self.googleCalendarService.getUpcomingEvents(self.calendarId)
+        self.assertEqual(len(events), 10)
+        self.assertEqual(events[0]["id"], generateEvents(1)[0]["id"])
+
+    def test_sync_follows_pages(self):
+        service = self.createService(syncEnabled=True, baseUrl=self.server.calendarApiUrl)
+        self.assertEqual(len(service.getCalendarEvents(self.calendarId)), 300)
+        self.assertEqual(self.server.getStats()["requests"]["listEvents"], 2)
+
+    def test_iter_calendar_events_streams_pages(self):
+        events = self.googleCalendarService.iterCalendarEvents(self.calendarId, pageSize=100)
+        self.assertEqual(len(list(events)), 300)
+        self.assertEqual(self.server.getStats()["requests"]["listEvents"], 3)
+
+        timeMax = datetime.combine(date.today() + timedelta(days=2), datetime.min.time())
+        windowEvents = list(self.googleCalendarService.iterCalendarEvents(self.calendarId, timeMax=timeMax))
+        self.assertLess(len(windowEvents), 300)
+
+    def test_minimal_payloads_are_projected_and_gzipped(self):
+        service = self.createService(baseUrl=self.server.calendarApiUrl, minimalPayloads=True)
+        events = service.getUpcomingEvents(self.calendarId)
+        self.assertEqual(len(events), 10)
+        self.assertNotIn("creator", events[0])
+        self.assertIn("description", events[0])
+
+        event = service.getCurrentEvent(self.calendarId, events[0]["id"])
+        self.assertEqual(set(event), {"id", "etag", "updated", "status", "summary", "htmlLink", "description", "start", "end"})
+
+    def test_project_fields(self):
+        selection = parseFields("items(id,start(date)),nextPageToken")
+        self.assertEqual(selection, {"items": {"id": None, "start": {"date": None}}, "nextPageToken": None})
+        self.assertEqual(project({"items": [{"id": "1", "start": {"date": "d", "timeZone": "z"}, "summary": "s"}], "kind": "k"},
+                                 selection), {"items": [{"id": "1", "start": {"date": "d"}}]})
+
+    def test_set_user_status_retries_stale_event(self):
+        staleEvent = self.server.getStoredEvent(self.calendarId, generateEvents(1)[0]["id"])
+        self.googleCalendarService.setNotGoingToEvent(self.calendarId, staleEvent["id"], "User A")
+        self.googleCalendarService.setGoingToEvent(self.calendarId, staleEvent["id"], "User B", staleEvent)
+
+        description = self.server.getStoredEvent(self.calendarId, staleEvent["id"])["description"]
+        self.assertIn("User A", description)
+        self.assertIn("User B", description)
+
+    def test_injected_errors(self):
+        self.server.errorRate = 1
+        with self.assertRaises(Exception):
+            self.googleCalendarService.setGoingToEvent(self.calendarId, "eventId", "User A", {"id": "eventId"})
+
+class LoadGeneratorTest(unittest.TestCase):
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([3], 95), 3)
+        self.assertEqual(percentile([], 95), None)
+
+    def test_generate_commands(self):
+        commands = generateCommands(100, 3, 20, seed=1)
+        self.assertEqual(len(commands), 100)
+        self.assertEqual(len(set(chatId for chatId, userId, text in commands)), 3)
+        self.assertTrue(all(text.startswith("/") for chatId, userId, text in commands))
+        self.assertEqual(commands, generateCommands(100, 3, 20, seed=1))
+
+    def test_chat_waits_for_reply_before_next_command(self):
+        sentCommands = []
+        recorder = _LatencyRecorder(lambda chatId, userId, text: sentCommands.append((chatId, text)))
+        recorder.send(-1000, 1, "/upcoming")
+        recorder.send(-1000, 2, "/going 1")
+        recorder.send(-1001, 3, "/help")
+        self.assertEqual(sentCommands, [(-1000, "/upcoming"), (-1001, "/help")])
+        self.assertEqual(recorder.outstanding(), 3)
+
+        recorder.replyReceived(-1000, "Upcoming events", time.monotonic())
+        self.assertEqual(sentCommands[-1], (-1000, "/going 1"))
+        recorder.replyReceived(-1000, "User 2 is going to this event", time.monotonic())
+        recorder.replyReceived(-1000, "An unexpected reply", time.monotonic())
+        self.assertEqual(len(recorder.latencies), 2)
+        self.assertEqual(recorder.unmatchedReplies, 1)
+        self.assertEqual(recorder.outstanding(), 1)
+
+    def test_run_load(self):
+        results = runLoad(rate=20, durationSeconds=1, chats=10, drainTimeout=10, seed=1)
+        self.assertEqual(results["commandsSent"], 20)
+        self.assertEqual(results["commandsCompleted"], 20)
+        self.assertEqual(results["commandsTimedOut"], 0)
+        self.assertEqual(results["errorReplies"], 0)
+        self.assertLessEqual(results["p50"], results["p99"])
+        self.assertEqual(results["telegram"]["requests"]["sendMessage"], 21)
+
+    def test_compare_payloads(self):
+        results = comparePayloads(eventCount=30, rounds=1, pageSize=10)
+        for case in ("upcomingEvents", "listEvents"):
+            self.assertLess(results["minimal"][case]["bytes"], results["full"][case]["bytes"])
+
+if __name__ == '__main__':
+    unittest.main()
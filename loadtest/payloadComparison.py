@@ -0,0 +1,92 @@
+"""Compares the bytes received and the CPU spent decoding Calendar API responses with and without MINIMAL_PAYLOADS.
+
+Both modes run GoogleCalendarService against the in-process fake Google Calendar server, which
+supports the fields= projection and gzips responses for gzip user agents like Google does. Run
+from the repository root:
+    python -m loadtest.payloadComparison --events 500 --rounds 20
+
+The CPU time is the calling thread's only, so it covers requesting, decompressing and decoding but
+not the fake server's work.
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+from benchmarks.benchmarkData import generateEvents
+from loadtest.fakeGoogleCalendarServer import FakeGoogleCalendarServer
+from service.googleCalendarService import GoogleCalendarService
+from service.userEventStatusService import UserEventStatusService
+
+_CALENDAR_ID = "payloads@group.calendar.google.com"
+_MODES = (("full", False), ("minimal", True))
+
+def _measure(server, function, rounds):
+    bytesBefore = server.getStats()["bytesSent"]
+    cpuStarted = time.thread_time()
+    started = time.perf_counter()
+    for i in range(rounds):
+        function()
+    return {
+        "bytes": (server.getStats()["bytesSent"] - bytesBefore) / rounds,
+        "cpuSeconds": (time.thread_time() - cpuStarted) / rounds,
+        "seconds": (time.perf_counter() - started) / rounds
+    }
+
+def comparePayloads(eventCount=500, rounds=20, pageSize=250):
+    """Returns {mode: {case: {"bytes", "cpuSeconds", "seconds"}}} per call, for the full and minimal modes."""
+    # the fake server is plain HTTP
+    os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = "1"
+    events = generateEvents(eventCount, startingFrom=date.today() + timedelta(days=1))
+    results = {}
+    with FakeGoogleCalendarServer() as server:
+        server.addEvents(_CALENDAR_ID, events)
+        for mode, minimalPayloads in _MODES:
+            service = GoogleCalendarService(UserEventStatusService(), syncEnabled=False,
+                                            baseUrl=server.calendarApiUrl, minimalPayloads=minimalPayloads)
+
+            def upcoming():
+                service.refreshCalendar(_CALENDAR_ID)
+                service.getUpcomingEvents(_CALENDAR_ID)
+
+            def listing():
+                for event in service.iterCalendarEvents(_CALENDAR_ID, pageSize=pageSize):
+                    pass
+
+            try:
+                results[mode] = {
+                    "upcomingEvents": _measure(server, upcoming, rounds),
+                    "listEvents": _measure(server, listing, rounds)
+                }
+            finally:
+                service.close()
+    return results
+
+def printResults(results):
+    print("%-16s %-8s %12s %12s %12s" % ("case", "mode", "bytes", "cpu", "wall"))
+    for case in sorted(results["full"]):
+        for mode, minimalPayloads in _MODES:
+            measured = results[mode][case]
+            print("%-16s %-8s %12d %9.2f ms %9.2f ms" % (case, mode, measured["bytes"], measured["cpuSeconds"] * 1000,
+                                                        measured["seconds"] * 1000))
+        full, minimal = results["full"][case], results["minimal"][case]
+        print("%-16s %-8s %11.1f%% %11.1f%% %11.1f%%" % (case, "saved", 100 * (1 - minimal["bytes"] / full["bytes"]),
+                                                         100 * (1 - minimal["cpuSeconds"] / full["cpuSeconds"]),
+                                                         100 * (1 - minimal["seconds"] / full["seconds"])))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=500, help="number of events in the fake calendar")
+    parser.add_argument("--rounds", type=int, default=20, help="calls measured per case and mode")
+    parser.add_argument("--page-size", type=int, default=250, help="events per page when listing the calendar")
+    parser.add_argument("--verbose", action="store_true", help="show the service's logging")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO if args.verbose else logging.WARNING)
+    printResults(comparePayloads(args.events, args.rounds, args.page_size))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,195 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime
+
+import aiohttp
+from service.googleCalendarService import _GOING, _NOT, _UNDECIDED, _MAX_UPCOMING_EVENTS, _MAX_CONFLICT_RETRIES, \
+    _TOKEN_REFRESHES, _write_token_file
+from service.logPayload import LogPayload
+from support.properties import TOKEN_FILE, CLIENT_SECRET_FILE, GOOGLE_CALENDAR_API_URL, GOOGLE_REQUEST_TIMEOUT
+
+LOG = logging.getLogger(__name__)
+# refresh a little early so a token does not expire while a request is in flight
+_TOKEN_EXPIRY_MARGIN = 30
+
+class AsyncGoogleCalendarService(object):
+    """Coroutine version of GoogleCalendarService sharing one keep-alive connection pool.
+
+    Given a credentialSource, e.g. the bot's GoogleCalendarService, its token is used and refreshed
+    instead of a separate copy read from the token file, so the two never refresh the same token twice.
+    """
+
+    def __init__(self, userEventStatusService, maxConnections=100, maxConnectionsPerHost=10,
+                 secret=None, token=None, tokenUpdater=None, baseUrl=GOOGLE_CALENDAR_API_URL,
+                 requestTimeout=GOOGLE_REQUEST_TIMEOUT, credentialSource=None):
+        self._userEventStatusService = userEventStatusService
+        self._credentialSource = credentialSource
+        self._requestTimeout = requestTimeout
+        self._maxConnections = maxConnections
+        self._maxConnectionsPerHost = maxConnectionsPerHost
+        self._secret = secret if secret != None or credentialSource != None else self._get_secret_from_file()
+        self._token = token if token != None or credentialSource != None else self._get_token_from_file()
+        self._tokenUpdater = tokenUpdater if tokenUpdater != None else self.saveToken
+        self._baseUrl = baseUrl.rstrip("/")
+        self._session = None
+        self._refreshLock = None
+
+    def _get_secret_from_file(self):
+        with open(CLIENT_SECRET_FILE) as json_file:
+            secret = json.load(json_file)
+        return secret["web"]
+
+    def _get_token_from_file(self):
+        token = None
+        if os.path.exists(TOKEN_FILE):
+            with open(TOKEN_FILE) as json_file:
+                token = json.load(json_file)
+        return token
+
+    def saveToken(self, token):
+        _write_token_file(token)
+
+    def _get_session(self):
+        # the session is bound to the running loop, so it is created on first use
+        if self._session == None:
+            connector = aiohttp.TCPConnector(limit=self._maxConnections, limit_per_host=self._maxConnectionsPerHost)
+            # like the requests timeout, bounds connecting and each wait for more of the response
+            timeout = aiohttp.ClientTimeout(sock_connect=self._requestTimeout, sock_read=self._requestTimeout)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+            self._refreshLock = asyncio.Lock()
+        return self._session
+
+    async def close(self):
+        if self._session != None:
+            await self._session.close()
+            self._session = None
+
+    def _get_token(self):
+        return self._credentialSource.getToken() if self._credentialSource != None else self._token
+
+    def _token_expired(self, token):
+        return token != None and "expires_at" in token and token["expires_at"] - _TOKEN_EXPIRY_MARGIN <= time.time()
+
+    async def _refresh_token(self, expiredToken):
+        if self._credentialSource != None:
+            # blocking, and shared with the refreshes of the credential source's own requests
+            await asyncio.get_running_loop().run_in_executor(None, self._credentialSource.refreshToken, expiredToken)
+            return
+
+        async with self._refreshLock:
+            if self._token is not expiredToken:
+                # another request refreshed the token while this one was waiting
+                return
+
+            async with self._get_session().post(self._secret["token_uri"], data={
+                        "grant_type": "refresh_token",
+                        "refresh_token": expiredToken["refresh_token"],
+                        "client_id": self._secret["client_id"],
+                        "client_secret": self._secret["client_secret"]
+                    }) as res:
+                if res.status != 200:
+                    raise Exception("Could not refresh token: %s" % await res.text())
+                token = await res.json(content_type=None)
+
+            if "refresh_token" not in token:
+                token["refresh_token"] = expiredToken["refresh_token"]
+            if "expires_in" in token:
+                token["expires_at"] = time.time() + int(token["expires_in"])
+            self._token = token
+            _TOKEN_REFRESHES.inc()
+            self._tokenUpdater(token)
+
+    async def _request(self, method, path, headers={}, **kwargs):
+        """Returns (status, decoded json body) refreshing the access token when needed."""
+        session = self._get_session()
+        token = self._get_token()
+        if self._token_expired(token):
+            await self._refresh_token(token)
+
+        for attempt in range(2):
+            token = self._get_token()
+            requestHeaders = dict(headers)
+            if token != None:
+                requestHeaders["Authorization"] = "Bearer %s" % token["access_token"]
+            async with session.request(method, self._baseUrl + path, headers=requestHeaders, **kwargs) as res:
+                body = await res.text()
+                if res.status == 401 and attempt == 0 and token != None and "refresh_token" in token:
+                    await self._refresh_token(token)
+                    continue
+                return res.status, (json.loads(body) if len(body) > 0 else None)
+
+    async def getUpcomingEvents(self, calendarId):
+        try:
+            status, content = await self._request("GET", "/calendars/%s/events" % calendarId, params={
+                "singleEvents": "true",
+                "orderBy": "startTime",
+                "timeMin": datetime.today().strftime("%Y-%m-%dT%H:%M:%S%zZ"),
+                "maxResults": str(_MAX_UPCOMING_EVENTS)
+            })
+            if status != 200:
+                raise Exception("Could not list upcoming events of calendar %s: %s" % (calendarId, LogPayload(content)))
+            content = content["items"]
+            LOG.info("Upcoming events: %s", LogPayload(content))
+        except Exception as e:
+            LOG.info(e)
+            content = []
+
+        return content
+
+    async def getCurrentEvent(self, calendarId, eventId):
+        """The event, None when it does not exist (404) or was deleted (410), raises on any other error."""
+        status, event = await self._request("GET", "/calendars/%s/events/%s" % (calendarId, eventId))
+        if status in (404, 410):
+            return None
+        if status != 200:
+            raise Exception("Could not get event %s of calendar %s: %s" % (eventId, calendarId, LogPayload(event)))
+        return event
+
+    async def _set_user_status(self, calendarId, eventId, usersName, updatedStatus, event):
+        if event == None:
+            event = await self.getCurrentEvent(calendarId, eventId)
+
+        for attempt in range(_MAX_CONFLICT_RETRIES + 1):
+            if event == None:
+                raise Exception("Event %s of calendar %s no longer exists" % (eventId, calendarId))
+            eventUpdate = self._userEventStatusService.getEventUpdateForUserStatuses(event, {usersName: updatedStatus})
+
+            conditional = "description" in eventUpdate and "etag" in event
+            status, content = await self._request("PATCH", "/calendars/%s/events/%s" % (calendarId, eventId),
+                                                  json=eventUpdate,
+                                                  params={"sendUpdates": "none"},
+                                                  headers={"If-Match": event["etag"]} if conditional else {})
+            if status != 412:
+                break
+            LOG.info("Event %s changed since it was read, fetching it again" % eventId)
+            event = await self.getCurrentEvent(calendarId, eventId)
+
+        LOG.info("Response after updating status to '%s': %s", updatedStatus, LogPayload(content))
+        if status != 200:
+            raise Exception("Could not update status of %s for event %s" % (usersName, eventId))
+
+    async def setGoingToEvent(self, calendarId, eventId, usersName, event=None):
+        await self._set_user_status(calendarId, eventId, usersName, _GOING, event)
+
+    async def setNotGoingToEvent(self, calendarId, eventId, usersName, event=None):
+        await self._set_user_status(calendarId, eventId, usersName, _NOT, event)
+
+    async def setUndecidedAboutEvent(self, calendarId, eventId, usersName, event=None):
+        await self._set_user_status(calendarId, eventId, usersName, _UNDECIDED, event)
+
+    async def quickCreateEvent(self, calendarId, quickCreateString):
+        result = {}
+        status, createdEvent = await self._request("POST", "/calendars/%s/events/quickAdd" % calendarId,
+                                                   params={"text": quickCreateString})
+        if status == 200:
+            LOG.info("Response after quick creating event: %s", LogPayload(createdEvent))
+            result["summary"] = createdEvent["summary"]
+            result["htmlLink"] = createdEvent["htmlLink"]
+        else:
+            errorMessage = "Could not quick create event %s"
+            result["error"] = errorMessage % "contact developer"
+            LOG.info(errorMessage, LogPayload(createdEvent))
+        return result
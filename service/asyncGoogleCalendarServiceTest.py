@@ -0,0 +1,165 @@
+from service.asyncGoogleCalendarService import AsyncGoogleCalendarService
+from service.userEventStatusService import _START_OF_ATTENDEE_INFO, _HIDDEN_CHAR, UserEventStatusService
+import asyncio
+import unittest
+from unittest import mock
+import json
+import os
+import tempfile
+import time
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+class FakeCredentialSource(object):
+    def __init__(self, token):
+        self.token = token
+        self.refreshedTokens = []
+
+    def getToken(self):
+        return self.token
+
+    def refreshToken(self, staleToken=None):
+        self.refreshedTokens.append(staleToken)
+        self.token = {"access_token": "validToken", "refresh_token": "refreshToken", "expires_at": time.time() + 3600}
+        return self.token
+
+class AsyncGoogleCalendarServiceTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        with open("./service/eventResponseTest.json") as eventResponseText:
+            self.events = json.load(eventResponseText)["items"]
+        self.requests = []
+        self.patches = []
+        self.refreshes = 0
+        # status code the list endpoint answers with instead of the events
+        self.listStatus = 200
+
+        app = web.Application()
+        app.router.add_get("/calendars/{calendarId}/events", self.listEvents)
+        app.router.add_get("/calendars/{calendarId}/events/{eventId}", self.getEvent)
+        app.router.add_patch("/calendars/{calendarId}/events/{eventId}", self.patchEvent)
+        app.router.add_post("/calendars/{calendarId}/events/quickAdd", self.quickAdd)
+        app.router.add_post("/token", self.refreshToken)
+        self.server = TestServer(app)
+        await self.server.start_server()
+
+        self.savedTokens = []
+        self.service = AsyncGoogleCalendarService(
+            UserEventStatusService(),
+            secret={"client_id": "clientId", "client_secret": "clientSecret", "token_uri": str(self.server.make_url("/token"))},
+            token={"access_token": "validToken", "refresh_token": "refreshToken", "expires_at": time.time() + 3600},
+            tokenUpdater=self.savedTokens.append,
+            baseUrl=str(self.server.make_url("")))
+
+    async def asyncTearDown(self):
+        await self.service.close()
+        await self.server.close()
+
+    def authorized(self, request):
+        self.requests.append(request.headers.get("Authorization"))
+        return request.headers.get("Authorization") == "Bearer validToken"
+
+    async def listEvents(self, request):
+        if not self.authorized(request):
+            return web.json_response({"error": "unauthorized"}, status=401)
+        self.assertEqual(request.query["orderBy"], "startTime")
+        if self.listStatus != 200:
+            return web.json_response({"error": {"code": self.listStatus}}, status=self.listStatus)
+        return web.json_response({"items": self.events})
+
+    async def getEvent(self, request):
+        if not self.authorized(request):
+            return web.json_response({"error": "unauthorized"}, status=401)
+        if request.match_info["eventId"] == "deletedEventId":
+            return web.json_response({"error": {"code": 410}}, status=410)
+        return web.json_response(self.events[0])
+
+    async def patchEvent(self, request):
+        if not self.authorized(request):
+            return web.json_response({"error": "unauthorized"}, status=401)
+        self.assertEqual(request.query["sendUpdates"], "none")
+        if request.headers.get("If-Match", self.events[0]["etag"]) != self.events[0]["etag"]:
+            return web.json_response({"error": "conditionNotMet"}, status=412)
+        self.patches.append(await request.json())
+        return web.json_response(self.events[0])
+
+    async def quickAdd(self, request):
+        if not self.authorized(request):
+            return web.json_response({"error": "unauthorized"}, status=401)
+        return web.json_response({"summary": request.query["text"], "htmlLink": "htmlLink"})
+
+    async def refreshToken(self, request):
+        self.refreshes += 1
+        form = await request.post()
+        self.assertEqual(form["refresh_token"], "refreshToken")
+        return web.json_response({"access_token": "validToken", "expires_in": 3600})
+
+    async def test_get_upcoming_events(self):
+        events = await self.service.getUpcomingEvents("calendarId")
+        self.assertEqual(len(events), 4)
+
+    async def test_get_upcoming_events_when_google_fails(self):
+        self.listStatus = 503
+        self.assertEqual(await self.service.getUpcomingEvents("calendarId"), [])
+
+    async def test_set_going_to_deleted_event(self):
+        self.assertIsNone(await self.service.getCurrentEvent("calendarId", "deletedEventId"))
+        with self.assertRaisesRegex(Exception, "no longer exists"):
+            await self.service.setGoingToEvent("calendarId", "deletedEventId", "userName")
+        self.assertEqual(self.patches, [])
+
+    async def test_set_going_to_event(self):
+        await self.service.setGoingToEvent("calendarId", self.events[0]["id"], "userName")
+        expectedDescription = self.events[0]["description"] + _START_OF_ATTENDEE_INFO \
+            + "userName%cis going to this event" % _HIDDEN_CHAR
+        self.assertEqual(self.patches, [{"description": expectedDescription}])
+
+    async def test_set_going_to_stale_event_is_retried(self):
+        staleEvent = dict(self.events[0], etag="\"staleEtag\"", description="")
+        await self.service.setGoingToEvent("calendarId", self.events[0]["id"], "userName", staleEvent)
+        expectedDescription = self.events[0]["description"] + _START_OF_ATTENDEE_INFO \
+            + "userName%cis going to this event" % _HIDDEN_CHAR
+        self.assertEqual(self.patches, [{"description": expectedDescription}])
+
+    async def test_quick_create_event(self):
+        result = await self.service.quickCreateEvent("calendarId", "Event")
+        self.assertEqual(result, {"summary": "Event", "htmlLink": "htmlLink"})
+
+    async def test_expired_token_is_refreshed_once_for_concurrent_requests(self):
+        self.service._token = {"access_token": "expiredToken", "refresh_token": "refreshToken", "expires_at": time.time() - 1}
+        results = await asyncio.gather(*[self.service.getUpcomingEvents("calendarId") for i in range(5)])
+
+        self.assertEqual([len(events) for events in results], [4] * 5)
+        self.assertEqual(self.refreshes, 1)
+        self.assertEqual(self.savedTokens[0]["access_token"], "validToken")
+        self.assertEqual(self.savedTokens[0]["refresh_token"], "refreshToken")
+
+    async def test_rejected_token_is_refreshed_and_request_retried(self):
+        self.service._token = {"access_token": "revokedToken", "refresh_token": "refreshToken"}
+        events = await self.service.getUpcomingEvents("calendarId")
+        self.assertEqual(len(events), 4)
+        self.assertEqual(self.requests, ["Bearer revokedToken", "Bearer validToken"])
+        self.assertEqual(self.refreshes, 1)
+
+    async def test_token_is_saved_atomically(self):
+        tokenFile = os.path.join(tempfile.mkdtemp(), "token.json")
+        with mock.patch("service.googleCalendarService.TOKEN_FILE", tokenFile):
+            self.service.saveToken({"access_token": "new"})
+        with open(tokenFile) as token_file:
+            self.assertEqual(json.load(token_file), {"access_token": "new"})
+        self.assertEqual(os.listdir(os.path.dirname(tokenFile)), ["token.json"])
+
+    async def test_credential_source_token_is_used_and_refreshed(self):
+        expiredToken = {"access_token": "expiredToken", "refresh_token": "refreshToken", "expires_at": time.time() - 1}
+        credentialSource = FakeCredentialSource(expiredToken)
+        service = AsyncGoogleCalendarService(UserEventStatusService(), credentialSource=credentialSource,
+                                             baseUrl=str(self.server.make_url("")))
+        try:
+            events = await service.getUpcomingEvents("calendarId")
+        finally:
+            await service.close()
+
+        self.assertEqual(len(events), 4)
+        self.assertEqual(credentialSource.refreshedTokens, [expiredToken])
+        self.assertEqual(self.requests, ["Bearer validToken"])
+        self.assertEqual(self.refreshes, 0)
@@ -1,55 +1,124 @@
 import telegram.ext
+import inspect
 import logging
+import time
 from datetime import datetime
+from service.calendarEvent import CalendarEvent
+from service.calendarIoExecutor import CalendarIoBusyError
+from service.commandRouter import CommandRouter, ParsedCommand
 from service.eventFormatter import EventFormatter
+from service.renderedMessageCache import RenderedMessageCache
+from service.googleCalendarService import _GOING, _NOT, _UNDECIDED
+from service.metrics import REGISTRY
+from service.resilientCalendarService import CalendarUnavailableError, isStale
+from service.tracing import TRACER
+from service.updateProfiler import MODE_CPROFILE, MODE_SAMPLING
 from service.userEventStatusService import UserEventStatusService
 
 LOG = logging.getLogger(__name__)
+_USER_STATUS_MESSAGES = {
+    _GOING: "%s is going to %s",
+    _NOT: "%s is not going to %s",
+    _UNDECIDED: "%s is undecided about %s"
+}
+_UPDATE_FAILED_MESSAGE = "Unable to update the Google Calendar, please try again later."
+_UNAVAILABLE_MESSAGE = "Google Calendar can not be reached right now, please try again in a minute."
+_STALE_EVENTS_NOTE = "\n_Google Calendar can not be reached right now, these events may be out of date._"
+_BUSY_MESSAGE = "The bot is busy right now, please try again in a moment."
+_NO_CALENDAR_MESSAGE = "This chat is not linked to a calendar yet, an admin can link one with `/calendar <calendar id>`"
+# commands that work before a chat is linked to a calendar
+_COMMANDS_WITHOUT_CALENDAR = ('help', 'calendar')
+_COMMAND_SECONDS = REGISTRY.histogram("bot_command_seconds", "Time taken to handle bot commands", ("command", "outcome"))
+_TELEGRAM_SEND_SECONDS = REGISTRY.histogram("telegram_send_seconds", "Time taken by Telegram sendMessage calls", ("outcome",))
 
 class CalendarBotHandler(telegram.ext.CommandHandler):
 
     def __init__(self, calanderService, calenderId, userEventStatusService: UserEventStatusService,
-                 eventFormatter: EventFormatter):
-        self._commands = ['upcoming', 'going', 'not',
-                          'undecided', 'details', 'help', 'create']
+                 eventFormatter: EventFormatter, eventLoopThread=None, rsvpWriteBuffer=None, renderedMessageCache=None,
+                 outboundMessageQueue=None, chatCalendarRegistry=None, adminUserIds=(), updateProfiler=None,
+                 calendarIoExecutor=None, listingSnapshotCache=None, rsvpButtons=None):
+        self._router = CommandRouter()
+        self._router.register('upcoming', self._on_upcoming)
+        self._router.register('going', self._on_going)
+        self._router.register('not', self._on_not)
+        self._router.register('undecided', self._on_undecided)
+        self._router.register('details', self._on_details)
+        self._router.register('help', self._on_help)
+        self._router.register('create', self._on_create)
+        if chatCalendarRegistry != None:
+            self._router.register('calendar', self._on_calendar)
+        if updateProfiler != None:
+            self._router.register('profile', self._on_profile)
         self._calendarService = calanderService
         self._calendar_id = calenderId
         self._userEventStatusService = userEventStatusService
         self._eventFormatter = eventFormatter
-        super().__init__(self._commands, self._callback)
-
-    def _is_command(self, message, botName, command):
-        return message.startswith("/%s" % command) \
-            or message.startswith("/%s%s" % (command, botName))
-
-    def _is_command_upcoming(self, message, botName):
-        return self._is_command(message, botName, "upcoming")
-
-    def _is_command_going_to_event(self, message, botName):
-        return self._is_command(message, botName, "going")
-
-    def _is_command_not_going_to_event(self, message, botName):
-        return self._is_command(message, botName, "not")
-
-    def _is_command_undecided_about_event(self, message, botName):
-        return self._is_command(message, botName, "undecided")
-
-    def _is_command_get_event_details(self, message, botName):
-        return self._is_command(message, botName, "details")
-
-    def _is_command_help(self, message, botName):
-        return self._is_command(message, botName, "help")
-
-    def _is_command_create_event(self, message, botName):
-        return self._is_command(message, botName, "create")
-
-    def get_event_number_from_user_args(self, context):
+        # needed when the calendar service is an AsyncGoogleCalendarService
+        self._eventLoopThread = eventLoopThread
+        self._rsvpWriteBuffer = rsvpWriteBuffer
+        self._renderedMessageCache = renderedMessageCache
+        # replies are sent from the queue's thread when one is given
+        self._outboundMessageQueue = outboundMessageQueue
+        # maps chats to calendars, calenderId is only used when there is no registry
+        self._chatCalendarRegistry = chatCalendarRegistry
+        self._adminUserIds = set(adminUserIds)
+        # profiles the next updates when an admin asks for it with /profile
+        self._updateProfiler = updateProfiler
+        # updates are handled on its workers rather than the dispatcher thread when one is given
+        self._calendarIoExecutor = calendarIoExecutor
+        # numbered follow-ups refer to the listing last shown in the chat when one is given
+        self._listingSnapshotCache = listingSnapshotCache
+        # Going / Not / Undecided buttons are attached to listings when given, see CalendarCallbackQueryHandler
+        self._rsvpButtons = rsvpButtons
+        super().__init__(self._router.getCommands(), self._callback)
+
+    def _then(self, context, chatId, result, callback, onError=None):
+        """Calls callback with the result of a calendar service call. The result of the async service is a coroutine,
+        callback is then called once it is done so no thread waits on Google meanwhile, and its errors are passed to
+        onError or replied to like _handle_update's."""
+        if not inspect.isawaitable(result):
+            callback(result)
+            return
+
+        def callbackWithResult(future):
+            try:
+                error = future.exception()
+                if error != None and onError != None:
+                    onError(error)
+                else:
+                    callback(future.result())
+            except Exception as e:
+                self._reply_to_error(context, chatId, e)
+
+        self._eventLoopThread.whenDone(result, TRACER.wrap(callbackWithResult))
+
+    def _send_message(self, context, chatId, *args, **kwargs):
+        if self._outboundMessageQueue != None:
+            with TRACER.span("telegram enqueue"):
+                self._outboundMessageQueue.enqueue(context.bot, chatId, *args, **kwargs)
+        else:
+            started = time.perf_counter()
+            outcome = "error"
+            try:
+                with TRACER.span("telegram send"):
+                    context.bot.send_message(chatId, *args, **kwargs)
+                outcome = "ok"
+            finally:
+                _TELEGRAM_SEND_SECONDS.labels(outcome).observe(time.perf_counter() - started)
+
+    def registerCommand(self, name, handler):
+        """Handles /name with handler(context, chatId, update, command), where command is a ParsedCommand."""
+        self._router.register(name, handler)
+        if name.lower() not in self.command:
+            self.command.append(name.lower())
+
+    def get_event_number_from_user_args(self, arguments):
         eventNumber = 0
-        if len(context.args) > 0:
+        if len(arguments) > 0:
             try:
-                eventNumber = int(context.args[0])
-            except:
-                print("Could not get number from user arguments %s" % (context.arg))
+                eventNumber = int(arguments[0])
+            except ValueError:
+                LOG.info("Could not get number from user arguments %s" % arguments)
                 eventNumber = 0
         else:
             # if user does not specify any number or any arbitrary arguments
@@ -58,133 +127,299 @@ class CalendarBotHandler(telegram.ext.CommandHandler):
         return eventNumber
 
     def _callback(self, update, context):
+        if self._calendarIoExecutor == None:
+            self._dispatch(update, context)
+            return
+        try:
+            self._calendarIoExecutor.submitRead(self._dispatch, update, context)
+        except CalendarIoBusyError as e:
+            LOG.info(e)
+            _COMMAND_SECONDS.labels("unknown", "busy").observe(0)
+            self._send_message(context, update.effective_chat.id, _BUSY_MESSAGE)
+
+    def _dispatch(self, update, context):
+        # updates built by hand, e.g. the benchmarks', carry no update_id
+        updateId = getattr(update, "update_id", None)
+        with TRACER.span("dispatch update", **({"telegram.update_id": updateId} if updateId != None else {})):
+            if self._updateProfiler != None and self._updateProfiler.isActive():
+                self._updateProfiler.profile(self._handle_update, update, context)
+            else:
+                self._handle_update(update, context)
+
+    def _handle_update(self, update, context):
+        started = time.perf_counter()
+        # only routed command names are used as labels so unknown commands can not add new series
+        commandName = "unknown"
+        outcome = "ok"
         try:
             chatId = update.effective_chat.id
             message = update.effective_message.text
-            botName = context.bot.name
-            if self._is_command_upcoming(message, botName):
-                self._send_events(context, chatId, update)
-
-            elif self._is_command_going_to_event(message, botName):
-                eventNumber = self.get_event_number_from_user_args(context)
-                self._going_to_event(context, chatId, update, eventNumber)
-
-            elif self._is_command_not_going_to_event(message, botName):
-                eventNumber = self.get_event_number_from_user_args(context)
-                self._not_going_to_event(context, chatId, update, eventNumber)
-
-            elif self._is_command_undecided_about_event(message, botName):
-                eventNumber = self.get_event_number_from_user_args(context)
-                self._undecided_about_event(context, chatId, update, eventNumber)
-
-            elif self._is_command_get_event_details(message, botName):
-                eventToSee = self.get_event_number_from_user_args(context)
-                self._see_event_details(context, chatId, eventToSee)
-
-            elif self._is_command_create_event(message, botName):
-                quickCreateString = self._get_quick_create_string(message, botName)
-                self._quick_create_event(context, chatId, update, quickCreateString)
-
-            elif self._is_command_help(message, botName):
-                self._send_help_message(context, chatId)
-
+            command = ParsedCommand.parse(message)
+            if command != None and not command.isFor(context.bot.name):
+                # meant for another bot in the group
+                return
+
+            handler = self._router.route(command) if command != None else None
+            if handler != None and command.name not in _COMMANDS_WITHOUT_CALENDAR \
+                    and self._get_calendar_id(chatId) == None:
+                self._send_message(context, chatId, _NO_CALENDAR_MESSAGE, telegram.ParseMode.MARKDOWN)
+                outcome = "no_calendar"
+            elif handler != None:
+                commandName = command.name
+                TRACER.currentSpan().setAttribute("bot.command", commandName)
+                handler(context, chatId, update, command)
             else:
                 self.unsupportedCommand(context, chatId, message)
         except Exception as e:
-            context.bot.send_message(chatId, "An exception occurred while processing command, contact developer(s)")
-            LOG.error(e)
-
-    def _get_quick_create_string(self, message, botName):
-        command = "/create"
-        quickCreateString = ""
-        if message.find(botName) != -1:
-            chrToSkip = len(command) + len(botName) + 1 # including space at the end
-            quickCreateString = message[chrToSkip:]
+            outcome = self._reply_to_error(context, chatId, e)
+        finally:
+            _COMMAND_SECONDS.labels(commandName, outcome).observe(time.perf_counter() - started)
+
+    def _reply_to_error(self, context, chatId, error):
+        """Tells the chat that its command failed, returns the outcome for the command metrics."""
+        if isinstance(error, CalendarUnavailableError):
+            self._send_message(context, chatId, _UNAVAILABLE_MESSAGE)
+            LOG.info(error)
+            return "unavailable"
+        if isinstance(error, CalendarIoBusyError):
+            self._send_message(context, chatId, _BUSY_MESSAGE)
+            LOG.info(error)
+            return "busy"
+        self._send_message(context, chatId, "An exception occurred while processing command, contact developer(s)")
+        LOG.error(error)
+        return "error"
+
+    def _on_upcoming(self, context, chatId, update, command):
+        self._send_events(context, chatId, update)
+
+    def _on_going(self, context, chatId, update, command):
+        self._going_to_event(context, chatId, update, self.get_event_number_from_user_args(command.arguments))
+
+    def _on_not(self, context, chatId, update, command):
+        self._not_going_to_event(context, chatId, update, self.get_event_number_from_user_args(command.arguments))
+
+    def _on_undecided(self, context, chatId, update, command):
+        self._undecided_about_event(context, chatId, update, self.get_event_number_from_user_args(command.arguments))
+
+    def _on_details(self, context, chatId, update, command):
+        self._see_event_details(context, chatId, self.get_event_number_from_user_args(command.arguments))
+
+    def _on_create(self, context, chatId, update, command):
+        self._quick_create_event(context, chatId, update, command.argumentText)
+
+    def _on_help(self, context, chatId, update, command):
+        self._send_help_message(context, chatId)
+
+    def _get_calendar_id(self, chatId):
+        if self._chatCalendarRegistry != None:
+            return self._chatCalendarRegistry.getCalendarId(chatId)
+        return self._calendar_id
+
+    def _on_calendar(self, context, chatId, update, command):
+        if len(command.arguments) == 0:
+            calendarId = self._get_calendar_id(chatId)
+            message = "This chat uses calendar `%s`" % calendarId if calendarId != None else _NO_CALENDAR_MESSAGE
+        elif update.effective_user.id not in self._adminUserIds:
+            message = "Only admins can change the calendar of a chat"
         else:
-            chrToSkip = len(command)
-            quickCreateString = message[chrToSkip:]
-
-        return quickCreateString
+            self._chatCalendarRegistry.setCalendarId(chatId, command.arguments[0])
+            message = "This chat now uses calendar `%s`" % command.arguments[0]
+        self._send_message(context, chatId, message, telegram.ParseMode.MARKDOWN)
+
+    def _on_profile(self, context, chatId, update, command):
+        if update.effective_user.id not in self._adminUserIds:
+            self._send_message(context, chatId, "Only admins can profile the bot")
+            return
+        updateCount = self.get_event_number_from_user_args(command.arguments)
+        mode = command.arguments[1] if len(command.arguments) > 1 else MODE_CPROFILE
+        if updateCount <= 0 or mode not in (MODE_CPROFILE, MODE_SAMPLING):
+            self._send_message(context, chatId, "Usage: `/profile <number of updates> [%s|%s]`" % (MODE_CPROFILE, MODE_SAMPLING),
+                               telegram.ParseMode.MARKDOWN)
+            return
+
+        def sendProfile(path, summary):
+            self._send_message(context, chatId, "Profile written to %s\n%s" % (path, summary))
+
+        if self._updateProfiler.start(updateCount, mode, sendProfile):
+            message = "Profiling the next %d updates with %s" % (updateCount, mode)
+        else:
+            message = "A profile is already running"
+        self._send_message(context, chatId, message)
+
+    def _with_listed_event(self, context, chatId, calendarId, index, callback):
+        """Calls callback with the event numbered index + 1 in the listing last shown in the chat, or in the upcoming
+        events without one, None when there is no such event."""
+        eventIds = self._listingSnapshotCache.get(chatId, calendarId) if self._listingSnapshotCache != None else None
+        if eventIds != None:
+            if index >= len(eventIds):
+                callback(None)
+                return
+            # looked up by id, so the number still means the event the user saw even if the list has moved on
+            self._with_event(context, chatId, calendarId, eventIds[index],
+                             lambda event: callback(CalendarEvent.fromGoogleEvent(event) if event != None else None))
+            return
+
+        self._then(context, chatId, self._calendarService.getUpcomingEvents(calendarId),
+                   lambda events: callback(CalendarEvent.fromGoogleEvent(events[index]) if index < len(events) else None))
+
+    def _with_event(self, context, chatId, calendarId, eventId, callback):
+        """Calls callback with the event from the calendar service's local copy, only asking Google when the copy does
+        not hold it."""
+        def withLocalEvent(event):
+            if event == None:
+                self._then(context, chatId, self._calendarService.getCurrentEvent(calendarId, eventId), callback)
+            else:
+                callback(event)
 
-    def _get_upcoming_events(self):
-        return self._calendarService.getUpcomingEvents(self._calendar_id)
+        getLocalEvent = getattr(self._calendarService, "getLocalEvent", None)
+        if getLocalEvent == None:
+            withLocalEvent(None)
+        else:
+            self._then(context, chatId, getLocalEvent(calendarId, eventId), withLocalEvent)
+
+    def _get_rsvp_keyboard(self, eventIds, numbered=True):
+        """The reply_markup keyword argument for a message about eventIds, none without RSVP buttons."""
+        if self._rsvpButtons == None or len(eventIds) == 0:
+            return {}
+        return {"reply_markup": self._rsvpButtons.getKeyboard(eventIds, numbered)}
+
+    def _get_rendered_message(self, key, renderMessage):
+        if self._renderedMessageCache == None:
+            with TRACER.span("format message"):
+                return renderMessage()
+
+        message = self._renderedMessageCache.get(key)
+        if message == None:
+            with TRACER.span("format message"):
+                message = renderMessage()
+            self._renderedMessageCache.put(key, message)
+        return message
 
     def _send_events(self, context, chatId, update):
-        events = self._get_upcoming_events()
+        calendarId = self._get_calendar_id(chatId)
+        self._then(context, chatId, self._calendarService.getUpcomingEvents(calendarId),
+                   lambda events: self._send_upcoming_events(context, chatId, calendarId, events))
 
+    def _send_upcoming_events(self, context, chatId, calendarId, events):
         def formattedEvent(index, event):
             return self._eventFormatter.getFormattedDateOrDatesForEvent(index, event)
 
-        eventsString = "\n".join([formattedEvent(index, e)
-                                  for index, e in enumerate(events)])
+        def renderMessage():
+            eventsString = "\n".join([formattedEvent(index, CalendarEvent.fromGoogleEvent(e))
+                                      for index, e in enumerate(events)])
+            return "Events coming up:\n%s" % eventsString
 
-        context.bot.send_message(
-            chatId, "Events coming up:\n%s" % eventsString, telegram.ParseMode.MARKDOWN)
+        key = (calendarId, "upcoming", tuple(RenderedMessageCache.getEventVersion(e) for e in events))
+        message = self._get_rendered_message(key, renderMessage)
+        if self._listingSnapshotCache != None:
+            self._listingSnapshotCache.put(chatId, calendarId, [e["id"] for e in events])
+        if isStale(events):
+            message += _STALE_EVENTS_NOTE
+        self._send_message(context, chatId, message, telegram.ParseMode.MARKDOWN,
+                           **self._get_rsvp_keyboard([e["id"] for e in events]))
 
     def _get_user_name(self, update):
         return update.effective_user.full_name
 
-    def _going_callback(self, userName, event):
-        eventId = event["id"]
-        self._calendarService.setGoingToEvent(
-            self._calendar_id, eventId, userName)
-        return "%s is going to %s" % (userName, self._eventFormatter.getSummaryWLinkTelegram(event))
+    def _set_user_status(self, calendarId, userName, event, updatedStatus):
+        """Returns a coroutine for the write when the calendar service is async."""
+        if updatedStatus == _GOING:
+            return self._calendarService.setGoingToEvent(calendarId, event.id, userName, event.raw)
+        elif updatedStatus == _NOT:
+            return self._calendarService.setNotGoingToEvent(calendarId, event.id, userName, event.raw)
+        return self._calendarService.setUndecidedAboutEvent(calendarId, event.id, userName, event.raw)
+
+    def _get_user_status_message(self, userName, event, updatedStatus):
+        return _USER_STATUS_MESSAGES[updatedStatus] % (userName, self._eventFormatter.getSummaryWLinkTelegram(event))
 
     def _going_to_event(self, context, chatId, update, eventNumber):
         self._update_event_on_google_cal(
-            context, chatId, update, eventNumber, self._going_callback)
-
-    def _not_going_callback(self, userName, event):
-        eventId = event["id"]
-        self._calendarService.setNotGoingToEvent(
-            self._calendar_id, eventId, userName)
-        return "%s is not going to %s" % (userName, self._eventFormatter.getSummaryWLinkTelegram(event))
+            context, chatId, update, eventNumber, _GOING)
 
     def _not_going_to_event(self, context, chatId, update, eventNumber):
         self._update_event_on_google_cal(
-            context, chatId, update, eventNumber, self._not_going_callback)
-
-    def _undecided_callback(self, userName, event):
-        eventId = event["id"]
-        self._calendarService.setUndecidedAboutEvent(
-            self._calendar_id, eventId, userName)
-        return "%s is undecided about %s" % (userName, self._eventFormatter.getSummaryWLinkTelegram(event))
+            context, chatId, update, eventNumber, _NOT)
 
     def _undecided_about_event(self, context, chatId, update, eventNumber):
         self._update_event_on_google_cal(
-            context, chatId, update, eventNumber, self._undecided_callback)
+            context, chatId, update, eventNumber, _UNDECIDED)
 
-    def _update_event_on_google_cal(self, context, chatId, update, eventNumber, calendarServiceCallback):
+    def _update_event_on_google_cal(self, context, chatId, update, eventNumber, updatedStatus):
         index = eventNumber - 1
         message = "Invalid Event Number see /upcoming for event numbers \n\t\t (or leave out number for first event)"
-        if index >= 0:
-            userName = self._get_user_name(update)
-            events = self._get_upcoming_events()
-            if index < len(events):
-                try:
-                    message = calendarServiceCallback(userName, events[index])
-                except Exception as e:
-                    print(e)
-                    message = "Unable to update the Google Calendar, please try again later."
-
-        context.bot.send_message(chatId, message, telegram.ParseMode.MARKDOWN)
+        if index < 0:
+            self._send_message(context, chatId, message, telegram.ParseMode.MARKDOWN)
+            return
+        userName = self._get_user_name(update)
+        calendarId = self._get_calendar_id(chatId)
+
+        def updateStatus(event):
+            if event == None:
+                self._send_message(context, chatId, message, telegram.ParseMode.MARKDOWN)
+            elif self._rsvpWriteBuffer != None:
+                self._buffer_user_status(context, chatId, calendarId, userName, event, updatedStatus)
+            elif self._calendarIoExecutor != None and self._eventLoopThread == None:
+                self._queue_user_status(context, chatId, calendarId, userName, event, updatedStatus)
+            else:
+                # the async service's writes are not queued, they run on the event loop and retry on a changed etag
+                self._write_user_status(context, chatId, calendarId, userName, event, updatedStatus)
+
+        self._with_listed_event(context, chatId, calendarId, index, updateStatus)
+
+    def _write_user_status(self, context, chatId, calendarId, userName, event, updatedStatus):
+        def sendConfirmation(result):
+            message = self._get_user_status_message(userName, event, updatedStatus)
+            self._send_message(context, chatId, message, telegram.ParseMode.MARKDOWN)
+
+        def sendFailure(error):
+            LOG.error(error)
+            self._send_message(context, chatId, _UPDATE_FAILED_MESSAGE, telegram.ParseMode.MARKDOWN)
+
+        try:
+            result = self._set_user_status(calendarId, userName, event, updatedStatus)
+        except Exception as e:
+            sendFailure(e)
+            return
+        self._then(context, chatId, result, sendConfirmation, sendFailure)
+
+    def _confirm_when_written(self, context, chatId, userName, event, updatedStatus, future):
+        def sendConfirmation(future):
+            if future.exception() != None:
+                message = _UPDATE_FAILED_MESSAGE
+            else:
+                message = self._get_user_status_message(userName, event, updatedStatus)
+            self._send_message(context, chatId, message, telegram.ParseMode.MARKDOWN)
+
+        future.add_done_callback(sendConfirmation)
+
+    def _buffer_user_status(self, context, chatId, calendarId, userName, event, updatedStatus):
+        # the confirmation is sent once the buffered write reaches the calendar
+        future = self._rsvpWriteBuffer.submit(calendarId, event.raw, userName, updatedStatus)
+        self._confirm_when_written(context, chatId, userName, event, updatedStatus, future)
+
+    def _queue_user_status(self, context, chatId, calendarId, userName, event, updatedStatus):
+        # writes to one event run one after another, the worker moves on to the next update meanwhile
+        future = self._calendarIoExecutor.submitWrite((calendarId, event.id), self._set_user_status,
+                                                      calendarId, userName, event, updatedStatus)
+        self._confirm_when_written(context, chatId, userName, event, updatedStatus, future)
 
     def _see_event_details(self, context, chatId, eventToSee):
-        events = self._get_upcoming_events()
+        calendarId = self._get_calendar_id(chatId)
         index = eventToSee - 1
-        message = "Valid Event Number Required \n\t\t For Example: `/details 1` \n\t\t (or `/details` for first event)"
-        if index >= 0 and index < len(events):
-            description = lambda event: (event["description"] if "description" in event else "")
-
-            # one index events since this has more meaning in a message form
-            formattedEventDescription = description(events[index])
-            eventDesc = ""
-            attendeeStatusString = None
-            if len(formattedEventDescription) > 0:
-                eventDesc = self._userEventStatusService.getDescriptionFromFormattedDescription(formattedEventDescription)
-                attendeeStatusString = self._userEventStatusService.getAttendeeStatusString(formattedEventDescription)
+        if index < 0:
+            self._send_event_details(context, chatId, calendarId, index, None)
+            return
+        self._with_listed_event(context, chatId, calendarId, index,
+                                lambda event: self._send_event_details(context, chatId, calendarId, index, event))
 
+    def _send_event_details(self, context, chatId, calendarId, index, event):
+        message = "Valid Event Number Required \n\t\t For Example: `/details 1` \n\t\t (or `/details` for first event)"
+        if event != None:
             def formattedEvent(index, event):
+                eventDesc = self._userEventStatusService.getDescriptionForEvent(event.raw)
+                attendeeStatusString = self._userEventStatusService.getAttendeeStatusStringForEvent(event.raw)
+
+                # one index events since this has more meaning in a message form
                 eventAsFormattedString = str(index + 1) + ". " + self._eventFormatter.getSummaryWLinkTelegram(event) \
                 + "\n`" + self._eventFormatter.getDayOrDaysAsFormattedDates(event)
                 if not self._eventFormatter.isAllDayEvent(event):
@@ -194,28 +429,32 @@ class CalendarBotHandler(telegram.ext.CommandHandler):
                     + ("\n\nAttendee Information:\n" + "%s" % attendeeStatusString if attendeeStatusString != None else "")
 
                 return eventAsFormattedString
-            message = formattedEvent(index, events[index])
+            key = (calendarId, "details", index, RenderedMessageCache.getEventVersion(event.raw))
+            message = self._get_rendered_message(key, lambda: formattedEvent(index, event))
+            self._send_message(context, chatId, "%s" % message, telegram.ParseMode.MARKDOWN,
+                               **self._get_rsvp_keyboard([event.id], numbered=False))
+            return
 
-        context.bot.send_message(chatId, "%s" %
-                                 message, telegram.ParseMode.MARKDOWN)
+        self._send_message(context, chatId, "%s" % message, telegram.ParseMode.MARKDOWN)
 
     def _quick_create_event(self, context, chatId, update, quickCreateString):
         userName = self._get_user_name(update)
-        result = None
-        if len(quickCreateString) != 0:
-            result = self._calendarService.quickCreateEvent(
-                self._calendar_id, quickCreateString)
+        if len(quickCreateString) == 0:
+            self._send_created_event(context, chatId, userName, None)
+            return
+        self._then(context, chatId, self._calendarService.quickCreateEvent(self._get_calendar_id(chatId), quickCreateString),
+                   lambda result: self._send_created_event(context, chatId, userName, result))
 
+    def _send_created_event(self, context, chatId, userName, result):
         if result == None:
             message = "You did not enter anything so an event will not be created.\n" \
                 + "An example of this command: `/create Some Event on Tuesday 1-2pm`\n" \
                 + "Or... `/create Some Event on July 30th 11-4pm`"
-            context.bot.send_message(
-                chatId, message, telegram.ParseMode.MARKDOWN)
+            self._send_message(context, chatId, message, telegram.ParseMode.MARKDOWN)
         elif "error" in result:
-            context.bot.send_message(chatId, "%s" % (result["error"]))
+            self._send_message(context, chatId, "%s" % (result["error"]))
         else:
-            context.bot.send_message(chatId, "%s created %s" % (
+            self._send_message(context, chatId, "%s created %s" % (
                 userName, self._eventFormatter.getSummaryWLinkTelegram(result)), telegram.ParseMode.MARKDOWN)
 
     def _send_help_message(self, context, chatId):
@@ -230,8 +469,7 @@ class CalendarBotHandler(telegram.ext.CommandHandler):
             + "\n\t\t Ex: /undecided 1" \
             + "\n/details <number> - See additional information about specified event" \
             + "\n\t\t Ex: /details 1"
-        context.bot.send_message(chatId, helpMessage)
+        self._send_message(context, chatId, helpMessage)
 
     def unsupportedCommand(self, context, chatId, command):
-        context.bot.send_message(
-            chatId, "I do not support the command %s yet" % command)
+        self._send_message(context, chatId, "I do not support the command %s yet" % command)
@@ -2,10 +2,22 @@ from service.calendarBotHandler import CalendarBotHandler
 from service.userEventStatusService import UserEventStatusService, _HIDDEN_CHAR, _START_OF_ATTENDEE_INFO
 from service.eventFormatter import GoogleEventFormatter
 from service.googleCalendarService import _GOING, _NOT, _UNDECIDED
+from service.eventLoopThread import EventLoopThread
+from service.rsvpWriteBuffer import RsvpWriteBuffer
+from service.renderedMessageCache import RenderedMessageCache
+from service.chatCalendarRegistry import ChatCalendarRegistry
+from service.calendarIoExecutor import CalendarIoExecutor
+from service.listingSnapshotCache import ListingSnapshotCache
+from service.rsvpButtons import RsvpButtons
+from service.metrics import REGISTRY
+from service.resilientCalendarService import CalendarUnavailableError, StaleList
+from service.tracing import TRACER
 import unittest
 from unittest import mock
 import telegram
 import json
+import threading
+from types import SimpleNamespace
 
 botName = "@botName"
 
@@ -49,6 +61,25 @@ class CalendarBotHandlerTest(unittest.TestCase):
         self.calendarBotHandler._callback(update, context)
         context.bot.send_message.assert_called_once_with(chatId, "Events coming up:\n%s" % expectedFormattedEvents, telegram.ParseMode.MARKDOWN)
     
+    def test_stale_upcoming_events_are_marked(self):
+        update, context, chatId = self.createMockResourcesForTests()
+        update.effective_message.text = "/upcoming"
+        self.mockGoogleCalendarService.getUpcomingEvents.return_value = StaleList()
+
+        self.calendarBotHandler._callback(update, context)
+        message = context.bot.send_message.call_args.args[1]
+        self.assertTrue(message.startswith("Events coming up:\n"))
+        self.assertIn("may be out of date", message)
+
+    def test_calendar_unavailable(self):
+        update, context, chatId = self.createMockResourcesForTests()
+        update.effective_message.text = "/upcoming"
+        self.mockGoogleCalendarService.getUpcomingEvents.side_effect = CalendarUnavailableError("circuit breaker is open")
+
+        self.calendarBotHandler._callback(update, context)
+        context.bot.send_message.assert_called_once_with(
+            chatId, "Google Calendar can not be reached right now, please try again in a minute.")
+
     def test_two_upcoming_events(self):
         update, context, chatId = self.createMockResourcesForTests()
         command = "/upcoming"
@@ -65,6 +96,17 @@ class CalendarBotHandlerTest(unittest.TestCase):
         self.calendarBotHandler._callback(update, context)
         context.bot.send_message.assert_called_once_with(chatId, "Events coming up:\n%s" % expectedFormattedEvents, telegram.ParseMode.MARKDOWN)
 
+    def test_going_to_event_passes_listed_event_to_calendar_service(self):
+        update, context, chatId = self.createMockResourcesForTests()
+        update.effective_user.full_name = "full name"
+        update.effective_message.text = "/going 2"
+        context.args = ['2']
+        self.mockUpcomingEvents()
+
+        self.calendarBotHandler._callback(update, context)
+        events = self.mockGoogleCalendarService.getUpcomingEvents()
+        self.mockGoogleCalendarService.setGoingToEvent.assert_called_once_with("calendarId", events[1]["id"], "full name", events[1])
+
     def test_going_to_event(self):
         update, context, chatId = self.createMockResourcesForTests()
         fullName = "full name"
@@ -305,4 +347,336 @@ class CalendarBotHandlerTest(unittest.TestCase):
             + "An example of this command: `/create Some Event on Tuesday 1-2pm`\n" \
             + "Or... `/create Some Event on July 30th 11-4pm`"
 
-        context.bot.send_message.assert_called_with(chatId, expectedMessage, telegram.ParseMode.MARKDOWN)
\ No newline at end of file
+        context.bot.send_message.assert_called_with(chatId, expectedMessage, telegram.ParseMode.MARKDOWN)
+    def test_awaits_async_calendar_service(self):
+        update, context, chatId = self.createMockResourcesForTests()
+        fullName = "full name"
+        update.effective_user.full_name = fullName
+        update.effective_message.text = "/going 2"
+        context.args = ['2']
+        with open("./service/eventResponseTest.json") as eventResponseText:
+            events = json.load(eventResponseText)["items"]
+        asyncCalendarService = mock.AsyncMock()
+        asyncCalendarService.getUpcomingEvents.return_value = events
+        eventLoopThread = EventLoopThread()
+        calendarBotHandler = CalendarBotHandler(asyncCalendarService, "calendarId", UserEventStatusService(),
+                                                GoogleEventFormatter(), eventLoopThread=eventLoopThread)
+        # the reply is sent once the write is done, the dispatching thread does not wait for it
+        replied = threading.Event()
+        context.bot.send_message.side_effect = lambda *args, **kwargs: replied.set()
+
+        calendarBotHandler._callback(update, context)
+        self.assertTrue(replied.wait(5))
+        eventLoopThread.stop()
+
+        asyncCalendarService.setGoingToEvent.assert_awaited_once_with("calendarId", events[1]["id"], fullName, events[1])
+        context.bot.send_message.assert_called_once_with(chatId, "%s is going to [Game Night](gameNightHtmlLink)" % fullName, telegram.ParseMode.MARKDOWN)
+
+    def test_failed_async_calls_are_replied_to(self):
+        update, context, chatId = self.createMockResourcesForTests()
+        update.effective_message.text = "/going 1"
+        with open("./service/eventResponseTest.json") as eventResponseText:
+            events = json.load(eventResponseText)["items"]
+        asyncCalendarService = mock.AsyncMock()
+        asyncCalendarService.getUpcomingEvents.return_value = events
+        asyncCalendarService.setGoingToEvent.side_effect = Exception("Could not update statuses")
+        eventLoopThread = EventLoopThread()
+        calendarBotHandler = CalendarBotHandler(asyncCalendarService, "calendarId", UserEventStatusService(),
+                                                GoogleEventFormatter(), eventLoopThread=eventLoopThread)
+        replied = threading.Event()
+        context.bot.send_message.side_effect = lambda *args, **kwargs: replied.set()
+
+        calendarBotHandler._callback(update, context)
+        self.assertTrue(replied.wait(5))
+        replied.clear()
+        asyncCalendarService.getUpcomingEvents.side_effect = CalendarUnavailableError("Google Calendar is unavailable")
+        update.effective_message.text = "/upcoming"
+        calendarBotHandler._callback(update, context)
+        self.assertTrue(replied.wait(5))
+        eventLoopThread.stop()
+
+        context.bot.send_message.assert_has_calls([
+            mock.call(chatId, "Unable to update the Google Calendar, please try again later.", telegram.ParseMode.MARKDOWN),
+            mock.call(chatId, "Google Calendar can not be reached right now, please try again in a minute.")])
+
+    def test_updates_are_handled_on_calendar_io_workers(self):
+        update, context, chatId = self.createMockResourcesForTests()
+        fullName = "full name"
+        update.effective_user.full_name = fullName
+        update.effective_message.text = "/going 2"
+        self.mockUpcomingEvents()
+        written = threading.Event()
+        self.mockGoogleCalendarService.setGoingToEvent.side_effect = lambda *args: written.set()
+        calendarIoExecutor = CalendarIoExecutor(maxWorkers=2, maxPending=10)
+        calendarBotHandler = CalendarBotHandler(self.mockGoogleCalendarService, "calendarId", UserEventStatusService(),
+                                                GoogleEventFormatter(), calendarIoExecutor=calendarIoExecutor)
+
+        calendarBotHandler._callback(update, context)
+        self.assertTrue(written.wait(5))
+        calendarIoExecutor.shutdown()
+        context.bot.send_message.assert_called_once_with(chatId, "%s is going to [Game Night](gameNightHtmlLink)" % fullName,
+                                                         telegram.ParseMode.MARKDOWN)
+
+    def test_busy_when_calendar_io_backlog_is_full(self):
+        update, context, chatId = self.createMockResourcesForTests()
+        update.effective_message.text = "/upcoming"
+        calendarBotHandler = CalendarBotHandler(self.mockGoogleCalendarService, "calendarId", UserEventStatusService(),
+                                                GoogleEventFormatter(), calendarIoExecutor=CalendarIoExecutor(maxPending=0))
+
+        calendarBotHandler._callback(update, context)
+        context.bot.send_message.assert_called_once_with(chatId, "The bot is busy right now, please try again in a moment.")
+        self.mockGoogleCalendarService.getUpcomingEvents.assert_not_called()
+
+    def test_numbered_commands_use_the_listing_shown(self):
+        update, context, chatId = self.createMockResourcesForTests()
+        update.effective_user.full_name = "full name"
+        self.mockUpcomingEvents()
+        events = self.mockGoogleCalendarService.getUpcomingEvents.return_value
+        calendarBotHandler = CalendarBotHandler(self.mockGoogleCalendarService, "calendarId", UserEventStatusService(),
+                                                GoogleEventFormatter(), listingSnapshotCache=ListingSnapshotCache(60, 10))
+        update.effective_message.text = "/upcoming"
+        calendarBotHandler._callback(update, context)
+
+        # the first event has started and dropped out of the upcoming events since they were listed
+        self.mockGoogleCalendarService.getUpcomingEvents.return_value = events[1:]
+        self.mockGoogleCalendarService.getLocalEvent.return_value = None
+        self.mockGoogleCalendarService.getCurrentEvent.return_value = events[1]
+        update.effective_message.text = "/going 2"
+        calendarBotHandler._callback(update, context)
+
+        self.mockGoogleCalendarService.getUpcomingEvents.assert_called_once_with("calendarId")
+        self.mockGoogleCalendarService.getCurrentEvent.assert_called_once_with("calendarId", events[1]["id"])
+        self.mockGoogleCalendarService.setGoingToEvent.assert_called_once_with("calendarId", events[1]["id"], "full name", events[1])
+
+        update.effective_message.text = "/details 5"
+        calendarBotHandler._callback(update, context)
+        self.assertTrue(context.bot.send_message.call_args.args[1].startswith("Valid Event Number Required"))
+        self.assertEqual(self.mockGoogleCalendarService.getCurrentEvent.call_count, 1)
+
+    def test_numbered_commands_read_the_local_copy_first(self):
+        update, context, chatId = self.createMockResourcesForTests()
+        update.effective_user.full_name = "full name"
+        self.mockUpcomingEvents()
+        events = self.mockGoogleCalendarService.getUpcomingEvents.return_value
+        calendarBotHandler = CalendarBotHandler(self.mockGoogleCalendarService, "calendarId", UserEventStatusService(),
+                                                GoogleEventFormatter(), listingSnapshotCache=ListingSnapshotCache(60, 10))
+        update.effective_message.text = "/upcoming"
+        calendarBotHandler._callback(update, context)
+
+        self.mockGoogleCalendarService.getLocalEvent.return_value = events[1]
+        update.effective_message.text = "/going 2"
+        calendarBotHandler._callback(update, context)
+
+        self.mockGoogleCalendarService.getLocalEvent.assert_called_once_with("calendarId", events[1]["id"])
+        self.mockGoogleCalendarService.getCurrentEvent.assert_not_called()
+        self.mockGoogleCalendarService.setGoingToEvent.assert_called_once_with("calendarId", events[1]["id"], "full name", events[1])
+
+    def test_listings_carry_rsvp_buttons(self):
+        update, context, chatId = self.createMockResourcesForTests()
+        self.mockUpcomingEvents()
+        events = self.mockGoogleCalendarService.getUpcomingEvents.return_value
+        calendarBotHandler = CalendarBotHandler(self.mockGoogleCalendarService, "calendarId", UserEventStatusService(),
+                                                GoogleEventFormatter(), rsvpButtons=RsvpButtons())
+        update.effective_message.text = "/upcoming"
+        calendarBotHandler._callback(update, context)
+        keyboard = context.bot.send_message.call_args.kwargs["reply_markup"].inline_keyboard
+        self.assertEqual(len(keyboard), len(events))
+        self.assertEqual(calendarBotHandler._rsvpButtons.parseCallbackData(keyboard[1][0].callback_data), (events[1]["id"], _GOING))
+
+        update.effective_message.text = "/details 2"
+        calendarBotHandler._callback(update, context)
+        keyboard = context.bot.send_message.call_args.kwargs["reply_markup"].inline_keyboard
+        self.assertEqual([button.text for button in keyboard[0]], ["Going", "Not", "Undecided"])
+
+    def test_going_to_event_with_write_buffer(self):
+        update, context, chatId = self.createMockResourcesForTests()
+        fullName = "full name"
+        update.effective_user.full_name = fullName
+        update.effective_message.text = "/going 1"
+        context.args = ['1']
+        self.mockUpcomingEvents()
+        events = self.mockGoogleCalendarService.getUpcomingEvents()
+        rsvpWriteBuffer = RsvpWriteBuffer(self.mockGoogleCalendarService, 60, 10)
+        calendarBotHandler = CalendarBotHandler(self.mockGoogleCalendarService, "calendarId", UserEventStatusService(),
+                                                GoogleEventFormatter(), rsvpWriteBuffer=rsvpWriteBuffer)
+
+        calendarBotHandler._callback(update, context)
+        context.bot.send_message.assert_not_called()
+
+        rsvpWriteBuffer.stop()
+        self.mockGoogleCalendarService.setUserStatusesForEvent.assert_called_once_with("calendarId", events[0]["id"], {fullName: _GOING}, events[0])
+        context.bot.send_message.assert_called_once_with(chatId, "%s is going to [Star Wars: The Rise of Skywalker (2019)](starWarsHtmlLink)" % fullName, telegram.ParseMode.MARKDOWN)
+
+    def test_rendered_messages_are_reused_until_events_change(self):
+        update, context, chatId = self.createMockResourcesForTests()
+        self.mockUpcomingEvents()
+        renderedMessageCache = RenderedMessageCache(10)
+        eventFormatter = mock.MagicMock(wraps=GoogleEventFormatter())
+        calendarBotHandler = CalendarBotHandler(self.mockGoogleCalendarService, "calendarId", UserEventStatusService(),
+                                                eventFormatter, renderedMessageCache=renderedMessageCache)
+
+        update.effective_message.text = "/upcoming"
+        calendarBotHandler._callback(update, context)
+        calendarBotHandler._callback(update, context)
+        self.assertEqual(eventFormatter.getFormattedDateOrDatesForEvent.call_count, 4)
+        self.assertEqual(context.bot.send_message.call_args_list[0], context.bot.send_message.call_args_list[1])
+
+        update.effective_message.text = "/details 2"
+        context.args = ['2']
+        calendarBotHandler._callback(update, context)
+        calendarBotHandler._callback(update, context)
+        self.assertEqual(eventFormatter.getDayOrDaysAsFormattedDates.call_count, 1)
+
+        events = self.mockGoogleCalendarService.getUpcomingEvents()
+        events[1]["etag"] = "\"changed\""
+        events[1]["summary"] = "Changed"
+        calendarBotHandler._callback(update, context)
+        self.assertEqual(eventFormatter.getDayOrDaysAsFormattedDates.call_count, 2)
+        self.assertTrue(context.bot.send_message.call_args.args[1].startswith("2. [Changed]"))
+        self.assertEqual(renderedMessageCache.getStats()["hits"], 2)
+
+    def test_command_must_match_whole_name(self):
+        update, context, chatId = self.createMockResourcesForTests()
+        update.effective_message.text = "/notify 1"
+        self.mockUpcomingEvents()
+
+        self.calendarBotHandler._callback(update, context)
+        self.mockGoogleCalendarService.setNotGoingToEvent.assert_not_called()
+        context.bot.send_message.assert_called_once_with(chatId, "I do not support the command /notify 1 yet")
+
+    def test_command_for_another_bot_is_ignored(self):
+        update, context, chatId = self.createMockResourcesForTests()
+        update.effective_message.text = "/upcoming@otherBot"
+
+        self.calendarBotHandler._callback(update, context)
+        context.bot.send_message.assert_not_called()
+
+    def test_register_command(self):
+        update, context, chatId = self.createMockResourcesForTests()
+        handleRemind = mock.MagicMock()
+        self.calendarBotHandler.registerCommand("remind", handleRemind)
+        update.effective_message.text = "/remind%s 2 hours before" % botName
+
+        self.calendarBotHandler._callback(update, context)
+        self.assertIn("remind", self.calendarBotHandler.command)
+        command = handleRemind.call_args.args[3]
+        handleRemind.assert_called_once_with(context, chatId, update, command)
+        self.assertEqual(command.arguments, ["2", "hours", "before"])
+
+    def test_replies_are_queued_when_outbound_queue_is_given(self):
+        update, context, chatId = self.createMockResourcesForTests()
+        outboundMessageQueue = mock.MagicMock()
+        calendarBotHandler = CalendarBotHandler(self.mockGoogleCalendarService, "calendarId", UserEventStatusService(),
+                                                GoogleEventFormatter(), outboundMessageQueue=outboundMessageQueue)
+        update.effective_message.text = "/upcoming"
+        self.mockGoogleCalendarService.getUpcomingEvents.return_value = []
+
+        calendarBotHandler._callback(update, context)
+        context.bot.send_message.assert_not_called()
+        outboundMessageQueue.enqueue.assert_called_once_with(context.bot, chatId, "Events coming up:\n", telegram.ParseMode.MARKDOWN)
+
+    def test_chats_use_their_own_calendar(self):
+        update, context, chatId = self.createMockResourcesForTests()
+        chatCalendarRegistry = ChatCalendarRegistry(initialMapping={chatId: "chatCalendarId"})
+        calendarBotHandler = CalendarBotHandler(self.mockGoogleCalendarService, None, UserEventStatusService(),
+                                                GoogleEventFormatter(), chatCalendarRegistry=chatCalendarRegistry)
+        update.effective_user.full_name = "full name"
+        update.effective_message.text = "/going 1"
+        self.mockUpcomingEvents()
+
+        calendarBotHandler._callback(update, context)
+        events = self.mockGoogleCalendarService.getUpcomingEvents.return_value
+        self.mockGoogleCalendarService.getUpcomingEvents.assert_called_once_with("chatCalendarId")
+        self.mockGoogleCalendarService.setGoingToEvent.assert_called_once_with("chatCalendarId", events[0]["id"], "full name", events[0])
+
+        update.effective_chat.id = "otherChatId"
+        calendarBotHandler._callback(update, context)
+        context.bot.send_message.assert_called_with("otherChatId", "This chat is not linked to a calendar yet, an admin can link one with `/calendar <calendar id>`", telegram.ParseMode.MARKDOWN)
+        self.assertEqual(self.mockGoogleCalendarService.getUpcomingEvents.call_count, 1)
+
+    def test_admins_link_chats_to_calendars(self):
+        update, context, chatId = self.createMockResourcesForTests()
+        chatCalendarRegistry = ChatCalendarRegistry("calendarId")
+        calendarBotHandler = CalendarBotHandler(self.mockGoogleCalendarService, None, UserEventStatusService(),
+                                                GoogleEventFormatter(), chatCalendarRegistry=chatCalendarRegistry,
+                                                adminUserIds=[1])
+        self.assertIn("calendar", calendarBotHandler.command)
+
+        update.effective_user.id = 2
+        update.effective_message.text = "/calendar newCalendarId"
+        calendarBotHandler._callback(update, context)
+        context.bot.send_message.assert_called_with(chatId, "Only admins can change the calendar of a chat", telegram.ParseMode.MARKDOWN)
+        self.assertEqual(chatCalendarRegistry.getCalendarId(chatId), "calendarId")
+
+        update.effective_user.id = 1
+        calendarBotHandler._callback(update, context)
+        context.bot.send_message.assert_called_with(chatId, "This chat now uses calendar `newCalendarId`", telegram.ParseMode.MARKDOWN)
+        self.assertEqual(chatCalendarRegistry.getCalendarId(chatId), "newCalendarId")
+
+        update.effective_message.text = "/calendar"
+        calendarBotHandler._callback(update, context)
+        context.bot.send_message.assert_called_with(chatId, "This chat uses calendar `newCalendarId`", telegram.ParseMode.MARKDOWN)
+
+    def test_commands_are_recorded_in_metrics(self):
+        update, context, chatId = self.createMockResourcesForTests()
+        self.calendarBotHandler.registerCommand("metricstest", mock.MagicMock(side_effect=Exception("failed")))
+        with mock.patch.object(REGISTRY, "enabled", True):
+            update.effective_message.text = "/metricstest"
+            self.calendarBotHandler._callback(update, context)
+            update.effective_message.text = "/doesnotexist"
+            self.calendarBotHandler._callback(update, context)
+
+        lines = REGISTRY.render().splitlines()
+        self.assertIn('bot_command_seconds_count{command="metricstest",outcome="error"} 1', lines)
+        self.assertIn('bot_command_seconds_count{command="unknown",outcome="ok"} 1', lines)
+        self.assertIn('telegram_send_seconds_count{outcome="ok"} 2', lines)
+
+    def test_admins_profile_the_next_updates(self):
+        update, context, chatId = self.createMockResourcesForTests()
+        updateProfiler = mock.MagicMock()
+        updateProfiler.isActive.return_value = False
+        updateProfiler.start.return_value = True
+        calendarBotHandler = CalendarBotHandler(self.mockGoogleCalendarService, "calendarId", UserEventStatusService(),
+                                                GoogleEventFormatter(), adminUserIds=[1], updateProfiler=updateProfiler)
+        update.effective_message.text = "/profile 5 sampling"
+
+        update.effective_user.id = 2
+        calendarBotHandler._callback(update, context)
+        context.bot.send_message.assert_called_with(chatId, "Only admins can profile the bot")
+        updateProfiler.start.assert_not_called()
+
+        update.effective_user.id = 1
+        calendarBotHandler._callback(update, context)
+        context.bot.send_message.assert_called_with(chatId, "Profiling the next 5 updates with sampling")
+        self.assertEqual(updateProfiler.start.call_args.args[:2], (5, "sampling"))
+
+        updateProfiler.isActive.return_value = True
+        update.effective_message.text = "/help"
+        calendarBotHandler._callback(update, context)
+        self.assertEqual(updateProfiler.profile.call_args.args[0], calendarBotHandler._handle_update)
+
+    def test_updates_are_traced(self):
+        update, context, chatId = self.createMockResourcesForTests()
+        update.effective_message.text = "/upcoming"
+        self.mockGoogleCalendarService.getUpcomingEvents.return_value = []
+        exporter = mock.MagicMock()
+        with mock.patch.object(TRACER, "exporter", exporter):
+            self.calendarBotHandler._callback(update, context)
+
+        spans = exporter.export.call_args.args[0]
+        self.assertEqual([span.name for span in spans], ["format message", "telegram send", "dispatch update"])
+        self.assertEqual(spans[-1].attributes["bot.command"], "upcoming")
+
+    def test_updates_without_an_update_id_are_traced(self):
+        context = mock.MagicMock()
+        context.bot.name = botName
+        update = SimpleNamespace(effective_chat=SimpleNamespace(id="chatId"),
+                                 effective_message=SimpleNamespace(text="/help"),
+                                 effective_user=SimpleNamespace(full_name="full name"))
+        exporter = mock.MagicMock()
+        with mock.patch.object(TRACER, "exporter", exporter):
+            self.calendarBotHandler._callback(update, context)
+
+        dispatchSpan = exporter.export.call_args.args[0][-1]
+        self.assertEqual(dispatchSpan.name, "dispatch update")
+        self.assertNotIn("telegram.update_id", dispatchSpan.attributes)
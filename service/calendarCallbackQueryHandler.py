@@ -0,0 +1,164 @@
+import inspect
+import logging
+import time
+
+import telegram.ext
+from service.calendarBotHandler import _COMMAND_SECONDS, _NO_CALENDAR_MESSAGE
+from service.calendarIoExecutor import CalendarIoBusyError
+from service.googleCalendarService import _GOING, _NOT, _UNDECIDED
+from service.resilientCalendarService import CalendarUnavailableError
+from service.rsvpButtons import CALLBACK_DATA_PATTERN
+from service.tracing import TRACER
+
+LOG = logging.getLogger(__name__)
+_STATUS_SETTERS = {
+    _GOING: "setGoingToEvent",
+    _NOT: "setNotGoingToEvent",
+    _UNDECIDED: "setUndecidedAboutEvent"
+}
+_STATUS_ANSWERS = {
+    _GOING: "You are going to %s",
+    _NOT: "You are not going to %s",
+    _UNDECIDED: "You are undecided about %s"
+}
+_EXPIRED_ANSWER = "This button has expired, see /upcoming for the current events"
+_MISSING_EVENT_ANSWER = "This event no longer exists"
+_UPDATE_FAILED_ANSWER = "Unable to update the Google Calendar, please try again later."
+_BUSY_ANSWER = "The bot is busy right now, please try again in a moment."
+# Telegram shows at most this many characters of an answer
+_MAX_ANSWER_LENGTH = 200
+
+class CalendarCallbackQueryHandler(telegram.ext.CallbackQueryHandler):
+    """Handles presses of the RSVP buttons CalendarBotHandler attaches to its messages.
+
+    The status is written straight to the event in the button's callback data and the press is
+    acknowledged with answerCallbackQuery instead of a chat message.
+    """
+
+    def __init__(self, calendarService, calendarId, rsvpButtons, eventLoopThread=None, rsvpWriteBuffer=None,
+                 chatCalendarRegistry=None, calendarIoExecutor=None):
+        self._calendarService = calendarService
+        self._calendarId = calendarId
+        self._rsvpButtons = rsvpButtons
+        # needed when the calendar service is an AsyncGoogleCalendarService
+        self._eventLoopThread = eventLoopThread
+        self._rsvpWriteBuffer = rsvpWriteBuffer
+        self._chatCalendarRegistry = chatCalendarRegistry
+        self._calendarIoExecutor = calendarIoExecutor
+        super().__init__(self._callback, pattern=CALLBACK_DATA_PATTERN)
+
+    def _then(self, query, result, callback):
+        """Returns callback(result) for the result of a calendar service call. The result of the async service is a
+        coroutine, callback is then called once it is done so no thread waits on Google meanwhile, and its errors are
+        answered like _handle_query's."""
+        if not inspect.isawaitable(result):
+            return callback(result)
+
+        def callbackWithResult(future):
+            try:
+                callback(future.result())
+            except Exception as e:
+                self._answer_error(query, e)
+
+        self._eventLoopThread.whenDone(result, TRACER.wrap(callbackWithResult))
+        # the outcome is only known once the coroutine is done
+        return "ok"
+
+    def _get_calendar_id(self, chatId):
+        if self._chatCalendarRegistry != None:
+            return self._chatCalendarRegistry.getCalendarId(chatId)
+        return self._calendarId
+
+    def _answer(self, query, text):
+        try:
+            query.answer(text[:_MAX_ANSWER_LENGTH])
+        except Exception as e:
+            LOG.error("Could not answer callback query: %s" % e)
+
+    def _callback(self, update, context):
+        if self._calendarIoExecutor == None:
+            self._handle_query(update, context)
+            return
+        try:
+            self._calendarIoExecutor.submitRead(self._handle_query, update, context)
+        except CalendarIoBusyError as e:
+            LOG.info(e)
+            self._answer(update.callback_query, _BUSY_ANSWER)
+
+    def _handle_query(self, update, context):
+        started = time.perf_counter()
+        outcome = "ok"
+        query = update.callback_query
+        with TRACER.span("dispatch callback query", **{"telegram.update_id": update.update_id}):
+            try:
+                outcome = self._apply_status(query)
+            except Exception as e:
+                outcome = self._answer_error(query, e)
+            finally:
+                _COMMAND_SECONDS.labels("rsvp_button", outcome).observe(time.perf_counter() - started)
+
+    def _answer_error(self, query, error):
+        """Tells the user that their press failed, returns the outcome for the command metrics."""
+        self._answer(query, _UPDATE_FAILED_ANSWER)
+        if isinstance(error, (CalendarUnavailableError, CalendarIoBusyError)):
+            LOG.info(error)
+            return "unavailable"
+        LOG.error(error)
+        return "error"
+
+    def _apply_status(self, query):
+        rsvp = self._rsvpButtons.parseCallbackData(query.data)
+        if rsvp == None:
+            self._answer(query, _EXPIRED_ANSWER)
+            return "expired"
+        eventId, status = rsvp
+        calendarId = self._get_calendar_id(query.message.chat.id)
+        if calendarId == None:
+            self._answer(query, _NO_CALENDAR_MESSAGE)
+            return "no_calendar"
+
+        # the event is read for its etag and title, there is no need to list the upcoming events. Like the /going
+        # command's, it comes from the local copy when that holds it, a write with an outdated etag is retried.
+        def withLocalEvent(event):
+            if event == None:
+                return self._then(query, self._calendarService.getCurrentEvent(calendarId, eventId), writeStatus)
+            return writeStatus(event)
+
+        def writeStatus(event):
+            return self._write_status(query, calendarId, eventId, status, event)
+
+        getLocalEvent = getattr(self._calendarService, "getLocalEvent", None)
+        if getLocalEvent == None:
+            return withLocalEvent(None)
+        return self._then(query, getLocalEvent(calendarId, eventId), withLocalEvent)
+
+    def _write_status(self, query, calendarId, eventId, status, event):
+        if event == None:
+            self._answer(query, _MISSING_EVENT_ANSWER)
+            return "missing_event"
+        userName = query.from_user.full_name
+        answer = _STATUS_ANSWERS[status] % event.get("summary", "this event")
+
+        if self._rsvpWriteBuffer != None:
+            future = self._rsvpWriteBuffer.submit(calendarId, event, userName, status)
+        elif self._calendarIoExecutor != None and self._eventLoopThread == None:
+            # ordered with the other writes to this event, like the /going command's
+            future = self._calendarIoExecutor.submitWrite((calendarId, eventId), self._set_user_status,
+                                                          calendarId, eventId, userName, status, event)
+        else:
+            def answerWritten(result):
+                self._answer(query, answer)
+                return "ok"
+
+            # like the /going command's, the async service's writes run on the event loop rather than being queued
+            return self._then(query, self._set_user_status(calendarId, eventId, userName, status, event), answerWritten)
+
+        def answerWhenWritten(future):
+            self._answer(query, answer if future.exception() == None else _UPDATE_FAILED_ANSWER)
+
+        future.add_done_callback(answerWhenWritten)
+        return "ok"
+
+    def _set_user_status(self, calendarId, eventId, userName, status, event):
+        setter = getattr(self._calendarService, _STATUS_SETTERS[status])
+        return setter(calendarId, eventId, userName, event)
@@ -0,0 +1,97 @@
+from service.calendarCallbackQueryHandler import CalendarCallbackQueryHandler
+from service.calendarIoExecutor import CalendarIoExecutor
+from service.eventLoopThread import EventLoopThread
+from service.rsvpButtons import RsvpButtons
+from service.googleCalendarService import _GOING, _UNDECIDED
+import unittest
+from unittest import mock
+import json
+import threading
+import telegram
+
+class CalendarCallbackQueryHandlerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.calendarService = mock.MagicMock()
+        self.rsvpButtons = RsvpButtons()
+        self.calendarCallbackQueryHandler = CalendarCallbackQueryHandler(self.calendarService, "calendarId",
+                                                                         self.rsvpButtons)
+        with open("./service/eventResponseTest.json") as eventResponseText:
+            self.event = json.load(eventResponseText)["items"][1]
+        self.calendarService.getLocalEvent.return_value = None
+        self.calendarService.getCurrentEvent.return_value = self.event
+
+    def createUpdate(self, data):
+        update = mock.MagicMock()
+        update.callback_query.data = data
+        update.callback_query.from_user.full_name = "full name"
+        update.callback_query.message.chat.id = "chatId"
+        return update
+
+    def test_button_sets_status_of_its_event(self):
+        update = self.createUpdate(self.rsvpButtons.getCallbackData(self.event["id"], _GOING))
+        self.calendarCallbackQueryHandler._callback(update, mock.MagicMock())
+
+        self.calendarService.getUpcomingEvents.assert_not_called()
+        self.calendarService.setGoingToEvent.assert_called_once_with("calendarId", self.event["id"], "full name", self.event)
+        update.callback_query.answer.assert_called_once_with("You are going to Game Night")
+
+    def test_button_uses_the_local_copy_of_its_event(self):
+        self.calendarService.getLocalEvent.return_value = self.event
+        update = self.createUpdate(self.rsvpButtons.getCallbackData(self.event["id"], _GOING))
+        self.calendarCallbackQueryHandler._callback(update, mock.MagicMock())
+
+        self.calendarService.getLocalEvent.assert_called_once_with("calendarId", self.event["id"])
+        self.calendarService.getCurrentEvent.assert_not_called()
+        self.calendarService.setGoingToEvent.assert_called_once_with("calendarId", self.event["id"], "full name", self.event)
+        update.callback_query.answer.assert_called_once_with("You are going to Game Night")
+
+    def test_button_press_is_pattern_matched(self):
+        user = telegram.User(1, "first name", False)
+        update = telegram.Update(1, callback_query=telegram.CallbackQuery("queryId", user, "chatInstance", data="rsvp:g:eventId"))
+        self.assertTrue(self.calendarCallbackQueryHandler.check_update(update))
+        update.callback_query.data = "other"
+        self.assertFalse(self.calendarCallbackQueryHandler.check_update(update))
+
+    def test_expired_button(self):
+        update = self.createUpdate("rsvp:g:#7")
+        self.calendarCallbackQueryHandler._callback(update, mock.MagicMock())
+        self.calendarService.getCurrentEvent.assert_not_called()
+        update.callback_query.answer.assert_called_once_with("This button has expired, see /upcoming for the current events")
+
+    def test_failed_update_is_answered(self):
+        self.calendarService.setUndecidedAboutEvent.side_effect = Exception("Could not update statuses")
+        update = self.createUpdate(self.rsvpButtons.getCallbackData(self.event["id"], _UNDECIDED))
+        self.calendarCallbackQueryHandler._callback(update, mock.MagicMock())
+        update.callback_query.answer.assert_called_once_with("Unable to update the Google Calendar, please try again later.")
+
+    def test_answered_once_written_on_calendar_io_workers(self):
+        calendarIoExecutor = CalendarIoExecutor(maxWorkers=2, maxPending=10)
+        calendarCallbackQueryHandler = CalendarCallbackQueryHandler(self.calendarService, "calendarId", self.rsvpButtons,
+                                                                    calendarIoExecutor=calendarIoExecutor)
+        update = self.createUpdate(self.rsvpButtons.getCallbackData(self.event["id"], _GOING))
+        answered = threading.Event()
+        update.callback_query.answer.side_effect = lambda text: answered.set()
+        calendarCallbackQueryHandler._callback(update, mock.MagicMock())
+        self.assertTrue(answered.wait(5))
+        calendarIoExecutor.shutdown()
+
+        self.calendarService.setGoingToEvent.assert_called_once_with("calendarId", self.event["id"], "full name", self.event)
+        update.callback_query.answer.assert_called_once_with("You are going to Game Night")
+
+    def test_answered_once_the_async_write_is_done(self):
+        asyncCalendarService = mock.AsyncMock()
+        asyncCalendarService.getLocalEvent.return_value = None
+        asyncCalendarService.getCurrentEvent.return_value = self.event
+        eventLoopThread = EventLoopThread()
+        calendarCallbackQueryHandler = CalendarCallbackQueryHandler(asyncCalendarService, "calendarId", self.rsvpButtons,
+                                                                    eventLoopThread=eventLoopThread)
+        update = self.createUpdate(self.rsvpButtons.getCallbackData(self.event["id"], _GOING))
+        answered = threading.Event()
+        update.callback_query.answer.side_effect = lambda text: answered.set()
+        calendarCallbackQueryHandler._callback(update, mock.MagicMock())
+        self.assertTrue(answered.wait(5))
+        eventLoopThread.stop()
+
+        asyncCalendarService.setGoingToEvent.assert_awaited_once_with("calendarId", self.event["id"], "full name", self.event)
+        update.callback_query.answer.assert_called_once_with("You are going to Game Night")
@@ -0,0 +1,30 @@
+from datetime import datetime
+
+def _parse_time(time):
+    if time == None:
+        return None
+    elif 'dateTime' in time:
+        return datetime.strptime(time['dateTime'], "%Y-%m-%dT%H:%M:%S%z")
+    elif 'date' in time:
+        return datetime.strptime(time['date'], "%Y-%m-%d")
+    return None
+
+class CalendarEvent(object):
+    """A Google Calendar event with its start and end parsed once."""
+    __slots__ = ("id", "summary", "htmlLink", "start", "end", "isAllDay", "raw")
+
+    def __init__(self, id, summary, htmlLink, start, end, isAllDay, raw):
+        self.id = id
+        self.summary = summary
+        self.htmlLink = htmlLink
+        self.start = start
+        self.end = end
+        self.isAllDay = isAllDay
+        # the event as Google returned it, needed to update it and to read its description
+        self.raw = raw
+
+    @classmethod
+    def fromGoogleEvent(cls, event):
+        return cls(event.get('id'), event.get('summary'), event.get('htmlLink'),
+                   _parse_time(event.get('start')), _parse_time(event.get('end')),
+                   'date' in event.get('start', {}), event)
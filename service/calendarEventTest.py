@@ -0,0 +1,30 @@
+from service.calendarEvent import CalendarEvent
+import unittest
+import json
+from datetime import datetime, timedelta, timezone
+
+class CalendarEventTest(unittest.TestCase):
+
+    def setUp(self):
+        with open("./service/eventResponseTest.json") as eventResponseText:
+            self.events = json.load(eventResponseText)["items"]
+
+    def test_from_google_event(self):
+        event = CalendarEvent.fromGoogleEvent(self.events[0])
+        self.assertEqual(event.id, self.events[0]["id"])
+        self.assertEqual(event.summary, "Star Wars: The Rise of Skywalker (2019)")
+        self.assertEqual(event.htmlLink, "starWarsHtmlLink")
+        self.assertEqual(event.start, datetime(2019, 12, 20, 23, 15, tzinfo=timezone(timedelta(hours=-5))))
+        self.assertFalse(event.isAllDay)
+        self.assertIs(event.raw, self.events[0])
+
+    def test_from_all_day_google_event(self):
+        event = CalendarEvent.fromGoogleEvent(self.events[2])
+        self.assertTrue(event.isAllDay)
+        self.assertEqual(event.start, datetime(2020, 7, 31))
+        self.assertEqual(event.end, datetime(2020, 8, 2))
+
+    def test_from_quick_create_result(self):
+        event = CalendarEvent.fromGoogleEvent({"summary": "Event", "htmlLink": "htmlLink"})
+        self.assertIsNone(event.start)
+        self.assertFalse(hasattr(event, "__dict__"))
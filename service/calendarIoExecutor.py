@@ -0,0 +1,94 @@
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from service.metrics import REGISTRY
+from service.tracing import TRACER
+from support.properties import CALENDAR_IO_WORKERS, CALENDAR_IO_MAX_PENDING
+
+LOG = logging.getLogger(__name__)
+_REJECTED = REGISTRY.counter("calendar_io_rejected_total", "Calendar tasks turned away because the backlog was full")
+
+class CalendarIoBusyError(Exception):
+    """The executor already holds maxPending tasks."""
+    pass
+
+class CalendarIoExecutor(object):
+    """Runs blocking calendar calls on a bounded pool of worker threads.
+
+    Reads run in parallel. Writes with the same key, e.g. (calendar id, event id), run one at a time
+    in the order they were submitted, without holding a worker while they wait for their turn. Once
+    maxPending tasks are queued or running, submitting raises CalendarIoBusyError instead of letting
+    the backlog grow. Tasks continue the trace of the span open where they were submitted.
+    """
+
+    def __init__(self, maxWorkers=CALENDAR_IO_WORKERS, maxPending=CALENDAR_IO_MAX_PENDING):
+        self._maxPending = maxPending
+        self._executor = ThreadPoolExecutor(max_workers=maxWorkers, thread_name_prefix="calendar-io")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._rejected = 0
+        # writes waiting for the running write with the same key
+        self._writeQueues = {}
+
+    def _admit(self):
+        if self._pending >= self._maxPending:
+            self._rejected += 1
+            _REJECTED.inc()
+            raise CalendarIoBusyError("%d calendar tasks are already pending" % self._pending)
+        self._pending += 1
+
+    def submitRead(self, function, *args):
+        """Returns a Future for function(*args), run as soon as a worker is free."""
+        future = Future()
+        with self._lock:
+            self._admit()
+        self._executor.submit(self._run, future, TRACER.wrap(function), args)
+        return future
+
+    def submitWrite(self, key, function, *args):
+        """Returns a Future for function(*args), run once the earlier writes with key are done."""
+        future = Future()
+        function = TRACER.wrap(function)
+        with self._lock:
+            self._admit()
+            writeQueue = self._writeQueues.get(key)
+            if writeQueue != None:
+                writeQueue.append((future, function, args))
+                return future
+            self._writeQueues[key] = deque()
+        self._executor.submit(self._run_write, key, future, function, args)
+        return future
+
+    def _run(self, future, function, args):
+        try:
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(function(*args))
+                except Exception as e:
+                    future.set_exception(e)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _run_write(self, key, future, function, args):
+        self._run(future, function, args)
+        with self._lock:
+            writeQueue = self._writeQueues[key]
+            if len(writeQueue) == 0:
+                del self._writeQueues[key]
+                return
+            nextFuture, nextFunction, nextArgs = writeQueue.popleft()
+        self._executor.submit(self._run_write, key, nextFuture, nextFunction, nextArgs)
+
+    def getStats(self):
+        with self._lock:
+            return {
+                "pending": self._pending,
+                "rejected": self._rejected,
+                "writeKeys": len(self._writeQueues)
+            }
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait)
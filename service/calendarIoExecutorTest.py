@@ -0,0 +1,81 @@
+from service.calendarIoExecutor import CalendarIoExecutor, CalendarIoBusyError
+from service.tracing import TRACER
+import unittest
+from unittest import mock
+import threading
+import time
+
+class CalendarIoExecutorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.calendarIoExecutor = CalendarIoExecutor(maxWorkers=4, maxPending=3)
+
+    def tearDown(self):
+        self.calendarIoExecutor.shutdown()
+
+    def test_reads_run_in_parallel(self):
+        barrier = threading.Barrier(2, timeout=5)
+        futures = [self.calendarIoExecutor.submitRead(barrier.wait) for i in range(2)]
+        for future in futures:
+            future.result(timeout=5)
+        self.assertEqual(self.calendarIoExecutor.getStats()["pending"], 0)
+
+    def test_writes_to_one_key_run_in_order(self):
+        running = []
+        finished = []
+
+        def write(value):
+            running.append(value)
+            self.assertEqual(len(running), 1)
+            time.sleep(0.02)
+            running.remove(value)
+            finished.append(value)
+
+        futures = [self.calendarIoExecutor.submitWrite(("calendarId", "eventId"), write, value) for value in range(3)]
+        for future in futures:
+            future.result(timeout=5)
+        self.assertEqual(finished, [0, 1, 2])
+        self.assertEqual(self.calendarIoExecutor.getStats()["writeKeys"], 0)
+
+    def test_writes_to_other_keys_do_not_wait(self):
+        barrier = threading.Barrier(2, timeout=5)
+        futures = [self.calendarIoExecutor.submitWrite(("calendarId", eventId), barrier.wait) for eventId in ("1", "2")]
+        for future in futures:
+            future.result(timeout=5)
+
+    def test_full_backlog_is_rejected(self):
+        release = threading.Event()
+        futures = [self.calendarIoExecutor.submitWrite("eventId", release.wait, 5) for i in range(3)]
+        with self.assertRaises(CalendarIoBusyError):
+            self.calendarIoExecutor.submitRead(time.time)
+        self.assertEqual(self.calendarIoExecutor.getStats()["rejected"], 1)
+
+        release.set()
+        for future in futures:
+            future.result(timeout=5)
+        self.assertIsNotNone(self.calendarIoExecutor.submitRead(time.time).result(timeout=5))
+
+    def test_failures_are_set_on_the_future(self):
+        def fail():
+            raise Exception("Could not update event")
+
+        future = self.calendarIoExecutor.submitWrite("eventId", fail)
+        with self.assertRaises(Exception):
+            future.result(timeout=5)
+        self.assertEqual(self.calendarIoExecutor.submitWrite("eventId", lambda: "written").result(timeout=5), "written")
+
+    def test_tasks_continue_the_submitting_trace(self):
+        exporter = mock.MagicMock()
+        with mock.patch.object(TRACER, "exporter", exporter):
+            def write():
+                with TRACER.span("google events.patch"):
+                    pass
+
+            with TRACER.span("dispatch update") as root:
+                future = self.calendarIoExecutor.submitWrite("key", write)
+            future.result(timeout=5)
+
+        writeSpan = next(spans[0] for spans in (call.args[0] for call in exporter.export.call_args_list)
+                         if spans[0].name == "google events.patch")
+        self.assertEqual(writeSpan.traceId, root.traceId)
+        self.assertEqual(writeSpan.parentSpanId, root.spanId)
@@ -0,0 +1,90 @@
+import threading
+from datetime import datetime, timezone
+
+_CANCELLED = "cancelled"
+
+def _get_event_time(event, key):
+    time = event.get(key, {})
+    if 'dateTime' in time:
+        return datetime.strptime(time['dateTime'], "%Y-%m-%dT%H:%M:%S%z")
+    elif 'date' in time:
+        # all day events are in the calendar's time zone, local time is the closest we have
+        return datetime.strptime(time['date'], "%Y-%m-%d").astimezone()
+    return None
+
+class CalendarMirror(object):
+    """Local copy of a calendar's events kept up to date with Google's sync tokens."""
+
+    def __init__(self):
+        # held for the duration of a sync so only one sync per calendar runs at a time
+        self.syncLock = threading.Lock()
+        self._lock = threading.RLock()
+        self._events = {}
+        self._syncToken = None
+        self._lastSynced = None
+
+    def getSyncToken(self):
+        return self._syncToken
+
+    def isStale(self, now, maxAge):
+        return self._lastSynced == None or now - self._lastSynced >= maxAge
+
+    def markStale(self):
+        self._lastSynced = None
+
+    def replaceAll(self, events, syncToken, syncedAt):
+        replacement = {}
+        for event in events:
+            if event.get("status") != _CANCELLED:
+                replacement[event["id"]] = event
+        with self._lock:
+            self._events = replacement
+            self._syncToken = syncToken
+            self._lastSynced = syncedAt
+
+    def applyChanges(self, events, syncToken, syncedAt):
+        with self._lock:
+            for event in events:
+                self._apply(event)
+            self._syncToken = syncToken
+            self._lastSynced = syncedAt
+
+    def upsert(self, event):
+        with self._lock:
+            self._apply(event)
+
+    def clear(self):
+        with self._lock:
+            self._events = {}
+            self._syncToken = None
+            self._lastSynced = None
+
+    def _apply(self, event):
+        if event.get("status") == _CANCELLED:
+            self._events.pop(event["id"], None)
+        else:
+            self._events[event["id"]] = event
+
+    def getEvent(self, eventId):
+        with self._lock:
+            return self._events.get(eventId)
+
+    def getEvents(self):
+        with self._lock:
+            return list(self._events.values())
+
+    def getUpcomingEvents(self, now, maxResults):
+        """Mirrors events.list with singleEvents, orderBy=startTime and timeMin=now."""
+        upcoming = []
+        for event in self.getEvents():
+            start = _get_event_time(event, 'start')
+            end = _get_event_time(event, 'end')
+            if start != None and end != None and end > now:
+                upcoming.append((start, event))
+
+        upcoming.sort(key=lambda startAndEvent: startAndEvent[0])
+        return [event for start, event in upcoming[:maxResults]]
+
+    @staticmethod
+    def now():
+        return datetime.now(timezone.utc)
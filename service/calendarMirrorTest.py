@@ -0,0 +1,38 @@
+from service.calendarMirror import CalendarMirror
+import unittest
+import json
+from datetime import datetime, timezone
+
+class CalendarMirrorTest(unittest.TestCase):
+
+    def setUp(self):
+        with open("./service/eventResponseTest.json") as eventResponseText:
+            self.events = json.load(eventResponseText)["items"]
+        self.mirror = CalendarMirror()
+
+    def test_upcoming_events_are_ordered_and_limited(self):
+        self.mirror.replaceAll(list(reversed(self.events)), "syncToken", 0)
+        upcoming = self.mirror.getUpcomingEvents(datetime(2019, 12, 1, tzinfo=timezone.utc), 2)
+        self.assertEqual([event["htmlLink"] for event in upcoming], ["starWarsHtmlLink", "gameNightHtmlLink"])
+
+    def test_upcoming_events_exclude_finished_events(self):
+        self.mirror.replaceAll(self.events, "syncToken", 0)
+        upcoming = self.mirror.getUpcomingEvents(datetime(2020, 1, 1, tzinfo=timezone.utc), 10)
+        self.assertEqual([event["htmlLink"] for event in upcoming], ["allDayMultDayEventLink", "dayoutLink"])
+
+    def test_apply_changes_removes_cancelled_events(self):
+        self.mirror.replaceAll(self.events, "syncToken", 0)
+        changedEvent = dict(self.events[1], summary="Changed")
+        cancelledEvent = {"id": self.events[0]["id"], "status": "cancelled"}
+        self.mirror.applyChanges([changedEvent, cancelledEvent], "nextSyncToken", 5)
+
+        self.assertIsNone(self.mirror.getEvent(self.events[0]["id"]))
+        self.assertEqual(self.mirror.getEvent(self.events[1]["id"])["summary"], "Changed")
+        self.assertEqual(self.mirror.getSyncToken(), "nextSyncToken")
+        self.assertEqual(len(self.mirror.getEvents()), 3)
+
+    def test_is_stale(self):
+        self.assertTrue(self.mirror.isStale(0, 60))
+        self.mirror.replaceAll([], "syncToken", 10)
+        self.assertFalse(self.mirror.isStale(69, 60))
+        self.assertTrue(self.mirror.isStale(70, 60))
@@ -0,0 +1,129 @@
+import hmac
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+LOG = logging.getLogger(__name__)
+_SYNC_STATE = "sync"
+
+class CalendarWatchService(object):
+    """Registers Google Calendar push notification channels and reacts to their notifications."""
+
+    def __init__(self, calendarService, address, token, ttlSeconds, renewBeforeSeconds):
+        self._calendarService = calendarService
+        self._address = address
+        self._token = token
+        self._ttl = ttlSeconds
+        self._renewBefore = renewBeforeSeconds
+        self._channels = {}
+        self._lock = threading.Lock()
+        self._pendingRefreshes = set()
+        self._refreshExecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="calendar-refresh")
+        self._renewTimer = None
+
+    def start(self, calendarIds):
+        for calendarId in calendarIds:
+            self.registerChannel(calendarId)
+        self._schedule_renewal()
+
+    def stop(self):
+        if self._renewTimer != None:
+            self._renewTimer.cancel()
+        with self._lock:
+            channels = list(self._channels.items())
+            self._channels.clear()
+        for channelId, channel in channels:
+            self._calendarService.stopChannel(channelId, channel["resourceId"])
+        self._refreshExecutor.shutdown(wait=True)
+
+    def registerChannel(self, calendarId):
+        channelId = str(uuid.uuid4())
+        response = self._calendarService.watchCalendar(calendarId, channelId, self._address, self._token, self._ttl)
+        if response == None:
+            return None
+
+        channel = {
+            "calendarId": calendarId,
+            "resourceId": response["resourceId"],
+            # Google reports the expiration in milliseconds since the epoch
+            "expiration": int(response["expiration"]) / 1000 if "expiration" in response else time.time() + self._ttl
+        }
+        with self._lock:
+            self._channels[channelId] = channel
+        return channelId
+
+    def ensureWatched(self, calendarId):
+        """Registers a channel for calendarId unless one is already registered."""
+        with self._lock:
+            watched = any(channel["calendarId"] == calendarId for channel in self._channels.values())
+        if not watched:
+            self.registerChannel(calendarId)
+
+    def renewExpiringChannels(self, now=None):
+        now = now if now != None else time.time()
+        with self._lock:
+            expiring = [(channelId, channel) for channelId, channel in self._channels.items()
+                        if channel["expiration"] - now <= self._renewBefore]
+
+        for channelId, channel in expiring:
+            # open the new channel first so no notification is missed while switching over
+            if self.registerChannel(channel["calendarId"]) != None:
+                with self._lock:
+                    self._channels.pop(channelId, None)
+                self._calendarService.stopChannel(channelId, channel["resourceId"])
+
+    def _schedule_renewal(self):
+        def renewAndReschedule():
+            try:
+                self.renewExpiringChannels()
+            except Exception as e:
+                LOG.error(e)
+            self._schedule_renewal()
+
+        self._renewTimer = threading.Timer(max(self._renewBefore / 4, 1), renewAndReschedule)
+        self._renewTimer.daemon = True
+        self._renewTimer.start()
+
+    def handleNotification(self, headers):
+        """Returns the HTTP status code to answer the notification with."""
+        channelId = headers.get("X-Goog-Channel-ID")
+        token = headers.get("X-Goog-Channel-Token") or ""
+        state = headers.get("X-Goog-Resource-State")
+
+        with self._lock:
+            channel = self._channels.get(channelId)
+        if channel == None:
+            LOG.info("Notification for unknown channel %s" % channelId)
+            return 404
+        if self._token == None or not hmac.compare_digest(token, self._token):
+            LOG.info("Notification with invalid token for channel %s" % channelId)
+            return 403
+        if channel["resourceId"] != headers.get("X-Goog-Resource-ID"):
+            LOG.info("Notification with unexpected resource for channel %s" % channelId)
+            return 403
+
+        if state != _SYNC_STATE:
+            self._queue_refresh(channel["calendarId"])
+        return 200
+
+    def _queue_refresh(self, calendarId):
+        with self._lock:
+            if calendarId in self._pendingRefreshes:
+                # a refresh that has not started yet will pick up this change too
+                return
+            self._pendingRefreshes.add(calendarId)
+        self._refreshExecutor.submit(self._refresh, calendarId)
+
+    def _refresh(self, calendarId):
+        with self._lock:
+            self._pendingRefreshes.discard(calendarId)
+        try:
+            self._calendarService.refreshCalendar(calendarId)
+        except Exception as e:
+            LOG.error(e)
+
+    def getChannels(self):
+        with self._lock:
+            return dict(self._channels)
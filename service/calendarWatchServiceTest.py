@@ -0,0 +1,64 @@
+from service.calendarWatchService import CalendarWatchService
+import unittest
+from unittest import mock
+import json
+
+class CalendarWatchServiceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.calendarService = mock.MagicMock()
+        self.calendarService.watchCalendar.return_value = {
+            "resourceId": "resourceId",
+            "expiration": "10000000"
+        }
+        self.calendarWatchService = CalendarWatchService(self.calendarService, "https://bot/calendarNotifications",
+                                                         "channelToken", 604800, 3600)
+        self.channelId = self.calendarWatchService.registerChannel("calendarId")
+
+    def notificationHeaders(self, state="exists", token="channelToken"):
+        return {
+            "X-Goog-Channel-ID": self.channelId,
+            "X-Goog-Channel-Token": token,
+            "X-Goog-Resource-ID": "resourceId",
+            "X-Goog-Resource-State": state
+        }
+
+    def test_register_channel(self):
+        args = self.calendarService.watchCalendar.call_args.args
+        self.assertEqual(args, ("calendarId", self.channelId, "https://bot/calendarNotifications", "channelToken", 604800))
+        self.assertEqual(self.calendarWatchService.getChannels()[self.channelId]["expiration"], 10000)
+
+    def test_ensure_watched_registers_new_calendars_only(self):
+        self.calendarWatchService.ensureWatched("calendarId")
+        self.calendarWatchService.ensureWatched("otherCalendarId")
+        self.assertEqual(self.calendarService.watchCalendar.call_count, 2)
+        self.assertEqual(sorted(channel["calendarId"] for channel in self.calendarWatchService.getChannels().values()),
+                         ["calendarId", "otherCalendarId"])
+
+    def test_change_notification_refreshes_calendar(self):
+        self.assertEqual(self.calendarWatchService.handleNotification(self.notificationHeaders()), 200)
+        self.calendarWatchService.stop()
+        self.calendarService.refreshCalendar.assert_called_once_with("calendarId")
+
+    def test_sync_notification_does_not_refresh(self):
+        self.assertEqual(self.calendarWatchService.handleNotification(self.notificationHeaders(state="sync")), 200)
+        self.calendarWatchService.stop()
+        self.calendarService.refreshCalendar.assert_not_called()
+
+    def test_rejects_invalid_token_and_unknown_channel(self):
+        self.assertEqual(self.calendarWatchService.handleNotification(self.notificationHeaders(token="wrong")), 403)
+        headers = self.notificationHeaders()
+        headers["X-Goog-Channel-ID"] = "unknown"
+        self.assertEqual(self.calendarWatchService.handleNotification(headers), 404)
+        self.calendarWatchService.stop()
+        self.calendarService.refreshCalendar.assert_not_called()
+
+    def test_renews_channels_before_expiry(self):
+        self.calendarWatchService.renewExpiringChannels(now=1000)
+        self.assertIn(self.channelId, self.calendarWatchService.getChannels())
+
+        self.calendarWatchService.renewExpiringChannels(now=10000 - 3600)
+        channels = self.calendarWatchService.getChannels()
+        self.assertNotIn(self.channelId, channels)
+        self.assertEqual(len(channels), 1)
+        self.calendarService.stopChannel.assert_called_once_with(self.channelId, "resourceId")
@@ -0,0 +1,68 @@
+import json
+import logging
+import os
+import threading
+
+LOG = logging.getLogger(__name__)
+
+class ChatCalendarRegistry(object):
+    """Which calendar each chat uses, changeable while the bot runs and kept in mappingFile when given."""
+
+    def __init__(self, defaultCalendarId=None, mappingFile=None, initialMapping=None):
+        self._defaultCalendarId = defaultCalendarId
+        self._mappingFile = mappingFile
+        self._calendars = {}
+        self._lock = threading.Lock()
+        self._listeners = []
+        if initialMapping != None:
+            self._calendars.update({str(chatId): calendarId for chatId, calendarId in initialMapping.items()})
+        if mappingFile != None and os.path.exists(mappingFile):
+            with open(mappingFile) as json_file:
+                self._calendars.update(json.load(json_file))
+
+    @staticmethod
+    def parseMapping(mappingString):
+        """Parses "chatId=calendarId,chatId=calendarId" into a dict."""
+        mapping = {}
+        for entry in (mappingString or "").split(","):
+            chatId, _, calendarId = entry.strip().partition("=")
+            if len(chatId) > 0 and len(calendarId) > 0:
+                mapping[chatId.strip()] = calendarId.strip()
+        return mapping
+
+    def addListener(self, listener):
+        """listener is called with (chatId, calendarId) whenever a chat is linked to a calendar."""
+        self._listeners.append(listener)
+
+    def getCalendarId(self, chatId):
+        with self._lock:
+            return self._calendars.get(str(chatId), self._defaultCalendarId)
+
+    def getCalendarIds(self):
+        with self._lock:
+            calendarIds = set(self._calendars.values())
+        if self._defaultCalendarId != None:
+            calendarIds.add(self._defaultCalendarId)
+        return calendarIds
+
+    def setCalendarId(self, chatId, calendarId):
+        with self._lock:
+            self._calendars[str(chatId)] = calendarId
+            self._save()
+        LOG.info("Chat %s now uses calendar %s" % (chatId, calendarId))
+        for listener in self._listeners:
+            listener(chatId, calendarId)
+
+    def removeCalendarId(self, chatId):
+        with self._lock:
+            self._calendars.pop(str(chatId), None)
+            self._save()
+
+    def _save(self):
+        if self._mappingFile == None:
+            return
+        # written to a temporary file first so a crash can not leave a half written mapping
+        temporaryFile = self._mappingFile + ".tmp"
+        with open(temporaryFile, "w+") as json_file:
+            json.dump(self._calendars, json_file)
+        os.replace(temporaryFile, self._mappingFile)
@@ -0,0 +1,41 @@
+from service.chatCalendarRegistry import ChatCalendarRegistry
+import unittest
+from unittest import mock
+import os
+import tempfile
+
+class ChatCalendarRegistryTest(unittest.TestCase):
+
+    def test_chats_use_default_calendar_until_linked(self):
+        registry = ChatCalendarRegistry("default", initialMapping={-100: "groupCalendar"})
+        self.assertEqual(registry.getCalendarId(-100), "groupCalendar")
+        self.assertEqual(registry.getCalendarId(-200), "default")
+
+        registry.setCalendarId(-200, "otherCalendar")
+        self.assertEqual(registry.getCalendarId(-200), "otherCalendar")
+        self.assertEqual(registry.getCalendarIds(), {"default", "groupCalendar", "otherCalendar"})
+
+        registry.removeCalendarId(-200)
+        self.assertEqual(registry.getCalendarId(-200), "default")
+
+    def test_mapping_is_kept_in_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            mappingFile = os.path.join(directory, "chat_calendars.json")
+            ChatCalendarRegistry(mappingFile=mappingFile).setCalendarId(-100, "groupCalendar")
+
+            registry = ChatCalendarRegistry(mappingFile=mappingFile)
+            self.assertEqual(registry.getCalendarId(-100), "groupCalendar")
+            self.assertEqual(registry.getCalendarId(-200), None)
+            self.assertEqual(os.listdir(directory), ["chat_calendars.json"])
+
+    def test_listeners_are_told_about_new_links(self):
+        registry = ChatCalendarRegistry()
+        listener = mock.MagicMock()
+        registry.addListener(listener)
+        registry.setCalendarId(-100, "groupCalendar")
+        listener.assert_called_once_with(-100, "groupCalendar")
+
+    def test_parse_mapping(self):
+        self.assertEqual(ChatCalendarRegistry.parseMapping("-100=first@group.calendar.google.com, -200 = second"),
+                         {"-100": "first@group.calendar.google.com", "-200": "second"})
+        self.assertEqual(ChatCalendarRegistry.parseMapping(None), {})
@@ -0,0 +1,42 @@
+class ParsedCommand(object):
+    """A bot command split into its name, the bot it mentions and what follows it.
+
+    "/create@botName Game night on Friday" parses to name "create", mention "botName",
+    argumentText "Game night on Friday" and arguments ["Game", "night", "on", "Friday"].
+    """
+    __slots__ = ("name", "mention", "argumentText", "arguments")
+
+    def __init__(self, name, mention, argumentText):
+        self.name = name
+        self.mention = mention
+        self.argumentText = argumentText
+        self.arguments = argumentText.split()
+
+    @classmethod
+    def parse(cls, message):
+        """Returns the ParsedCommand for message, or None when it does not start with a command."""
+        if message == None or not message.startswith("/"):
+            return None
+        parts = message.split(None, 1)
+        name, _, mention = parts[0][1:].partition("@")
+        return cls(name.lower(), mention if len(mention) > 0 else None, parts[1].strip() if len(parts) > 1 else "")
+
+    def isFor(self, botName):
+        """Whether the command is addressed to botName ("@name"), commands without a mention are for every bot."""
+        return self.mention == None or ("@" + self.mention).lower() == botName.lower()
+
+class CommandRouter(object):
+    """Looks up the handler registered for a command's exact name."""
+
+    def __init__(self):
+        self._handlers = {}
+
+    def register(self, name, handler):
+        self._handlers[name.lower()] = handler
+
+    def getCommands(self):
+        return list(self._handlers)
+
+    def route(self, command):
+        """Returns the handler for a ParsedCommand, or None when no handler is registered for it."""
+        return self._handlers.get(command.name)
@@ -0,0 +1,45 @@
+from service.commandRouter import CommandRouter, ParsedCommand
+import unittest
+
+class ParsedCommandTest(unittest.TestCase):
+
+    def test_parse_command(self):
+        command = ParsedCommand.parse("/going 2")
+        self.assertEqual(command.name, "going")
+        self.assertEqual(command.mention, None)
+        self.assertEqual(command.argumentText, "2")
+        self.assertEqual(command.arguments, ["2"])
+
+    def test_parse_command_with_mention(self):
+        command = ParsedCommand.parse("/Create@botName  Game night on Friday 7-9pm ")
+        self.assertEqual(command.name, "create")
+        self.assertEqual(command.mention, "botName")
+        self.assertEqual(command.argumentText, "Game night on Friday 7-9pm")
+        self.assertEqual(command.arguments, ["Game", "night", "on", "Friday", "7-9pm"])
+
+    def test_parse_command_without_arguments(self):
+        command = ParsedCommand.parse("/upcoming")
+        self.assertEqual(command.name, "upcoming")
+        self.assertEqual(command.argumentText, "")
+        self.assertEqual(command.arguments, [])
+
+    def test_parse_not_a_command(self):
+        self.assertEqual(ParsedCommand.parse("going 2"), None)
+        self.assertEqual(ParsedCommand.parse(None), None)
+
+    def test_is_for(self):
+        self.assertTrue(ParsedCommand.parse("/going").isFor("@botName"))
+        self.assertTrue(ParsedCommand.parse("/going@BotName").isFor("@botName"))
+        self.assertFalse(ParsedCommand.parse("/going@otherBot").isFor("@botName"))
+
+class CommandRouterTest(unittest.TestCase):
+
+    def test_route_matches_whole_command_name(self):
+        router = CommandRouter()
+        router.register("not", "notHandler")
+        router.register("notify", "notifyHandler")
+
+        self.assertEqual(router.route(ParsedCommand.parse("/not 1")), "notHandler")
+        self.assertEqual(router.route(ParsedCommand.parse("/notify")), "notifyHandler")
+        self.assertEqual(router.route(ParsedCommand.parse("/no")), None)
+        self.assertEqual(router.getCommands(), ["not", "notify"])
@@ -0,0 +1,106 @@
+import logging
+import threading
+import time
+from concurrent.futures import Future
+
+LOG = logging.getLogger(__name__)
+# wait before trying again after a failed background refresh
+_RETRY_DELAY = 30
+
+class CredentialManager(object):
+    """Refreshes an OAuth2Session's access token from a background thread shortly before it expires.
+
+    Requests keep using the current token while it is refreshed, so they only wait on a refresh
+    when the token did expire, e.g. after the machine slept. Concurrent calls to refresh share
+    one request to the token endpoint. tokenUpdater is called with every new token.
+    """
+
+    def __init__(self, session, tokenUri, refreshKwargs, tokenUpdater, refreshMargin=300, clock=time.time):
+        self._session = session
+        self._tokenUri = tokenUri
+        self._refreshKwargs = refreshKwargs
+        self._tokenUpdater = tokenUpdater
+        self._refreshMargin = refreshMargin
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._inFlight = None
+        self._changed = threading.Condition()
+        self._running = False
+        self._retryAt = None
+        self._thread = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="credential-refresh", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        with self._changed:
+            self._running = False
+            self._changed.notify()
+        if self._thread != None:
+            self._thread.join()
+
+    def tokenChanged(self):
+        """Reschedules the next refresh, call it after giving the session a new token."""
+        with self._changed:
+            self._retryAt = None
+            self._changed.notify()
+
+    def getSecondsUntilRefresh(self):
+        """Seconds until the token should be refreshed, None when there is no token that can be refreshed."""
+        token = self._session.token
+        if not isinstance(token, dict) or "expires_at" not in token or "refresh_token" not in token:
+            return None
+        refreshAt = token["expires_at"] - self._refreshMargin
+        if self._retryAt != None:
+            refreshAt = max(refreshAt, self._retryAt)
+        return refreshAt - self._clock()
+
+    def _run(self):
+        while True:
+            with self._changed:
+                if not self._running:
+                    return
+                delay = self.getSecondsUntilRefresh()
+                if delay == None or delay > 0:
+                    self._changed.wait(delay)
+                    continue
+
+            try:
+                self.refresh()
+            except Exception as e:
+                LOG.error("Could not refresh the access token, trying again in %d seconds: %s" % (_RETRY_DELAY, e))
+                with self._changed:
+                    self._retryAt = self._clock() + _RETRY_DELAY
+
+    def refresh(self, staleToken=None):
+        """Refreshes the token and returns the new one.
+
+        When staleToken is given and the session already holds a newer token, that token is
+        returned without refreshing. Callers arriving while a refresh is running wait for it.
+        """
+        with self._lock:
+            if staleToken != None and self._session.token is not staleToken:
+                return self._session.token
+            leader = self._inFlight == None
+            if leader:
+                self._inFlight = Future()
+            future = self._inFlight
+        if not leader:
+            return future.result()
+
+        try:
+            token = self._session.refresh_token(self._tokenUri, **self._refreshKwargs)
+            self._tokenUpdater(token)
+            LOG.info("Refreshed the access token")
+            future.set_result(token)
+            return token
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inFlight = None
+            self.tokenChanged()
@@ -0,0 +1,84 @@
+from service.credentialManager import CredentialManager
+import unittest
+from unittest import mock
+import threading
+import time
+
+class FakeSession(object):
+    def __init__(self, token, refreshedToken=None, refreshStarted=None, finishRefresh=None):
+        self.token = token
+        self._refreshedToken = refreshedToken
+        self._refreshStarted = refreshStarted
+        self._finishRefresh = finishRefresh
+        self.refreshCalls = []
+
+    def refresh_token(self, tokenUri, **kwargs):
+        self.refreshCalls.append((tokenUri, kwargs))
+        if self._refreshStarted != None:
+            self._refreshStarted.set()
+            self._finishRefresh.wait(5)
+        self.token = self._refreshedToken if self._refreshedToken != None else \
+            {"access_token": "new", "refresh_token": "refresh", "expires_at": time.time() + 3600}
+        return self.token
+
+class CredentialManagerTest(unittest.TestCase):
+
+    def test_concurrent_refreshes_share_one_request(self):
+        refreshStarted = threading.Event()
+        finishRefresh = threading.Event()
+        session = FakeSession({"access_token": "old"}, refreshStarted=refreshStarted, finishRefresh=finishRefresh)
+        tokenUpdater = mock.MagicMock()
+        credentialManager = CredentialManager(session, "tokenUri", {"client_id": "id"}, tokenUpdater)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(credentialManager.refresh())) for i in range(3)]
+        threads[0].start()
+        refreshStarted.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        finishRefresh.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(session.refreshCalls, [("tokenUri", {"client_id": "id"})])
+        self.assertEqual([token["access_token"] for token in results], ["new"] * 3)
+        tokenUpdater.assert_called_once_with(session.token)
+
+    def test_refresh_skipped_when_token_already_replaced(self):
+        staleToken = {"access_token": "old"}
+        session = FakeSession({"access_token": "new"})
+        credentialManager = CredentialManager(session, "tokenUri", {}, mock.MagicMock())
+        self.assertEqual(credentialManager.refresh(staleToken)["access_token"], "new")
+        self.assertEqual(session.refreshCalls, [])
+
+    def test_refreshes_before_expiry_in_background(self):
+        session = FakeSession({"access_token": "old", "refresh_token": "refresh", "expires_at": time.time() + 1.05})
+        refreshed = threading.Event()
+        credentialManager = CredentialManager(session, "tokenUri", {}, lambda token: refreshed.set(), refreshMargin=1)
+        credentialManager.start()
+        try:
+            self.assertTrue(refreshed.wait(5))
+            self.assertEqual(session.token["access_token"], "new")
+            self.assertGreater(credentialManager.getSecondsUntilRefresh(), 3000)
+        finally:
+            credentialManager.stop()
+        self.assertEqual(len(session.refreshCalls), 1)
+
+    def test_failed_refresh_is_retried_later(self):
+        session = mock.MagicMock()
+        session.token = {"access_token": "old", "refresh_token": "refresh", "expires_at": 100}
+        session.refresh_token.side_effect = Exception("token endpoint unavailable")
+        credentialManager = CredentialManager(session, "tokenUri", {}, mock.MagicMock(), refreshMargin=10, clock=lambda: 95)
+        credentialManager.start()
+        try:
+            for i in range(100):
+                if credentialManager.getSecondsUntilRefresh() > 0:
+                    break
+                time.sleep(0.01)
+            self.assertEqual(credentialManager.getSecondsUntilRefresh(), 30)
+        finally:
+            credentialManager.stop()
+        session.refresh_token.assert_called_once()
+
+    def test_no_refresh_without_refresh_token(self):
+        self.assertIsNone(CredentialManager(FakeSession({"access_token": "old"}), "tokenUri", {}, None).getSecondsUntilRefresh())
+        self.assertIsNone(CredentialManager(mock.MagicMock(), "tokenUri", {}, None).getSecondsUntilRefresh())
@@ -1,4 +1,4 @@
-from datetime import datetime
+from service.calendarEvent import CalendarEvent
 
 class EventFormatter:
     def isAllDayEvent(self, event):
@@ -38,32 +38,32 @@ class EventFormatter:
         raise NotImplementedError()
 
 class GoogleEventFormatter(EventFormatter):
+    """Formats CalendarEvents, Google event dicts are parsed into one on every call."""
+
+    def _as_calendar_event(self, event):
+        return event if isinstance(event, CalendarEvent) else CalendarEvent.fromGoogleEvent(event)
 
     def isAllDayEvent(self, event):
-        return 'date' in event['start']
+        return self._as_calendar_event(event).isAllDay
 
     def isStartAndEndOnSameDate(self, event):
+        event = self._as_calendar_event(event)
         return self.getFormattedStartDate(event) == self.getFormattedEndDate(event)
 
     def getTime(self, event, key):
-        time = None
-        if 'dateTime' in event[key]:
-            time = datetime.strptime(event[key]['dateTime'], "%Y-%m-%dT%H:%M:%S%z")
-        elif 'date' in event[key]:
-            time = datetime.strptime(event[key]['date'], "%Y-%m-%d")
-        return time
+        return self.getStartTime(event) if key == 'start' else self.getEndTime(event)
 
     def getStartTime(self, event):
-        return self.getTime(event, 'start')
+        return self._as_calendar_event(event).start
 
     def getEndTime(self, event):
-        return self.getTime(event, 'end')
+        return self._as_calendar_event(event).end
 
     def getEventLink(self, event):
-        return event['htmlLink']
+        return event.htmlLink if isinstance(event, CalendarEvent) else event['htmlLink']
 
     def getEventSummary(self, event):
-        return event['summary']
+        return event.summary if isinstance(event, CalendarEvent) else event['summary']
 
     def getSummaryWLinkTelegram(self, event):
         return "[%s](%s)" % (self.getEventSummary(event), self.getEventLink(event))
@@ -81,19 +81,23 @@ class GoogleEventFormatter(EventFormatter):
         return self.getEndTime(event).strftime("%I:%M:%S%p")
 
     def getFormattedDateOrDatesForEvent(self, index, event):
+        event = self._as_calendar_event(event)
         # one index events since this has more meaning in a message form
-        eventFormatted = str(index + 1) + ". " + self.getSummaryWLinkTelegram(event) + " - " + self.getFormattedStartDate(event)
-        if not self.isStartAndEndOnSameDate(event):
-            eventFormatted += " to " + self.getFormattedEndDate(event)
+        startDate = event.start.strftime("%m/%d/%Y")
+        endDate = event.end.strftime("%m/%d/%Y")
+        eventFormatted = str(index + 1) + ". " + self.getSummaryWLinkTelegram(event) + " - " + startDate
+        if startDate != endDate:
+            eventFormatted += " to " + endDate
 
-        if not self.isAllDayEvent(event):
-            eventFormatted += "\n\t\t\t\t\t\t\t" + self.getFormattedStartTime(event) + " - " + self.getFormattedEndTime(event)
+        if not event.isAllDay:
+            eventFormatted += "\n\t\t\t\t\t\t\t" + event.start.strftime("%I:%M:%S%p") + " - " + event.end.strftime("%I:%M:%S%p")
 
         return eventFormatted
 
     def getDayOrDaysAsFormattedDates(self, event):
-        dayOrDaysAsFormattedDateOrDates = self.getStartTime(event).strftime("%a. %b %d, %Y")
+        event = self._as_calendar_event(event)
+        dayOrDaysAsFormattedDateOrDates = event.start.strftime("%a. %b %d, %Y")
         if not self.isStartAndEndOnSameDate(event):
-            dayOrDaysAsFormattedDateOrDates += " to " + self.getEndTime(event).strftime("%a. %b %d, %Y")
+            dayOrDaysAsFormattedDateOrDates += " to " + event.end.strftime("%a. %b %d, %Y")
 
-        return dayOrDaysAsFormattedDateOrDates
\ No newline at end of file
+        return dayOrDaysAsFormattedDateOrDates
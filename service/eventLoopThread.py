@@ -0,0 +1,36 @@
+import asyncio
+import threading
+
+class EventLoopThread(object):
+    """Runs an asyncio event loop in a background thread so synchronous code can await coroutines."""
+
+    def __init__(self, name="calendar-event-loop"):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    def submit(self, coroutine):
+        """Schedules the coroutine on the loop and returns a concurrent.futures.Future for its result."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    def whenDone(self, coroutine, callback):
+        """Schedules the coroutine on the loop without waiting for it, callback(future) is then called on one of the
+        loop's executor threads so it may block, e.g. on sending a reply, without holding up the loop."""
+        def runCallback(future):
+            self._loop.call_soon_threadsafe(self._loop.run_in_executor, None, callback, future)
+
+        future = self.submit(coroutine)
+        future.add_done_callback(runCallback)
+        return future
+
+    def run(self, coroutine, timeout=None):
+        return self.submit(coroutine).result(timeout)
+
+    def stop(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
@@ -0,0 +1,110 @@
+import hashlib
+from service.googleCalendarService import _GOING, _NOT, _UNDECIDED
+from service.userEventStatusService import UserEventStatusService, _START_OF_ATTENDEE_INFO, _HIDDEN_CHAR
+
+# Google limits private extended property keys to 44 characters, so users are keyed by a hash of their name
+_ATTENDEE_KEY_PREFIX = "tcb.a."
+_ATTENDEE_KEY_HASH_LENGTH = 32
+# marks events whose attendee information has been moved out of the description
+_FORMAT_KEY = "tcb.format"
+_FORMAT_VERSION = "1"
+_STATUS_CODES = {
+    _GOING: "g",
+    _NOT: "n",
+    _UNDECIDED: "u"
+}
+_STATUSES_BY_CODE = {code: status for status, code in _STATUS_CODES.items()}
+_CODE_SEPARATOR = ":"
+# Google allows an event at most 300 extended properties, private and shared, of 32 kB in total
+_MAX_PROPERTIES = 300
+_MAX_PROPERTIES_SIZE = 32 * 1024
+
+class AttendeeLimitError(Exception):
+    """The event's extended properties have no room for another attendee."""
+    pass
+
+class ExtendedPropertiesUserEventStatusService(UserEventStatusService):
+    """Keeps each attendee's status under its own key in the event's private extended properties.
+
+    One key per attendee lets concurrent updates of different attendees merge without conflicts, but
+    limits an event to a little under 300 attendees. An update that would go over Google's limits
+    raises AttendeeLimitError instead of being rejected by Google.
+    """
+
+    def __init__(self, renderSummaryInDescription=False):
+        self._renderSummaryInDescription = renderSummaryInDescription
+
+    def _get_attendee_key(self, usersName):
+        return _ATTENDEE_KEY_PREFIX + hashlib.sha1(usersName.encode("utf-8")).hexdigest()[:_ATTENDEE_KEY_HASH_LENGTH]
+
+    def _encode_status(self, usersName, status):
+        return "%s%s%s" % (_STATUS_CODES.get(status, status), _CODE_SEPARATOR, usersName)
+
+    def _decode_status(self, value):
+        code, _, usersName = value.partition(_CODE_SEPARATOR)
+        return usersName, _STATUSES_BY_CODE.get(code, code)
+
+    def _get_private_properties(self, event):
+        return event.get("extendedProperties", {}).get("private", {})
+
+    def _is_migrated(self, event):
+        return self._get_private_properties(event).get(_FORMAT_KEY) == _FORMAT_VERSION
+
+    def _get_attendee_properties(self, privateProperties):
+        return {key: value for key, value in privateProperties.items() if key.startswith(_ATTENDEE_KEY_PREFIX)}
+
+    def _get_description_attendee_properties(self, event):
+        properties = {}
+        attendeeStatusString = super().getAttendeeStatusStringForEvent(event)
+        if attendeeStatusString != None:
+            for attendeeLine in attendeeStatusString.splitlines():
+                usersName, _, status = attendeeLine.partition(_HIDDEN_CHAR)
+                properties[self._get_attendee_key(usersName)] = self._encode_status(usersName, status)
+        return properties
+
+    def _check_property_limits(self, event, changedProperties):
+        extendedProperties = event.get("extendedProperties", {})
+        privateProperties = dict(extendedProperties.get("private", {}))
+        privateProperties.update(changedProperties)
+        properties = list(privateProperties.items()) + list(extendedProperties.get("shared", {}).items())
+        size = sum(len(key.encode("utf-8")) + len(value.encode("utf-8")) for key, value in properties)
+        if len(properties) > _MAX_PROPERTIES or size > _MAX_PROPERTIES_SIZE:
+            raise AttendeeLimitError("Event %s has no room for more attendees: %d extended properties of %d bytes"
+                                     % (event.get("id"), len(properties), size))
+
+    def _render_attendees(self, attendeeProperties):
+        attendees = sorted(self._decode_status(value) for value in attendeeProperties.values())
+        return "\n".join("%s%c%s" % (usersName, _HIDDEN_CHAR, status) for usersName, status in attendees)
+
+    def getUserStatus(self, event, usersName):
+        value = self._get_private_properties(event).get(self._get_attendee_key(usersName))
+        return self._decode_status(value)[1] if value != None else None
+
+    def getEventUpdateForUserStatuses(self, event, userStatuses):
+        changedProperties = {}
+        eventUpdate = {}
+        if not self._is_migrated(event):
+            # one time move of the attendees listed in the description, the description is rewritten below
+            changedProperties.update(self._get_description_attendee_properties(event))
+            changedProperties[_FORMAT_KEY] = _FORMAT_VERSION
+            eventUpdate["description"] = self.getDescriptionForEvent(event)
+
+        for usersName, status in userStatuses.items():
+            changedProperties[self._get_attendee_key(usersName)] = self._encode_status(usersName, status)
+        self._check_property_limits(event, changedProperties)
+        # private properties are merged by PATCH, so only the changed keys are sent
+        eventUpdate["extendedProperties"] = {"private": changedProperties}
+
+        if self._renderSummaryInDescription:
+            attendeeProperties = self._get_attendee_properties(self._get_private_properties(event))
+            attendeeProperties.update(self._get_attendee_properties(changedProperties))
+            eventUpdate["description"] = self.getDescriptionForEvent(event) + _START_OF_ATTENDEE_INFO \
+                + self._render_attendees(attendeeProperties)
+
+        return eventUpdate
+
+    def getAttendeeStatusStringForEvent(self, event):
+        if not self._is_migrated(event):
+            return super().getAttendeeStatusStringForEvent(event)
+        attendeeProperties = self._get_attendee_properties(self._get_private_properties(event))
+        return self._render_attendees(attendeeProperties) if len(attendeeProperties) > 0 else None
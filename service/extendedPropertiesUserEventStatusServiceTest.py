@@ -0,0 +1,77 @@
+from service.extendedPropertiesUserEventStatusService import ExtendedPropertiesUserEventStatusService, _FORMAT_KEY, \
+    AttendeeLimitError
+from service.userEventStatusService import _START_OF_ATTENDEE_INFO, _HIDDEN_CHAR
+from service.googleCalendarService import _GOING, _NOT, _UNDECIDED
+import unittest
+
+class ExtendedPropertiesUserEventStatusServiceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.userEventStatusService = ExtendedPropertiesUserEventStatusService()
+        self.legacyEvent = {
+            "id": "eventId",
+            "description": "description." + _START_OF_ATTENDEE_INFO
+                + "first%c%s\nsecond%c%s" % (_HIDDEN_CHAR, _GOING, _HIDDEN_CHAR, _NOT)
+        }
+
+    def applyUpdate(self, event, eventUpdate):
+        # mirrors how PATCH merges private extended properties
+        updatedEvent = dict(event)
+        if "description" in eventUpdate:
+            updatedEvent["description"] = eventUpdate["description"]
+        private = dict(event.get("extendedProperties", {}).get("private", {}))
+        private.update(eventUpdate["extendedProperties"]["private"])
+        updatedEvent["extendedProperties"] = {"private": private}
+        return updatedEvent
+
+    def test_migrates_attendees_from_description(self):
+        eventUpdate = self.userEventStatusService.getEventUpdateForUserStatuses(self.legacyEvent, {"third": _UNDECIDED})
+        self.assertEqual(eventUpdate["description"], "description.")
+        self.assertEqual(len(eventUpdate["extendedProperties"]["private"]), 4)
+
+        event = self.applyUpdate(self.legacyEvent, eventUpdate)
+        self.assertEqual(self.userEventStatusService.getUserStatus(event, "first"), _GOING)
+        self.assertEqual(self.userEventStatusService.getUserStatus(event, "second"), _NOT)
+        self.assertEqual(self.userEventStatusService.getUserStatus(event, "third"), _UNDECIDED)
+        self.assertEqual(self.userEventStatusService.getDescriptionForEvent(event), "description.")
+        self.assertEqual(self.userEventStatusService.getAttendeeStatusStringForEvent(event),
+            "first%c%s\nsecond%c%s\nthird%c%s" % (_HIDDEN_CHAR, _GOING, _HIDDEN_CHAR, _NOT, _HIDDEN_CHAR, _UNDECIDED))
+
+    def test_migrated_event_only_updates_changed_user(self):
+        event = self.applyUpdate(self.legacyEvent,
+            self.userEventStatusService.getEventUpdateForUserStatuses(self.legacyEvent, {"first": _GOING}))
+
+        eventUpdate = self.userEventStatusService.getEventUpdateForUserStatuses(event, {"second": _GOING})
+        self.assertNotIn("description", eventUpdate)
+        self.assertEqual(len(eventUpdate["extendedProperties"]["private"]), 1)
+        for key in eventUpdate["extendedProperties"]["private"]:
+            self.assertLessEqual(len(key), 44)
+
+        event = self.applyUpdate(event, eventUpdate)
+        self.assertEqual(self.userEventStatusService.getUserStatus(event, "second"), _GOING)
+        self.assertIsNone(self.userEventStatusService.getUserStatus(event, "unknown"))
+
+    def test_attendees_limited_to_googles_property_limits(self):
+        event = {"id": "eventId", "description": "", "extendedProperties": {"private": {_FORMAT_KEY: "1"}}}
+        userStatuses = {"user %d" % i: _GOING for i in range(299)}
+        event = self.applyUpdate(event, self.userEventStatusService.getEventUpdateForUserStatuses(event, userStatuses))
+
+        # a known attendee can still change their status
+        self.userEventStatusService.getEventUpdateForUserStatuses(event, {"user 1": _NOT})
+        with self.assertRaises(AttendeeLimitError):
+            self.userEventStatusService.getEventUpdateForUserStatuses(event, {"user 300": _GOING})
+
+    def test_renders_summary_in_description(self):
+        userEventStatusService = ExtendedPropertiesUserEventStatusService(renderSummaryInDescription=True)
+        event = self.applyUpdate(self.legacyEvent,
+            userEventStatusService.getEventUpdateForUserStatuses(self.legacyEvent, {"first": _UNDECIDED}))
+        self.assertEqual(event["description"], "description." + _START_OF_ATTENDEE_INFO
+            + "first%c%s\nsecond%c%s" % (_HIDDEN_CHAR, _UNDECIDED, _HIDDEN_CHAR, _NOT))
+        self.assertEqual(event["extendedProperties"]["private"][_FORMAT_KEY], "1")
+
+    def test_event_without_attendees(self):
+        event = {"id": "eventId"}
+        self.assertIsNone(self.userEventStatusService.getAttendeeStatusStringForEvent(event))
+        eventUpdate = self.userEventStatusService.getEventUpdateForUserStatuses(event, {"first": _GOING})
+        event = self.applyUpdate(event, eventUpdate)
+        self.assertEqual(self.userEventStatusService.getAttendeeStatusStringForEvent(event), "first%c%s" % (_HIDDEN_CHAR, _GOING))
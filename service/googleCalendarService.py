@@ -2,57 +2,363 @@ import json
 import logging
 import os
 import sys
+import threading
+import time
 from datetime import datetime
 
 import flask
+from oauthlib.oauth2 import TokenExpiredError
+from requests.adapters import HTTPAdapter
 from requests_oauthlib import OAuth2Session
-from support.properties import SCOPE, TOKEN_FILE, CLIENT_SECRET_FILE
+from service.calendarMirror import CalendarMirror
+from service.credentialManager import CredentialManager
+from service.logPayload import LogPayload
+from service.memoryBudget import estimateSize
+from service.metrics import REGISTRY
+from service.tracing import TRACER, traceMethods
+from service.upcomingEventsCache import UpcomingEventsCache
+from support.properties import SCOPE, TOKEN_FILE, CLIENT_SECRET_FILE, UPCOMING_EVENTS_CACHE_TTL, UPCOMING_EVENTS_CACHE_MAX_SIZE, \
+    ENABLE_CALENDAR_SYNC, CALENDAR_SYNC_INTERVAL, GOOGLE_CALENDAR_API_URL, CALENDAR_MAX_CONNECTIONS_PER_HOST, MINIMAL_PAYLOADS, \
+    PROACTIVE_TOKEN_REFRESH, TOKEN_REFRESH_MARGIN, GOOGLE_REQUEST_TIMEOUT
 
 LOG = logging.getLogger(__name__)
 _GOING = "is going to this event"
 _NOT = "is not going to this event"
 _UNDECIDED = "is undecided about this event"
+_MAX_UPCOMING_EVENTS = 10
+_SYNC_PAGE_SIZE = 250
+_MAX_CONFLICT_RETRIES = 3
+# the Calendar API and the OAuth token endpoint
+_CONNECTION_POOLS = 2
+_REQUEST_SECONDS = REGISTRY.histogram("google_calendar_request_seconds",
+                                      "Time taken by Google Calendar API requests", ("endpoint", "status"))
+# the event fields read by CalendarEvent, the formatter and the attendee status services
+_EVENT_FIELDS = "id,etag,updated,status,summary,htmlLink,description,start,end,extendedProperties"
+_LIST_FIELDS = "items(%s),nextPageToken,nextSyncToken" % _EVENT_FIELDS
+# Google only gzips responses for user agents that mention gzip
+_GZIP_HEADERS = {"Accept-Encoding": "gzip", "User-Agent": "TelegramCalendarBot (gzip)"}
+_TOKEN_REFRESHES = REGISTRY.counter("google_token_refreshes_total", "Google OAuth access tokens refreshed")
 
+def _to_rfc3339(time):
+    if isinstance(time, str):
+        return time
+    if time.tzinfo == None:
+        time = time.astimezone()
+    return time.isoformat()
+
+def _write_token_file(token):
+    # written to a temporary file first so a crash can not leave a half written token
+    temporaryFile = TOKEN_FILE + ".tmp"
+    with open(temporaryFile, "w+") as token_file:
+        json.dump(token, token_file)
+    os.replace(temporaryFile, TOKEN_FILE)
+
+class GoogleCalendarError(Exception):
+    """Google Calendar answered a request with an error status."""
+
+    def __init__(self, message, statusCode):
+        super().__init__(message)
+        self.statusCode = statusCode
+
+class _SyncTokenExpired(Exception):
+    pass
+
+class _TimeoutHTTPAdapter(HTTPAdapter):
+    """Gives every request sent through it, token refreshes included, a timeout unless the caller set one."""
+
+    def __init__(self, timeout, **kwargs):
+        self._timeout = timeout
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") == None:
+            kwargs["timeout"] = self._timeout
+        return super().send(request, **kwargs)
+
+@traceMethods
 class GoogleCalendarService(object):
-    def __init__(self, userEventStatusService):
+    def __init__(self, userEventStatusService, upcomingEventsCache=None, syncEnabled=ENABLE_CALENDAR_SYNC,
+                 baseUrl=GOOGLE_CALENDAR_API_URL, memoryBudget=None, maxConnections=CALENDAR_MAX_CONNECTIONS_PER_HOST,
+                 minimalPayloads=MINIMAL_PAYLOADS, proactiveTokenRefresh=PROACTIVE_TOKEN_REFRESH, eventStore=None,
+                 requestTimeout=GOOGLE_REQUEST_TIMEOUT):
         self._userEventStatusService = userEventStatusService
+        # seconds a request may take to connect and then between received bytes, None to wait forever
+        self._requestTimeout = requestTimeout
+        self._minimalPayloads = minimalPayloads
+        self._proactiveTokenRefresh = proactiveTokenRefresh
+        # refreshes the token in the background when proactiveTokenRefresh is set
+        self._credentialManager = None
+        self._baseUrl = baseUrl.rstrip("/")
+        self._memoryBudget = memoryBudget
+        self._maxConnections = maxConnections
+        self._upcomingEventsCache = upcomingEventsCache if upcomingEventsCache != None \
+            else UpcomingEventsCache(UPCOMING_EVENTS_CACHE_TTL, UPCOMING_EVENTS_CACHE_MAX_SIZE, memoryBudget=memoryBudget)
+        self._syncEnabled = syncEnabled
+        # a SqliteEventStore holding the synced calendars, or the last events read when sync is off
+        self._eventStore = eventStore
+        self._mirrors = {}
+        self._mirrorsLock = threading.Lock()
+        self._invalidationListeners = []
         self._secret = self._get_secret_from_file()
         self._google = self._get_creds()
 
+    def _request(self, method, endpoint, url, **kwargs):
+        """Sends a request with the OAuth session and records how long endpoint took and its status."""
+        started = time.perf_counter()
+        status = "error"
+        with TRACER.span("google " + endpoint, **{"http.method": method.upper(), "http.url": url}) as span:
+            try:
+                token = self._google.token
+                try:
+                    response = getattr(self._google, method)(url, **kwargs)
+                except TokenExpiredError:
+                    if self._credentialManager == None:
+                        raise
+                    # the background refresh did not run in time, e.g. the machine was asleep
+                    self._credentialManager.refresh(token)
+                    response = getattr(self._google, method)(url, **kwargs)
+                status = str(response.status_code)
+                return response
+            finally:
+                span.setAttribute("http.status_code", status)
+                _REQUEST_SECONDS.labels(endpoint, status).observe(time.perf_counter() - started)
+
+    def _with_fields(self, params, fields):
+        """Adds the fields projection to params when only the fields the bot uses are requested."""
+        if not self._minimalPayloads:
+            return params
+        return dict(params or {}, fields=fields)
+
+    def _decode(self, response):
+        # the raw bytes skip decoding the body to a str first
+        return json.loads(response.content if self._minimalPayloads else response.text)
+
     def getCalendarEvents(self, calendarId):
-        response = self._google.get(
-            "https://www.googleapis.com/calendar/v3/calendars/%s/events" % calendarId)
-        if response.ok:
-            content = json.loads(response.text)["items"]
-            LOG.info("Events: %s" % content)
-        else:
-            content = json.loads(response.text)
-            LOG.info("Response from Google: %s" % content)
+        if self._syncEnabled:
+            return self._get_synced_mirror(calendarId).getEvents()
 
-        return content
+        events = list(self.iterCalendarEvents(calendarId))
+        LOG.info("Listed %d events from calendar %s", len(events), calendarId)
+        return events
+
+    def iterCalendarEvents(self, calendarId, pageSize=None, timeMin=None, timeMax=None):
+        """Yields every event of the calendar, fetching the next page only once the previous one is used up.
+
+        timeMin and timeMax are datetimes or RFC3339 strings limiting the events to those overlapping the window.
+        """
+        params = {}
+        if pageSize != None:
+            params["maxResults"] = pageSize
+        if timeMin != None:
+            params["timeMin"] = _to_rfc3339(timeMin)
+        if timeMax != None:
+            params["timeMax"] = _to_rfc3339(timeMax)
+        for page in self._iter_event_pages(calendarId, params):
+            for event in page.get("items", []):
+                yield event
+
+    def _iter_event_pages(self, calendarId, params):
+        """Yields the decoded pages of an events list request, raising _SyncTokenExpired on 410 Gone."""
+        params = self._with_fields(params, _LIST_FIELDS)
+        while True:
+            # the first page is requested without params when there are none
+            response = self._request("get", "events.list",
+                self._baseUrl + "/calendars/%s/events" % calendarId, **({"params": params} if params else {}))
+            if response.status_code == 410:
+                raise _SyncTokenExpired()
+            if not response.ok:
+                raise GoogleCalendarError("Could not list events of calendar %s: %s" % (calendarId, response.text),
+                                          response.status_code)
+
+            page = self._decode(response)
+            yield page
+            if "nextPageToken" not in page:
+                return
+            params = dict(params, pageToken=page["nextPageToken"])
 
     def getUpcomingEvents(self, calendarId):
         try:
-            response = self._google.get(
-                "https://www.googleapis.com/calendar/v3/calendars/%s/events" % calendarId, 
-                params={
-                    "singleEvents" : True,
-                    "orderBy" : "startTime",
-                    "timeMin" : datetime.today().strftime("%Y-%m-%dT%H:%M:%S%zZ"),
-                    "maxResults": 10
-                    })
-            if response.ok:
-                content = json.loads(response.text)["items"]
-                LOG.info("Upcoming events: %s" % content)
-            else:
-                content = json.loads(response.text)
-                LOG.info("Response from Google: %s" % content)
+            return self.loadUpcomingEvents(calendarId)
         except Exception as e:
             LOG.info(e)
-            content = []
+            localEvents = self.getLocalUpcomingEvents(calendarId)
+            return localEvents if localEvents != None else []
+
+    def loadUpcomingEvents(self, calendarId):
+        """Like getUpcomingEvents, but raises when Google could not be read instead of serving the local copy."""
+        if self._syncEnabled:
+            mirror = self._get_synced_mirror(calendarId, raiseErrors=True)
+            return mirror.getUpcomingEvents(CalendarMirror.now(), _MAX_UPCOMING_EVENTS)
 
+        cachedEvents = self._upcomingEventsCache.get(calendarId)
+        if cachedEvents != None:
+            return cachedEvents
+
+        response = self._request("get", "events.list",
+            self._baseUrl + "/calendars/%s/events" % calendarId, 
+            params=self._with_fields({
+                "singleEvents" : True,
+                "orderBy" : "startTime",
+                "timeMin" : datetime.today().strftime("%Y-%m-%dT%H:%M:%S%zZ"),
+                "maxResults": _MAX_UPCOMING_EVENTS
+                }, _LIST_FIELDS))
+        if not response.ok:
+            raise GoogleCalendarError("Could not list upcoming events of calendar %s: %s" % (calendarId, response.text),
+                                      response.status_code)
+
+        content = self._decode(response)["items"]
+        LOG.info("Upcoming events: %s", LogPayload(content))
+        self._upcomingEventsCache.put(calendarId, content)
+        if self._eventStore != None:
+            # the listed events are every upcoming event unless maxResults cut the list short
+            self._eventStore.replaceUpcomingEvents(calendarId, content, CalendarMirror.now(),
+                                                   len(content) < _MAX_UPCOMING_EVENTS)
         return content
 
+    def getLocalUpcomingEvents(self, calendarId):
+        """The upcoming events from the synced or stored copy of the calendar, None when there is no copy."""
+        if self._syncEnabled:
+            mirror = self._get_mirror(calendarId)
+            if mirror.getSyncToken() == None:
+                return None
+            return mirror.getUpcomingEvents(CalendarMirror.now(), _MAX_UPCOMING_EVENTS)
+        if self._eventStore != None:
+            LOG.info("Serving the stored upcoming events of calendar %s" % calendarId)
+            return self._eventStore.getUpcomingEvents(calendarId, CalendarMirror.now(), _MAX_UPCOMING_EVENTS)
+        return None
+
+    def getLocalEvent(self, calendarId, eventId):
+        """The event from the synced, cached or stored copy of the calendar, None when no copy holds it."""
+        if self._syncEnabled:
+            return self._get_mirror(calendarId).getEvent(eventId)
+        cachedEvents = self._upcomingEventsCache.peek(calendarId)
+        for event in cachedEvents if cachedEvents != None else []:
+            if event.get("id") == eventId:
+                return event
+        if self._eventStore != None:
+            return self._eventStore.getEvent(calendarId, eventId)
+        return None
+
+    def _get_mirror(self, calendarId):
+        with self._mirrorsLock:
+            if calendarId not in self._mirrors:
+                self._mirrors[calendarId] = self._eventStore.getCalendar(calendarId) if self._eventStore != None \
+                    else CalendarMirror()
+            return self._mirrors[calendarId]
+
+    def _get_synced_mirror(self, calendarId, raiseErrors=False):
+        mirror = self._get_mirror(calendarId)
+        if self._memoryBudget != None:
+            self._memoryBudget.touch(self, calendarId)
+        if mirror.isStale(time.monotonic(), CALENDAR_SYNC_INTERVAL):
+            try:
+                self.syncCalendar(calendarId)
+            except Exception as e:
+                if raiseErrors:
+                    raise
+                # serve whatever the mirror already holds until the next sync succeeds
+                LOG.info(e)
+        return mirror
+
+    def syncCalendar(self, calendarId):
+        mirror = self._get_mirror(calendarId)
+        with mirror.syncLock:
+            syncToken = mirror.getSyncToken()
+            if syncToken != None:
+                syncStarted = time.monotonic()
+                result = self._list_events_for_sync(calendarId, {"syncToken": syncToken})
+                if result != None:
+                    events, nextSyncToken = result
+                    mirror.applyChanges(events, nextSyncToken, syncStarted)
+                    LOG.info("Applied %d changed events to calendar %s" % (len(events), calendarId))
+                    if len(events) > 0:
+                        self._charge_mirror(calendarId, mirror)
+                    return
+                LOG.info("Sync token for calendar %s expired, doing a full sync" % calendarId)
+                mirror.clear()
+
+            syncStarted = time.monotonic()
+            events, nextSyncToken = self._list_events_for_sync(calendarId, {})
+            mirror.replaceAll(events, nextSyncToken, syncStarted)
+            LOG.info("Fully synced %d events from calendar %s" % (len(events), calendarId))
+            self._charge_mirror(calendarId, mirror)
+
+    def _charge_mirror(self, calendarId, mirror):
+        # a stored calendar is kept on disk rather than in memory
+        if self._memoryBudget != None and self._eventStore == None:
+            self._memoryBudget.charge(self, calendarId, estimateSize(mirror.getEvents()))
+
+    def evict(self, calendarId):
+        """Drops the local copy of a calendar to stay within the memory budget, it is fully synced on next use."""
+        with self._mirrorsLock:
+            self._mirrors.pop(calendarId, None)
+
+    def _list_events_for_sync(self, calendarId, params):
+        """Returns (events, nextSyncToken), or None when Google wants a full sync (410 Gone)."""
+        events = []
+        nextSyncToken = None
+        try:
+            for page in self._iter_event_pages(calendarId, dict(params, singleEvents=True, maxResults=_SYNC_PAGE_SIZE)):
+                events.extend(page.get("items", []))
+                nextSyncToken = page.get("nextSyncToken")
+        except _SyncTokenExpired:
+            return None
+        return events, nextSyncToken
+
+    def _update_mirror(self, calendarId, eventResponse):
+        if self._syncEnabled:
+            self._get_mirror(calendarId).upsert(self._decode(eventResponse))
+        elif self._eventStore != None:
+            self._eventStore.upsertEvents(calendarId, [self._decode(eventResponse)])
+
+    def addInvalidationListener(self, listener):
+        """listener is called with the calendar id whenever events of that calendar change."""
+        self._invalidationListeners.append(listener)
+
+    def _invalidate(self, calendarId):
+        self._upcomingEventsCache.invalidate(calendarId)
+        for listener in self._invalidationListeners:
+            listener(calendarId)
+
+    def refreshCalendar(self, calendarId):
+        self._invalidate(calendarId)
+        if self._syncEnabled:
+            self._get_mirror(calendarId).markStale()
+            self.syncCalendar(calendarId)
+
+    def watchCalendar(self, calendarId, channelId, address, token, ttlSeconds):
+        channel = None
+        res = self._request("post", "events.watch",
+            self._baseUrl + "/calendars/%s/events/watch" % calendarId,
+            json={
+                "id": channelId,
+                "type": "web_hook",
+                "address": address,
+                "token": token,
+                "params": {
+                    "ttl": str(ttlSeconds)
+                }
+            })
+        if res.ok:
+            channel = json.loads(res.text)
+            LOG.info("Watching calendar %s on channel %s" % (calendarId, channelId))
+        else:
+            LOG.info("Could not watch calendar %s: %s", calendarId, LogPayload(res.content))
+        return channel
+
+    def stopChannel(self, channelId, resourceId):
+        res = self._request("post", "channels.stop",
+            self._baseUrl + "/channels/stop",
+            json={
+                "id": channelId,
+                "resourceId": resourceId
+            })
+        LOG.info("Response after stopping channel %s: %s", channelId, LogPayload(res.content))
+        return res.ok
+
+    def getUpcomingEventsCacheStats(self):
+        return self._upcomingEventsCache.getStats()
+
     def _get_secret_from_file(self):
         with open(CLIENT_SECRET_FILE) as json_file:
             secret = json.load(json_file)
@@ -72,85 +378,109 @@ class GoogleCalendarService(object):
             "client_id": secret["client_id"],
             'client_secret': secret["client_secret"]
         }
-        google = OAuth2Session(secret["client_id"],
-                               scope=SCOPE,
-                               auto_refresh_url=secret["token_uri"],
-                               auto_refresh_kwargs=extra,
-                               token_updater=self.saveToken,
-                               redirect_uri=secret['redirect_uris'][0],
-                               token=token)
+        if self._proactiveTokenRefresh:
+            google = OAuth2Session(secret["client_id"],
+                                   scope=SCOPE,
+                                   redirect_uri=secret['redirect_uris'][0],
+                                   token=token)
+            self._credentialManager = CredentialManager(google, secret["token_uri"], extra, self.saveToken,
+                                                        TOKEN_REFRESH_MARGIN).start()
+            self._tokenRefresher = self._credentialManager
+        else:
+            google = OAuth2Session(secret["client_id"],
+                                   scope=SCOPE,
+                                   auto_refresh_url=secret["token_uri"],
+                                   auto_refresh_kwargs=extra,
+                                   token_updater=self.saveToken,
+                                   redirect_uri=secret['redirect_uris'][0],
+                                   token=token)
+            # only refreshes on demand, for the services sharing this session's token
+            self._tokenRefresher = CredentialManager(google, secret["token_uri"], extra, self.saveToken)
+        # one pool of keep-alive connections per host, shared by every calendar and thread
+        adapter = _TimeoutHTTPAdapter(self._requestTimeout, pool_connections=_CONNECTION_POOLS,
+                                      pool_maxsize=self._maxConnections)
+        google.mount("https://", adapter)
+        google.mount("http://", adapter)
+        if self._minimalPayloads:
+            google.headers.update(_GZIP_HEADERS)
 
         return google
 
     def getCurrentEvent(self, calendarId, eventId):
-        event = None
-        res = self._google.get("https://www.googleapis.com/calendar/v3/calendars/%s/events/%s" % (calendarId, eventId))
-        if res.ok:
-            event = json.loads(res.text)
-        return event
-
-    def setGoingToEvent(self, calendarId, eventId, usersName):
-        event = self.getCurrentEvent(calendarId, eventId)
-        existingDescription = event["description"] if "description" in event else ""
-
-        updatedDescription = self._userEventStatusService.getUpdatedDescToUpdateUserStatus(existingDescription, usersName, _GOING)
-
-        res = self._google.patch(
-            "https://www.googleapis.com/calendar/v3/calendars/%s/events/%s" % (calendarId, eventId),
-            json={"description": updatedDescription},
-            params={
-                "sendUpdates": "none"
-            }
-            )
-        LOG.info("Response after updating status to going: %s" % res.text)
-
-    def setNotGoingToEvent(self, calendarId, eventId, usersName):
-        event = self.getCurrentEvent(calendarId, eventId)
-        existingDescription = event["description"] if "description" in event else ""
-
-        updatedDescription = self._userEventStatusService.getUpdatedDescToUpdateUserStatus(existingDescription, usersName, _NOT)
-
-        res = self._google.patch(
-            "https://www.googleapis.com/calendar/v3/calendars/%s/events/%s" % (calendarId, eventId),
-            json={"description": updatedDescription},
-            params={
-                "sendUpdates": "none"
-            }
-            )
-        LOG.info("Response after updating status to not going: %s" % res.text)
-
-
-    def setUndecidedAboutEvent(self, calendarId, eventId, usersName):
-        event = self.getCurrentEvent(calendarId, eventId)
-        existingDescription = event["description"] if "description" in event else ""
-
-        updatedDescription = self._userEventStatusService.getUpdatedDescToUpdateUserStatus(existingDescription, usersName, _UNDECIDED)
-
-        res = self._google.patch(
-            "https://www.googleapis.com/calendar/v3/calendars/%s/events/%s" % (calendarId, eventId),
-            json={"description": updatedDescription},
-            params={
-                "sendUpdates": "none"
-            }
-            )
-        LOG.info("Response after updating status to undecided: %s" % res.text)
+        """The event, None when it does not exist (404) or was deleted (410), raises on any other error."""
+        fields = self._with_fields(None, _EVENT_FIELDS)
+        res = self._request("get", "events.get", self._baseUrl + "/calendars/%s/events/%s" % (calendarId, eventId),
+                            **({"params": fields} if fields else {}))
+        if res.status_code in (404, 410):
+            return None
+        if not res.ok:
+            raise GoogleCalendarError("Could not get event %s of calendar %s: %s" % (eventId, calendarId, res.text),
+                                      res.status_code)
+        return self._decode(res)
+
+    def setUserStatusesForEvent(self, calendarId, eventId, userStatuses, event=None):
+        """Applies several users' statuses to an event with a single update."""
+        # callers usually already hold the event, only fetch it when they do not
+        if event == None:
+            event = self.getCurrentEvent(calendarId, eventId)
+
+        for attempt in range(_MAX_CONFLICT_RETRIES + 1):
+            if event == None:
+                raise Exception("Event %s of calendar %s no longer exists" % (eventId, calendarId))
+            eventUpdate = self._userEventStatusService.getEventUpdateForUserStatuses(event, userStatuses)
+
+            # a rewritten description must only replace the version it was read from
+            conditional = "description" in eventUpdate and "etag" in event
+            res = self._request("patch", "events.patch",
+                self._baseUrl + "/calendars/%s/events/%s" % (calendarId, eventId),
+                json=eventUpdate,
+                params=self._with_fields({
+                    "sendUpdates": "none"
+                }, _EVENT_FIELDS),
+                headers={"If-Match": event["etag"]} if conditional else {}
+                )
+            if res.status_code != 412:
+                break
+            LOG.info("Event %s changed since it was read, fetching it again" % eventId)
+            event = self.getCurrentEvent(calendarId, eventId)
+
+        LOG.info("Response after updating statuses %s: %s", userStatuses, LogPayload(res.content))
+        if not res.ok:
+            raise GoogleCalendarError("Could not update statuses %s for event %s" % (userStatuses, eventId),
+                                      res.status_code)
+        self._invalidate(calendarId)
+        self._update_mirror(calendarId, res)
+
+    def _set_user_status(self, calendarId, eventId, usersName, updatedStatus, event):
+        self.setUserStatusesForEvent(calendarId, eventId, {usersName: updatedStatus}, event)
+
+    def setGoingToEvent(self, calendarId, eventId, usersName, event=None):
+        self._set_user_status(calendarId, eventId, usersName, _GOING, event)
+
+    def setNotGoingToEvent(self, calendarId, eventId, usersName, event=None):
+        self._set_user_status(calendarId, eventId, usersName, _NOT, event)
+
+    def setUndecidedAboutEvent(self, calendarId, eventId, usersName, event=None):
+        self._set_user_status(calendarId, eventId, usersName, _UNDECIDED, event)
 
     def quickCreateEvent(self, calendarId, quickCreateString):
         result = {}
-        res = self._google.post(
-            "https://www.googleapis.com/calendar/v3/calendars/%s/events/quickAdd" % calendarId,
-            params={
+        res = self._request("post", "events.quickAdd",
+            self._baseUrl + "/calendars/%s/events/quickAdd" % calendarId,
+            params=self._with_fields({
                 "text": quickCreateString
-            })
+            }, _EVENT_FIELDS))
         if res.ok:
-            LOG.info("Response after quick creating event: %s" % res.text)
-            createdEvent = json.loads(res.text)
+            LOG.info("Response after quick creating event: %s", LogPayload(res.content))
+            self._invalidate(calendarId)
+            createdEvent = self._decode(res)
+            self._update_mirror(calendarId, res)
             result["summary"] = createdEvent["summary"]
             result["htmlLink"] = createdEvent["htmlLink"]
         else:
             errorMessage = "Could not quick create event %s"
             result["error"] = errorMessage % "contact developer"
-            LOG.info(errorMessage % res.text)
+            LOG.info(errorMessage, LogPayload(res.content))
         return result
 
     def authorize(self):
@@ -174,9 +504,26 @@ class GoogleCalendarService(object):
         token = self._google.fetch_token(secret["token_uri"], client_secret=secret["client_secret"],
                                          authorization_response=redirect_response)
 
-        with open(TOKEN_FILE, "w+") as token_file:
-            json.dump(token, token_file)
+        self._write_token(token)
+        if self._credentialManager != None:
+            self._credentialManager.tokenChanged()
     
+    def close(self):
+        """Stops refreshing the token in the background."""
+        if self._credentialManager != None:
+            self._credentialManager.stop()
+
+    def getToken(self):
+        """The current OAuth token, for services sharing this one's credentials."""
+        return self._google.token
+
+    def refreshToken(self, staleToken=None):
+        """Refreshes the shared token and returns the new one, see CredentialManager.refresh."""
+        return self._tokenRefresher.refresh(staleToken)
+
     def saveToken(self, token):
-        with open(TOKEN_FILE, "w+") as token_file:
-            json.dump(token, token_file)
\ No newline at end of file
+        _TOKEN_REFRESHES.inc()
+        self._write_token(token)
+
+    def _write_token(self, token):
+        _write_token_file(token)
\ No newline at end of file
@@ -1,9 +1,18 @@
-from service.googleCalendarService import GoogleCalendarService
+from service.googleCalendarService import GoogleCalendarService, _TimeoutHTTPAdapter
+from service.metrics import REGISTRY
+from service.resilientCalendarService import ResilientCalendarService, CircuitBreaker, CalendarUnavailableError, \
+    OPEN, CLOSED
+from service.tracing import TRACER
+from service.sqliteEventStore import SqliteEventStore
 from service.userEventStatusService import _START_OF_ATTENDEE_INFO, _HIDDEN_CHAR, UserEventStatusService
+from service.extendedPropertiesUserEventStatusService import ExtendedPropertiesUserEventStatusService
 import unittest
 from unittest import mock
 import datetime
 import json
+import os
+import tempfile
+from oauthlib.oauth2 import TokenExpiredError
 
 class GoogleCalendarServiceTest(unittest.TestCase):
     googleCalendarService = None
@@ -14,7 +23,12 @@ class GoogleCalendarServiceTest(unittest.TestCase):
         self.calendarId = "calendarId"
         self.mockOAuth2Session = mockOAuth2Session
         userEventStatusService = UserEventStatusService()
-        self.googleCalendarService = GoogleCalendarService(userEventStatusService)
+        self.googleCalendarService = self.createService(userEventStatusService)
+
+    def createService(self, *args, **kwargs):
+        googleCalendarService = GoogleCalendarService(*args, **kwargs)
+        self.addCleanup(googleCalendarService.close)
+        return googleCalendarService
 
     def test_get_calendar_events(self):
         with open("./service/eventResponseTest.json") as eventResponseText:
@@ -36,6 +50,89 @@ class GoogleCalendarServiceTest(unittest.TestCase):
         self.assertIn("orderBy", self.mockOAuth2Session.get.call_args.kwargs['params'])
         self.assertIn("timeMin", self.mockOAuth2Session.get.call_args.kwargs['params'])
 
+    def test_get_upcoming_events_is_cached(self):
+        with open("./service/eventResponseTest.json") as eventResponseText:
+            (self.mockOAuth2Session.get.return_value).ok = True
+            (self.mockOAuth2Session.get.return_value).text = eventResponseText.read()
+        events = self.googleCalendarService.getUpcomingEvents(self.calendarId)
+        cachedEvents = self.googleCalendarService.getUpcomingEvents(self.calendarId)
+        self.assertEqual(events, cachedEvents)
+        self.assertEqual(self.mockOAuth2Session.get.call_count, 1)
+        stats = self.googleCalendarService.getUpcomingEventsCacheStats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+
+    def test_upcoming_events_cache_cleared_after_status_update(self):
+        with open("./service/eventResponseTest.json") as eventResponseText:
+            content = eventResponseText.read()
+            events = json.loads(content)["items"]
+        (self.mockOAuth2Session.get.return_value).ok = True
+        (self.mockOAuth2Session.get.return_value).text = content
+        self.googleCalendarService.getUpcomingEvents(self.calendarId)
+
+        (self.mockOAuth2Session.get.return_value).text = json.dumps(events[0])
+        (self.mockOAuth2Session.patch.return_value).ok = True
+        self.googleCalendarService.setGoingToEvent(self.calendarId, events[0]["id"], "userName")
+
+        (self.mockOAuth2Session.get.return_value).text = content
+        self.googleCalendarService.getUpcomingEvents(self.calendarId)
+        self.assertEqual(self.mockOAuth2Session.get.call_count, 3)
+
+    def mockResponse(self, statusCode, content):
+        response = mock.MagicMock()
+        response.status_code = statusCode
+        response.ok = statusCode < 400
+        response.text = json.dumps(content)
+        return response
+
+    @mock.patch("service.googleCalendarService.OAuth2Session")
+    def test_sync_calendar_full_then_incremental(self, mockOAuth2Session):
+        mockOAuth2Session.return_value = mockOAuth2Session
+        googleCalendarService = self.createService(UserEventStatusService(), syncEnabled=True)
+        with open("./service/eventResponseTest.json") as eventResponseText:
+            events = json.load(eventResponseText)["items"]
+
+        mockOAuth2Session.get.side_effect = [
+            self.mockResponse(200, {"items": events[:2], "nextPageToken": "page2"}),
+            self.mockResponse(200, {"items": events[2:], "nextSyncToken": "syncToken1"}),
+            self.mockResponse(200, {"items": [{"id": events[0]["id"], "status": "cancelled"}], "nextSyncToken": "syncToken2"})
+        ]
+        self.assertEqual(len(googleCalendarService.getCalendarEvents(self.calendarId)), 4)
+        self.assertEqual(mockOAuth2Session.get.call_args.kwargs["params"]["pageToken"], "page2")
+
+        googleCalendarService.syncCalendar(self.calendarId)
+        params = mockOAuth2Session.get.call_args.kwargs["params"]
+        self.assertEqual(params["syncToken"], "syncToken1")
+        self.assertNotIn("pageToken", params)
+        self.assertEqual(len(googleCalendarService.getCalendarEvents(self.calendarId)), 3)
+        self.assertEqual(mockOAuth2Session.get.call_count, 3)
+
+    @mock.patch("service.googleCalendarService.OAuth2Session")
+    def test_sync_calendar_full_resync_when_token_expired(self, mockOAuth2Session):
+        mockOAuth2Session.return_value = mockOAuth2Session
+        googleCalendarService = self.createService(UserEventStatusService(), syncEnabled=True)
+        with open("./service/eventResponseTest.json") as eventResponseText:
+            events = json.load(eventResponseText)["items"]
+
+        mockOAuth2Session.get.side_effect = [
+            self.mockResponse(200, {"items": events, "nextSyncToken": "syncToken1"}),
+            self.mockResponse(410, {"error": {"code": 410}}),
+            self.mockResponse(200, {"items": events[1:], "nextSyncToken": "syncToken2"})
+        ]
+        googleCalendarService.syncCalendar(self.calendarId)
+        googleCalendarService.syncCalendar(self.calendarId)
+        self.assertNotIn("syncToken", mockOAuth2Session.get.call_args.kwargs["params"])
+        self.assertEqual(len(googleCalendarService.getCalendarEvents(self.calendarId)), 3)
+
+    def test_invalidation_listeners_called_after_quick_create(self):
+        invalidatedCalendars = []
+        self.googleCalendarService.addInvalidationListener(invalidatedCalendars.append)
+        (self.mockOAuth2Session.post.return_value).ok = True
+        (self.mockOAuth2Session.post.return_value).text = json.dumps({"summary": "Event", "htmlLink": "htmlLink"})
+
+        self.googleCalendarService.quickCreateEvent(self.calendarId, "Event")
+        self.assertEqual(invalidatedCalendars, [self.calendarId])
+
     def test_set_going_to_event_no_existing_attendees(self):
         with open("./service/eventResponseTest.json") as eventResponseText:
             events = json.load(eventResponseText)["items"]
@@ -126,6 +223,73 @@ class GoogleCalendarServiceTest(unittest.TestCase):
         self.googleCalendarService.setUndecidedAboutEvent(self.calendarId, eventId, userName)
         self.verifyUpdatedUserStatusForEvent(eventId, expectedDescription)
 
+    def test_set_going_to_event_with_known_event_is_conditional(self):
+        with open("./service/eventResponseTest.json") as eventResponseText:
+            events = json.load(eventResponseText)["items"]
+        (self.mockOAuth2Session.patch.return_value).status_code = 200
+
+        self.googleCalendarService.setGoingToEvent(self.calendarId, events[0]["id"], "userName", events[0])
+        self.mockOAuth2Session.get.assert_not_called()
+        self.assertEqual(self.mockOAuth2Session.patch.call_count, 1)
+        self.assertEqual(self.mockOAuth2Session.patch.call_args.kwargs["headers"], {"If-Match": events[0]["etag"]})
+
+    def test_set_going_to_event_retries_after_precondition_failed(self):
+        userName = "userName"
+        with open("./service/eventResponseTest.json") as eventResponseText:
+            events = json.load(eventResponseText)["items"]
+        staleEvent = events[0]
+        currentEvent = dict(events[0], etag="\"newEtag\"")
+        currentEvent["description"] = staleEvent["description"] + _START_OF_ATTENDEE_INFO \
+            + "otherUser%cis not going to this event" % _HIDDEN_CHAR
+        (self.mockOAuth2Session.get.return_value).ok = True
+        (self.mockOAuth2Session.get.return_value).text = json.dumps(currentEvent)
+        preconditionFailed = mock.MagicMock(status_code=412, ok=False)
+        updated = mock.MagicMock(status_code=200, ok=True)
+        self.mockOAuth2Session.patch.side_effect = [preconditionFailed, updated]
+
+        self.googleCalendarService.setGoingToEvent(self.calendarId, staleEvent["id"], userName, staleEvent)
+        self.assertEqual(self.mockOAuth2Session.patch.call_args.kwargs["headers"], {"If-Match": "\"newEtag\""})
+        self.verifyUpdatedUserStatusForEvent(staleEvent["id"], currentEvent["description"] + "\n%s%cis going to this event" % (userName, _HIDDEN_CHAR))
+
+    def test_set_going_to_event_failure_raises(self):
+        with open("./service/eventResponseTest.json") as eventResponseText:
+            events = json.load(eventResponseText)["items"]
+        self.mockOAuth2Session.patch.return_value = mock.MagicMock(status_code=403, ok=False)
+        with self.assertRaises(Exception):
+            self.googleCalendarService.setGoingToEvent(self.calendarId, events[0]["id"], "userName", events[0])
+
+    def test_set_user_statuses_for_event_in_one_update(self):
+        with open("./service/eventResponseTest.json") as eventResponseText:
+            events = json.load(eventResponseText)["items"]
+        event = dict(events[0])
+        event["description"] = event["description"] + _START_OF_ATTENDEE_INFO \
+            + "first%cis going to this event\nsecond%cis going to this event" % (_HIDDEN_CHAR, _HIDDEN_CHAR)
+        (self.mockOAuth2Session.get.return_value).ok = True
+        (self.mockOAuth2Session.get.return_value).text = json.dumps(event)
+
+        self.googleCalendarService.setUserStatusesForEvent(self.calendarId, event["id"], {
+            "third": "is undecided about this event",
+            "first": "is not going to this event"
+        })
+        expectedDescription = events[0]["description"] + _START_OF_ATTENDEE_INFO \
+            + "first%cis not going to this event\nsecond%cis going to this event\nthird%cis undecided about this event" \
+            % (_HIDDEN_CHAR, _HIDDEN_CHAR, _HIDDEN_CHAR)
+        self.verifyUpdatedUserStatusForEvent(event["id"], expectedDescription)
+
+    @mock.patch("service.googleCalendarService.OAuth2Session")
+    def test_set_going_to_event_with_extended_properties_store(self, mockOAuth2Session):
+        mockOAuth2Session.return_value = mockOAuth2Session
+        googleCalendarService = self.createService(ExtendedPropertiesUserEventStatusService())
+        with open("./service/eventResponseTest.json") as eventResponseText:
+            event = json.load(eventResponseText)["items"][0]
+        event["extendedProperties"] = {"private": {"tcb.format": "1"}}
+
+        googleCalendarService.setGoingToEvent(self.calendarId, event["id"], "userName", event)
+        data = mockOAuth2Session.patch.call_args.kwargs["json"]
+        self.assertEqual(list(data.keys()), ["extendedProperties"])
+        self.assertEqual(list(data["extendedProperties"]["private"].values()), ["g:userName"])
+        self.assertEqual(mockOAuth2Session.patch.call_args.kwargs["headers"], {})
+
     def verifyUpdatedUserStatusForEvent(self, eventId, expectedDescription):
         self.mockOAuth2Session.get.assert_called_once_with('https://www.googleapis.com/calendar/v3/calendars/%s/events/%s' % (self.calendarId, eventId))
         self.assertEqual(self.mockOAuth2Session.patch.call_args.args[0], 'https://www.googleapis.com/calendar/v3/calendars/%s/events/%s' % (self.calendarId, eventId))
@@ -159,3 +323,224 @@ class GoogleCalendarServiceTest(unittest.TestCase):
         
         self.assertEqual(result["summary"], quickCreateString)
         self.assertEqual(result["htmlLink"], htmlLink)
+
+    def test_requests_are_recorded_by_endpoint_and_status(self):
+        self.mockOAuth2Session.get.return_value.status_code = 404
+        self.mockOAuth2Session.get.return_value.text = "{}"
+        with mock.patch.object(REGISTRY, "enabled", True):
+            self.googleCalendarService.getCurrentEvent(self.calendarId, "eventId")
+        self.assertIn('google_calendar_request_seconds_count{endpoint="events.get",status="404"} 1',
+                      REGISTRY.render().splitlines())
+
+    def test_requests_are_traced(self):
+        self.mockOAuth2Session.get.return_value.status_code = 200
+        self.mockOAuth2Session.get.return_value.text = "{}"
+        exporter = mock.MagicMock()
+        with mock.patch.object(TRACER, "exporter", exporter):
+            self.googleCalendarService.getCurrentEvent(self.calendarId, "eventId")
+
+        requestSpan, methodSpan = exporter.export.call_args.args[0]
+        self.assertEqual(methodSpan.name, "GoogleCalendarService.getCurrentEvent")
+        self.assertEqual(requestSpan.name, "google events.get")
+        self.assertEqual(requestSpan.parentSpanId, methodSpan.spanId)
+        self.assertEqual(requestSpan.attributes["http.status_code"], "200")
+
+    def test_iter_calendar_events_follows_pages(self):
+        self.mockOAuth2Session.get.side_effect = [
+            self.mockResponse(200, {"items": [{"id": "1"}, {"id": "2"}], "nextPageToken": "page2"}),
+            self.mockResponse(200, {"items": [{"id": "3"}]})
+        ]
+        timeMin = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+        events = self.googleCalendarService.iterCalendarEvents(self.calendarId, pageSize=2, timeMin=timeMin,
+                                                               timeMax="2020-02-01T00:00:00Z")
+        self.assertEqual([event["id"] for event in events], ["1", "2", "3"])
+
+        firstParams, secondParams = [call.kwargs["params"] for call in self.mockOAuth2Session.get.call_args_list]
+        self.assertEqual(firstParams, {"maxResults": 2, "timeMin": "2020-01-01T00:00:00+00:00", "timeMax": "2020-02-01T00:00:00Z"})
+        self.assertEqual(secondParams, dict(firstParams, pageToken="page2"))
+
+    def test_iter_calendar_events_stops_early(self):
+        self.mockOAuth2Session.get.side_effect = [
+            self.mockResponse(200, {"items": [{"id": "1"}, {"id": "2"}], "nextPageToken": "page2"}),
+            self.mockResponse(200, {"items": [{"id": "3"}]})
+        ]
+        events = self.googleCalendarService.iterCalendarEvents(self.calendarId)
+        self.assertEqual(next(events)["id"], "1")
+        events.close()
+        self.assertEqual(self.mockOAuth2Session.get.call_count, 1)
+
+    def test_iter_calendar_events_error(self):
+        self.mockOAuth2Session.get.return_value = self.mockResponse(403, {"error": {"code": 403}})
+        with self.assertRaises(Exception):
+            list(self.googleCalendarService.iterCalendarEvents(self.calendarId))
+
+    @mock.patch("service.googleCalendarService.OAuth2Session")
+    def test_minimal_payloads(self, mockOAuth2Session):
+        mockOAuth2Session.return_value = mockOAuth2Session
+        googleCalendarService = self.createService(UserEventStatusService(), minimalPayloads=True)
+        mockOAuth2Session.headers.update.assert_called_once_with(
+            {"Accept-Encoding": "gzip", "User-Agent": "TelegramCalendarBot (gzip)"})
+        mockOAuth2Session.get.return_value.ok = True
+        mockOAuth2Session.get.return_value.content = json.dumps({"items": [{"id": "1"}]}).encode("utf-8")
+
+        self.assertEqual(googleCalendarService.getUpcomingEvents(self.calendarId), [{"id": "1"}])
+        self.assertTrue(mockOAuth2Session.get.call_args.kwargs["params"]["fields"].startswith("items(id,"))
+
+        mockOAuth2Session.get.return_value.content = json.dumps({"id": "1", "etag": "\"1\""}).encode("utf-8")
+        self.assertEqual(googleCalendarService.getCurrentEvent(self.calendarId, "1")["etag"], "\"1\"")
+        self.assertIn("extendedProperties", mockOAuth2Session.get.call_args.kwargs["params"]["fields"])
+
+    @mock.patch("service.googleCalendarService.OAuth2Session")
+    def test_close_stops_the_background_token_refresh(self, mockOAuth2Session):
+        googleCalendarService = GoogleCalendarService(UserEventStatusService(), proactiveTokenRefresh=True)
+        refreshThread = googleCalendarService._credentialManager._thread
+        self.assertTrue(refreshThread.is_alive())
+        googleCalendarService.close()
+        self.assertFalse(refreshThread.is_alive())
+
+    @mock.patch("service.googleCalendarService.OAuth2Session")
+    def test_expired_token_is_refreshed_once_and_saved(self, mockOAuth2Session):
+        mockOAuth2Session.return_value = mockOAuth2Session
+        googleCalendarService = self.createService(UserEventStatusService(), proactiveTokenRefresh=True)
+        self.assertNotIn("auto_refresh_url", mockOAuth2Session.call_args.kwargs)
+        mockOAuth2Session.get.side_effect = [TokenExpiredError(), self.mockResponse(200, {"id": "eventId"})]
+        mockOAuth2Session.refresh_token.return_value = {"access_token": "new"}
+
+        tokenFile = os.path.join(tempfile.mkdtemp(), "token.json")
+        with mock.patch("service.googleCalendarService.TOKEN_FILE", tokenFile):
+            self.assertEqual(googleCalendarService.getCurrentEvent(self.calendarId, "eventId"), {"id": "eventId"})
+
+        mockOAuth2Session.refresh_token.assert_called_once()
+        self.assertEqual(mockOAuth2Session.get.call_count, 2)
+        with open(tokenFile) as token_file:
+            self.assertEqual(json.load(token_file), {"access_token": "new"})
+        self.assertEqual(os.listdir(os.path.dirname(tokenFile)), ["token.json"])
+
+    def test_shared_token_refreshed_once(self):
+        staleToken = {"access_token": "old"}
+        self.mockOAuth2Session.token = staleToken
+        self.mockOAuth2Session.refresh_token.side_effect = lambda *args, **kwargs: {"access_token": "new"}
+        tokenFile = os.path.join(tempfile.mkdtemp(), "token.json")
+        with mock.patch("service.googleCalendarService.TOKEN_FILE", tokenFile):
+            self.assertEqual(self.googleCalendarService.refreshToken(staleToken), {"access_token": "new"})
+            self.mockOAuth2Session.token = {"access_token": "new"}
+            self.assertEqual(self.googleCalendarService.refreshToken(staleToken), {"access_token": "new"})
+
+        self.mockOAuth2Session.refresh_token.assert_called_once()
+        self.assertEqual(self.googleCalendarService.getToken(), {"access_token": "new"})
+        with open(tokenFile) as token_file:
+            self.assertEqual(json.load(token_file), {"access_token": "new"})
+
+    @mock.patch("service.googleCalendarService.OAuth2Session")
+    def test_stored_upcoming_events_served_when_google_fails(self, mockOAuth2Session):
+        mockOAuth2Session.return_value = mockOAuth2Session
+        eventStore = SqliteEventStore(":memory:")
+        googleCalendarService = self.createService(UserEventStatusService(), eventStore=eventStore)
+        with open("./service/eventResponseTest.json") as eventResponseText:
+            events = json.load(eventResponseText)["items"]
+        for event in events:
+            event["end"] = {"dateTime": "2999-01-01T00:00:00+00:00"}
+        mockOAuth2Session.get.return_value = self.mockResponse(200, {"items": events})
+        self.assertEqual(len(googleCalendarService.getUpcomingEvents(self.calendarId)), 4)
+
+        googleCalendarService.refreshCalendar(self.calendarId)
+        mockOAuth2Session.get.side_effect = Exception("Google is unavailable")
+        self.assertEqual(len(googleCalendarService.getUpcomingEvents(self.calendarId)), 4)
+
+    @mock.patch("service.googleCalendarService.OAuth2Session")
+    def test_deleted_events_not_served_from_the_store(self, mockOAuth2Session):
+        mockOAuth2Session.return_value = mockOAuth2Session
+        googleCalendarService = self.createService(UserEventStatusService(), eventStore=SqliteEventStore(":memory:"))
+        with open("./service/eventResponseTest.json") as eventResponseText:
+            events = json.load(eventResponseText)["items"][:2]
+        for event in events:
+            event["end"] = {"dateTime": "2999-01-01T00:00:00+00:00"}
+        mockOAuth2Session.get.return_value = self.mockResponse(200, {"items": events})
+        googleCalendarService.getUpcomingEvents(self.calendarId)
+
+        # the second event was deleted
+        googleCalendarService.refreshCalendar(self.calendarId)
+        mockOAuth2Session.get.return_value = self.mockResponse(200, {"items": events[:1]})
+        googleCalendarService.getUpcomingEvents(self.calendarId)
+
+        googleCalendarService.refreshCalendar(self.calendarId)
+        mockOAuth2Session.get.side_effect = Exception("Google is unavailable")
+        self.assertEqual([event["id"] for event in googleCalendarService.getUpcomingEvents(self.calendarId)],
+                         [events[0]["id"]])
+
+    @mock.patch("service.googleCalendarService.OAuth2Session")
+    def test_synced_calendar_continues_from_stored_sync_token(self, mockOAuth2Session):
+        mockOAuth2Session.return_value = mockOAuth2Session
+        path = os.path.join(tempfile.mkdtemp(), "events.db")
+        with open("./service/eventResponseTest.json") as eventResponseText:
+            events = json.load(eventResponseText)["items"]
+        mockOAuth2Session.get.side_effect = [
+            self.mockResponse(200, {"items": events, "nextSyncToken": "syncToken1"}),
+            self.mockResponse(200, {"items": [], "nextSyncToken": "syncToken2"})
+        ]
+        eventStore = SqliteEventStore(path)
+        self.createService(UserEventStatusService(), syncEnabled=True, eventStore=eventStore).syncCalendar(self.calendarId)
+        eventStore.close()
+
+        restartedService = self.createService(UserEventStatusService(), syncEnabled=True,
+                                                 eventStore=SqliteEventStore(path))
+        self.assertEqual(len(restartedService.getCalendarEvents(self.calendarId)), 4)
+        self.assertEqual(mockOAuth2Session.get.call_args.kwargs["params"]["syncToken"], "syncToken1")
+
+    def test_local_event_read_from_cached_upcoming_events(self):
+        with open("./service/eventResponseTest.json") as eventResponseText:
+            events = json.load(eventResponseText)["items"]
+        self.mockOAuth2Session.get.return_value = self.mockResponse(200, {"items": events})
+        self.googleCalendarService.getUpcomingEvents(self.calendarId)
+
+        self.assertEqual(self.googleCalendarService.getLocalEvent(self.calendarId, events[1]["id"]), events[1])
+        self.assertIsNone(self.googleCalendarService.getLocalEvent(self.calendarId, "unknownEventId"))
+        self.assertEqual(self.mockOAuth2Session.get.call_count, 1)
+        self.assertEqual(self.googleCalendarService.getUpcomingEventsCacheStats()["hits"], 0)
+
+    def test_current_event_missing_only_when_google_says_so(self):
+        self.mockOAuth2Session.get.return_value = self.mockResponse(404, {"error": {"code": 404}})
+        self.assertIsNone(self.googleCalendarService.getCurrentEvent(self.calendarId, "eventId"))
+        self.mockOAuth2Session.get.return_value = self.mockResponse(410, {"error": {"code": 410}})
+        self.assertIsNone(self.googleCalendarService.getCurrentEvent(self.calendarId, "eventId"))
+        for statusCode in (429, 503):
+            self.mockOAuth2Session.get.return_value = self.mockResponse(statusCode, {"error": {"code": statusCode}})
+            with self.assertRaises(Exception):
+                self.googleCalendarService.getCurrentEvent(self.calendarId, "eventId")
+
+    def test_failing_current_event_opens_the_circuit_breaker(self):
+        self.mockOAuth2Session.get.return_value = self.mockResponse(503, {"error": {"code": 503}})
+        circuitBreaker = CircuitBreaker(failureThreshold=2, resetTimeout=60)
+        resilientCalendarService = ResilientCalendarService(self.googleCalendarService, circuitBreaker, readRetries=1,
+                                                            sleep=lambda seconds: None)
+        with self.assertRaises(CalendarUnavailableError):
+            resilientCalendarService.getCurrentEvent(self.calendarId, "eventId")
+        self.assertEqual(circuitBreaker.getState(), OPEN)
+
+        with self.assertRaises(CalendarUnavailableError):
+            resilientCalendarService.getCurrentEvent(self.calendarId, "eventId")
+        self.assertEqual(self.mockOAuth2Session.get.call_count, 2)
+
+    def test_writes_to_a_deleted_event_leave_the_circuit_breaker_closed(self):
+        self.mockOAuth2Session.get.return_value = self.mockResponse(410, {"error": {"code": 410}})
+        circuitBreaker = CircuitBreaker(failureThreshold=2, resetTimeout=60)
+        resilientCalendarService = ResilientCalendarService(self.googleCalendarService, circuitBreaker,
+                                                            sleep=lambda seconds: None)
+        for i in range(5):
+            with self.assertRaisesRegex(Exception, "no longer exists"):
+                resilientCalendarService.setGoingToEvent(self.calendarId, "eventId", "User A")
+        self.assertEqual(circuitBreaker.getState(), CLOSED)
+        self.mockOAuth2Session.patch.assert_not_called()
+
+    def test_load_upcoming_events_raises_on_error(self):
+        self.mockOAuth2Session.get.return_value = self.mockResponse(503, {"error": {"code": 503}})
+        with self.assertRaises(Exception):
+            self.googleCalendarService.loadUpcomingEvents(self.calendarId)
+        self.assertEqual(self.googleCalendarService.getUpcomingEvents(self.calendarId), [])
+
+    @mock.patch("service.googleCalendarService.HTTPAdapter.send")
+    def test_requests_get_the_default_timeout(self, mockSend):
+        adapter = _TimeoutHTTPAdapter(5)
+        adapter.send("request")
+        adapter.send("request", timeout=1)
+        self.assertEqual([call.kwargs["timeout"] for call in mockSend.call_args_list], [5, 1])
@@ -0,0 +1,50 @@
+import threading
+import time
+from collections import OrderedDict
+
+class ListingSnapshotCache(object):
+    """Remembers the event ids of the last /upcoming listing shown in each chat, in the order they were numbered.
+
+    Snapshots expire after ttlSeconds and only the maxChats most recently active chats are kept.
+    """
+
+    def __init__(self, ttlSeconds, maxChats, clock=time.monotonic):
+        self._ttl = ttlSeconds
+        self._maxChats = maxChats
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def put(self, chatId, calendarId, eventIds):
+        if self._ttl <= 0 or self._maxChats <= 0:
+            return
+        with self._lock:
+            self._entries[chatId] = (self._clock() + self._ttl, calendarId, tuple(eventIds))
+            self._entries.move_to_end(chatId)
+            while len(self._entries) > self._maxChats:
+                self._entries.popitem(last=False)
+
+    def get(self, chatId, calendarId):
+        """The listed event ids, None when the chat has no current listing of calendarId."""
+        with self._lock:
+            entry = self._entries.get(chatId)
+            # a listing of the chat's previous calendar does not number this one's events
+            if entry is not None and entry[0] > self._clock() and entry[1] == calendarId:
+                self._entries.move_to_end(chatId)
+                self.hits += 1
+                return entry[2]
+
+            if entry is not None:
+                del self._entries[chatId]
+            self.misses += 1
+            return None
+
+    def getStats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries)
+            }
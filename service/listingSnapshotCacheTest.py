@@ -0,0 +1,35 @@
+from service.listingSnapshotCache import ListingSnapshotCache
+import unittest
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+class ListingSnapshotCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.listingSnapshotCache = ListingSnapshotCache(60, 2, clock=self.clock)
+
+    def test_snapshot_expires(self):
+        self.listingSnapshotCache.put("chatId", "calendarId", ["1", "2"])
+        self.clock.now = 59
+        self.assertEqual(self.listingSnapshotCache.get("chatId", "calendarId"), ("1", "2"))
+        self.clock.now = 60
+        self.assertIsNone(self.listingSnapshotCache.get("chatId", "calendarId"))
+        self.assertEqual(self.listingSnapshotCache.getStats(), {"hits": 1, "misses": 1, "size": 0})
+
+    def test_idle_chats_are_evicted(self):
+        self.listingSnapshotCache.put("chatA", "calendarId", ["1"])
+        self.listingSnapshotCache.put("chatB", "calendarId", ["2"])
+        self.listingSnapshotCache.get("chatA", "calendarId")
+        self.listingSnapshotCache.put("chatC", "calendarId", ["3"])
+        self.assertIsNone(self.listingSnapshotCache.get("chatB", "calendarId"))
+        self.assertEqual(self.listingSnapshotCache.get("chatA", "calendarId"), ("1",))
+
+    def test_snapshot_of_another_calendar_is_ignored(self):
+        self.listingSnapshotCache.put("chatId", "oldCalendarId", ["1"])
+        self.assertIsNone(self.listingSnapshotCache.get("chatId", "newCalendarId"))
@@ -0,0 +1,32 @@
+import reprlib
+from support.properties import LOG_PAYLOAD_MAX_CHARS
+
+_REPR = reprlib.Repr()
+_REPR.maxlevel = 4
+_REPR.maxdict = 20
+_REPR.maxlist = 20
+_REPR.maxstring = 200
+_REPR.maxother = 200
+
+class LogPayload(object):
+    """Formats a response payload only when a log record is actually emitted, and then at most maxChars of it.
+
+    Use it as a logging argument, LOG.info("Upcoming events: %s", LogPayload(content)), rather than
+    formatting the payload into the message. A response body can be given as its bytes, e.g. res.content,
+    it is then only decoded when the record is emitted.
+    """
+    __slots__ = ("_value", "_maxChars")
+
+    def __init__(self, value, maxChars=LOG_PAYLOAD_MAX_CHARS):
+        self._value = value
+        self._maxChars = maxChars
+
+    def __str__(self):
+        # reprlib stops descending into large payloads, so formatting costs about the same whatever their size
+        if isinstance(self._value, bytes):
+            text = self._value.decode("utf-8", "replace")
+        else:
+            text = self._value if isinstance(self._value, str) else _REPR.repr(self._value)
+        if len(text) > self._maxChars:
+            return "%s... (%d characters)" % (text[:self._maxChars], len(text))
+        return text
@@ -0,0 +1,38 @@
+from service.logPayload import LogPayload
+import unittest
+import logging
+
+class CountingRepr(object):
+    def __init__(self):
+        self.calls = 0
+
+    def __repr__(self):
+        self.calls += 1
+        return "counted"
+
+class LogPayloadTest(unittest.TestCase):
+
+    def test_short_payload_unchanged(self):
+        self.assertEqual(str(LogPayload({"items": []})), "{'items': []}")
+        self.assertEqual(str(LogPayload("text")), "text")
+        self.assertEqual(str(LogPayload("caf\u00e9".encode("utf-8"))), "caf\u00e9")
+
+    def test_long_payload_is_capped(self):
+        text = str(LogPayload("x" * 50, maxChars=10))
+        self.assertEqual(text, "xxxxxxxxxx... (50 characters)")
+
+    def test_large_payload_is_not_fully_formatted(self):
+        items = [{"id": str(i), "description": "d" * 1000} for i in range(10000)]
+        self.assertLess(len(str(LogPayload({"items": items}, maxChars=100000))), 10000)
+
+    def test_formatted_only_when_logged(self):
+        logger = logging.getLogger("logPayloadTest")
+        logger.setLevel(logging.WARNING)
+        payload = CountingRepr()
+        logger.info("Upcoming events: %s", LogPayload([payload]))
+        self.assertEqual(payload.calls, 0)
+
+        with self.assertLogs(logger, logging.INFO) as logs:
+            logger.info("Upcoming events: %s", LogPayload([payload]))
+        self.assertEqual(payload.calls, 1)
+        self.assertEqual(logs.records[0].getMessage(), "Upcoming events: [counted]")
@@ -0,0 +1,59 @@
+import json
+import threading
+from collections import OrderedDict
+
+def estimateSize(value):
+    """Rough number of bytes value takes up, good enough to compare cache entries with each other."""
+    if isinstance(value, str):
+        return len(value)
+    return len(json.dumps(value, default=str))
+
+class MemoryBudget(object):
+    """One least recently used budget shared by several caches.
+
+    Caches charge their entries with charge(owner, key, size) and touch them when they are read.
+    When the total goes over maxBytes the least recently used entries of any cache are dropped by
+    calling owner.evict(key). Owners must not hold their own lock while calling charge, since the
+    eviction may need it.
+    """
+
+    def __init__(self, maxBytes):
+        self._maxBytes = maxBytes
+        self._entries = OrderedDict()
+        self._usedBytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def charge(self, owner, key, sizeBytes):
+        evicted = []
+        with self._lock:
+            previousSize = self._entries.pop((owner, key), 0)
+            self._entries[(owner, key)] = sizeBytes
+            self._usedBytes += sizeBytes - previousSize
+            # the entry just charged is never evicted, even when it is larger than the budget
+            while self._usedBytes > self._maxBytes and len(self._entries) > 1:
+                evictedEntry, evictedSize = self._entries.popitem(last=False)
+                self._usedBytes -= evictedSize
+                evicted.append(evictedEntry)
+            self.evictions += len(evicted)
+
+        for evictedOwner, evictedKey in evicted:
+            evictedOwner.evict(evictedKey)
+
+    def touch(self, owner, key):
+        with self._lock:
+            if (owner, key) in self._entries:
+                self._entries.move_to_end((owner, key))
+
+    def release(self, owner, key):
+        with self._lock:
+            self._usedBytes -= self._entries.pop((owner, key), 0)
+
+    def getStats(self):
+        with self._lock:
+            return {
+                "usedBytes": self._usedBytes,
+                "maxBytes": self._maxBytes,
+                "entries": len(self._entries),
+                "evictions": self.evictions
+            }
@@ -0,0 +1,55 @@
+from service.memoryBudget import MemoryBudget, estimateSize
+from service.upcomingEventsCache import UpcomingEventsCache
+from service.renderedMessageCache import RenderedMessageCache
+import unittest
+from unittest import mock
+
+class MemoryBudgetTest(unittest.TestCase):
+
+    def test_evicts_least_recently_used_entries_of_any_owner(self):
+        budget = MemoryBudget(100)
+        first = mock.MagicMock()
+        second = mock.MagicMock()
+        budget.charge(first, "a", 40)
+        budget.charge(second, "b", 40)
+        budget.touch(first, "a")
+        budget.charge(first, "c", 40)
+
+        second.evict.assert_called_once_with("b")
+        first.evict.assert_not_called()
+        self.assertEqual(budget.getStats(), {"usedBytes": 80, "maxBytes": 100, "entries": 2, "evictions": 1})
+
+    def test_recharging_replaces_size(self):
+        budget = MemoryBudget(100)
+        owner = mock.MagicMock()
+        budget.charge(owner, "a", 60)
+        budget.charge(owner, "a", 30)
+        budget.release(owner, "b")
+        self.assertEqual(budget.getStats()["usedBytes"], 30)
+        budget.release(owner, "a")
+        self.assertEqual(budget.getStats()["usedBytes"], 0)
+
+    def test_entry_larger_than_budget_is_kept(self):
+        budget = MemoryBudget(10)
+        owner = mock.MagicMock()
+        budget.charge(owner, "a", 5)
+        budget.charge(owner, "b", 50)
+        owner.evict.assert_called_once_with("a")
+        self.assertEqual(budget.getStats()["entries"], 1)
+
+    def test_caches_share_budget(self):
+        events = [{"id": "event", "summary": "x" * 100}]
+        budget = MemoryBudget(estimateSize(events) + 10)
+        upcomingEventsCache = UpcomingEventsCache(60, 10, memoryBudget=budget)
+        renderedMessageCache = RenderedMessageCache(10, budget)
+
+        upcomingEventsCache.put("calendarId", events)
+        renderedMessageCache.put(("calendarId", "upcoming"), "message")
+        self.assertEqual(upcomingEventsCache.get("calendarId"), events)
+
+        renderedMessageCache.put(("calendarId", "details"), "m" * 20)
+        self.assertIsNone(upcomingEventsCache.get("calendarId"))
+        self.assertEqual(renderedMessageCache.get(("calendarId", "details")), "m" * 20)
+
+        renderedMessageCache.invalidateCalendar("calendarId")
+        self.assertEqual(budget.getStats()["usedBytes"], 0)
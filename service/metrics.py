@@ -0,0 +1,170 @@
+import bisect
+import threading
+from support.properties import ENABLE_METRICS
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def _format_labels(labelNames, labelValues, extra=()):
+    pairs = list(zip(labelNames, labelValues)) + list(extra)
+    if len(pairs) == 0:
+        return ""
+    escaped = [(name, str(value).replace("\\", "\\\\").replace("\n", "\\n").replace("\"", "\\\""))
+               for name, value in pairs]
+    return "{%s}" % ",".join("%s=\"%s\"" % pair for pair in escaped)
+
+class _NullChild(object):
+    """Stands in for every metric while metrics are disabled, so instrumented code does no work."""
+
+    def inc(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+    def observe(self, value):
+        pass
+
+    def setFunction(self, function):
+        pass
+
+_NULL_CHILD = _NullChild()
+
+class _ValueChild(object):
+    def __init__(self):
+        self._value = 0
+        self._function = None
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def set(self, value):
+        with self._lock:
+            self._value = value
+
+    def setFunction(self, function):
+        """Reads the value from function when the metrics are rendered, e.g. a cache's hit count."""
+        self._function = function
+
+    def get(self):
+        if self._function != None:
+            return self._function()
+        with self._lock:
+            return self._value
+
+class _HistogramChild(object):
+    def __init__(self, buckets):
+        self._buckets = buckets
+        # one count per bucket plus one for values above the largest bucket
+        self._counts = [0] * (len(buckets) + 1)
+        self._sum = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self._buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def get(self):
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        cumulative = []
+        running = 0
+        for bound, count in zip(list(self._buckets) + [float("inf")], counts):
+            running += count
+            cumulative.append((bound, running))
+        return cumulative, total
+
+class _Metric(object):
+    def __init__(self, registry, metricType, name, documentation, labelNames, createChild):
+        self._registry = registry
+        self.type = metricType
+        self.name = name
+        self.documentation = documentation
+        self.labelNames = tuple(labelNames)
+        self._createChild = createChild
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *labelValues):
+        if not self._registry.enabled:
+            return _NULL_CHILD
+        child = self._children.get(labelValues)
+        if child == None:
+            with self._lock:
+                child = self._children.setdefault(labelValues, self._createChild())
+        return child
+
+    # metrics without labels are used directly
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def set(self, value):
+        self.labels().set(value)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def setFunction(self, function):
+        self.labels().setFunction(function)
+
+    def render(self):
+        lines = ["# HELP %s %s" % (self.name, self.documentation), "# TYPE %s %s" % (self.name, self.type)]
+        with self._lock:
+            children = sorted(self._children.items(), key=lambda item: tuple(str(value) for value in item[0]))
+        for labelValues, child in children:
+            if self.type == "histogram":
+                buckets, total = child.get()
+                for bound, count in buckets:
+                    lines.append("%s_bucket%s %d" % (self.name, _format_labels(
+                        self.labelNames, labelValues, [("le", _format_value(bound))]), count))
+                lines.append("%s_sum%s %s" % (self.name, _format_labels(self.labelNames, labelValues), _format_value(total)))
+                lines.append("%s_count%s %d" % (self.name, _format_labels(self.labelNames, labelValues), buckets[-1][1]))
+            else:
+                lines.append("%s%s %s" % (self.name, _format_labels(self.labelNames, labelValues), _format_value(child.get())))
+        return "\n".join(lines)
+
+class MetricsRegistry(object):
+    """Counters, gauges and histograms rendered in the Prometheus text format.
+
+    While disabled, labels() hands out a shared object whose methods do nothing, so instrumented
+    code only pays for that call.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, metricType, name, documentation, labelNames, createChild):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = _Metric(self, metricType, name, documentation, labelNames, createChild)
+            return self._metrics[name]
+
+    def counter(self, name, documentation, labelNames=()):
+        return self._get_or_create("counter", name, documentation, labelNames, _ValueChild)
+
+    def gauge(self, name, documentation, labelNames=()):
+        return self._get_or_create("gauge", name, documentation, labelNames, _ValueChild)
+
+    def histogram(self, name, documentation, labelNames=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create("histogram", name, documentation, labelNames, lambda: _HistogramChild(buckets))
+
+    def render(self):
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+# shared by every module, enabled with ENABLE_METRICS
+REGISTRY = MetricsRegistry(ENABLE_METRICS)
@@ -0,0 +1,53 @@
+from service.metrics import MetricsRegistry
+import unittest
+
+class MetricsRegistryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = MetricsRegistry(enabled=True)
+
+    def test_counter_with_labels(self):
+        counter = self.registry.counter("commands_total", "Commands handled", ("command",))
+        counter.labels("upcoming").inc()
+        counter.labels("upcoming").inc()
+        counter.labels("going").inc(3)
+
+        lines = self.registry.render().splitlines()
+        self.assertEqual(lines[0], "# HELP commands_total Commands handled")
+        self.assertEqual(lines[1], "# TYPE commands_total counter")
+        self.assertIn('commands_total{command="going"} 3', lines)
+        self.assertIn('commands_total{command="upcoming"} 2', lines)
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = self.registry.histogram("request_seconds", "Request time", ("endpoint",), buckets=(0.1, 1))
+        for value in (0.05, 0.5, 0.5, 3):
+            histogram.labels("events.list").observe(value)
+
+        lines = self.registry.render().splitlines()
+        self.assertIn('request_seconds_bucket{endpoint="events.list",le="0.1"} 1', lines)
+        self.assertIn('request_seconds_bucket{endpoint="events.list",le="1"} 3', lines)
+        self.assertIn('request_seconds_bucket{endpoint="events.list",le="+Inf"} 4', lines)
+        self.assertIn('request_seconds_sum{endpoint="events.list"} 4.05', lines)
+        self.assertIn('request_seconds_count{endpoint="events.list"} 4', lines)
+
+    def test_gauge_reads_function_when_rendered(self):
+        depth = [2]
+        self.registry.gauge("queue_depth", "Queued messages").setFunction(lambda: depth[0])
+        depth[0] = 5
+        self.assertIn("queue_depth 5", self.registry.render().splitlines())
+
+    def test_same_name_returns_same_metric(self):
+        self.assertIs(self.registry.counter("refreshes_total", "Refreshes"),
+                      self.registry.counter("refreshes_total", "Refreshes"))
+
+    def test_label_values_are_escaped(self):
+        self.registry.counter("commands_total", "Commands handled", ("command",)).labels('a"b').inc()
+        self.assertIn('commands_total{command="a\\"b"} 1', self.registry.render().splitlines())
+
+    def test_disabled_registry_records_nothing(self):
+        registry = MetricsRegistry(enabled=False)
+        counter = registry.counter("commands_total", "Commands handled", ("command",))
+        counter.labels("upcoming").inc()
+        registry.histogram("request_seconds", "Request time").observe(1)
+        self.assertNotIn("commands_total{", registry.render())
+        self.assertNotIn("request_seconds_count", registry.render())
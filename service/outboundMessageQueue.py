@@ -0,0 +1,229 @@
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import telegram.error
+from service.metrics import REGISTRY
+
+LOG = logging.getLogger(__name__)
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+_PRIORITIES = (PRIORITY_INTERACTIVE, PRIORITY_BULK)
+# number of recent send latencies kept for getStats
+_LATENCY_SAMPLES = 1000
+_QUEUED_SECONDS = REGISTRY.histogram("outbound_message_seconds", "Time from queueing a message until Telegram accepted it")
+_SENDS = REGISTRY.counter("outbound_message_sends_total", "Messages sent from the outbound queue", ("outcome",))
+
+class TokenBucket(object):
+    """Allows ratePerSecond sends on average with bursts of up to capacity sends."""
+
+    def __init__(self, ratePerSecond, capacity, now):
+        self._rate = ratePerSecond
+        self._capacity = capacity
+        self._tokens = capacity
+        self._updatedAt = now
+
+    def _refill(self, now):
+        self._tokens = min(self._capacity, self._tokens + (now - self._updatedAt) * self._rate)
+        self._updatedAt = now
+
+    def getDelay(self, now):
+        """Seconds until a token is available, 0 when one is available now."""
+        self._refill(now)
+        return 0 if self._tokens >= 1 else (1 - self._tokens) / self._rate
+
+    def take(self, now):
+        self._refill(now)
+        self._tokens -= 1
+
+    def isFull(self, now):
+        self._refill(now)
+        return self._tokens >= self._capacity
+
+class _OutboundMessage(object):
+    __slots__ = ("bot", "chatId", "args", "kwargs", "priority", "future", "enqueuedAt", "attempts")
+
+    def __init__(self, bot, chatId, args, kwargs, priority, enqueuedAt):
+        self.bot = bot
+        self.chatId = chatId
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+        self.future = Future()
+        self.enqueuedAt = enqueuedAt
+        self.attempts = 0
+
+class _Chat(object):
+    __slots__ = ("buckets", "messages", "sending")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.messages = {priority: deque() for priority in _PRIORITIES}
+        # one message per chat is sent at a time so a chat's messages keep their order
+        self.sending = False
+
+    def isEmpty(self):
+        return all(len(messages) == 0 for messages in self.messages.values())
+
+class OutboundMessageQueue(object):
+    """Sends bot messages from a background thread within Telegram's rate limits.
+
+    A global token bucket keeps the bot under messagesPerSecond, each chat has its own bucket and
+    group chats (negative ids) are also held to groupMessagesPerMinute. Interactive replies go out
+    before bulk messages and a send Telegram answers with 429 is retried after its retry_after.
+    """
+
+    def __init__(self, messagesPerSecond=30, chatMessagesPerSecond=1, chatMessageBurst=3, groupMessagesPerMinute=20,
+                 maxRetries=3, maxConcurrentSends=4, clock=time.monotonic):
+        self._chatMessagesPerSecond = chatMessagesPerSecond
+        self._chatMessageBurst = chatMessageBurst
+        self._groupMessagesPerMinute = groupMessagesPerMinute
+        self._maxRetries = maxRetries
+        self._clock = clock
+        self._globalBucket = TokenBucket(messagesPerSecond, messagesPerSecond, clock())
+        self._chats = OrderedDict()
+        self._holdUntil = 0
+        self._changed = threading.Condition()
+        self._running = True
+        self._sent = 0
+        self._failed = 0
+        self._retried = 0
+        self._latencies = deque(maxlen=_LATENCY_SAMPLES)
+        self._sendExecutor = ThreadPoolExecutor(max_workers=maxConcurrentSends, thread_name_prefix="telegram-send")
+        self._thread = threading.Thread(target=self._run, name="outbound-messages", daemon=True)
+        self._thread.start()
+
+    def _create_chat(self, chatId, now):
+        buckets = [TokenBucket(self._chatMessagesPerSecond, self._chatMessageBurst, now)]
+        if isinstance(chatId, int) and chatId < 0:
+            buckets.append(TokenBucket(self._groupMessagesPerMinute / 60.0, self._groupMessagesPerMinute, now))
+        return _Chat(buckets)
+
+    def enqueue(self, bot, chatId, *args, priority=PRIORITY_INTERACTIVE, **kwargs):
+        """Queues bot.send_message(chatId, *args, **kwargs) and returns a Future for the sent message."""
+        now = self._clock()
+        message = _OutboundMessage(bot, chatId, args, kwargs, priority, now)
+        with self._changed:
+            chat = self._chats.get(chatId)
+            if chat == None:
+                chat = self._create_chat(chatId, now)
+                self._chats[chatId] = chat
+            chat.messages[priority].append(message)
+            self._changed.notify()
+        return message.future
+
+    def _next_message(self, now):
+        """Returns (message, its chat, None) for the next message that may be sent, or (None, None, seconds to wait)."""
+        wait = None
+        for priority in _PRIORITIES:
+            for chatId, chat in self._chats.items():
+                if chat.sending or len(chat.messages[priority]) == 0:
+                    continue
+                delay = max(bucket.getDelay(now) for bucket in chat.buckets)
+                if delay == 0:
+                    # the next message comes from the other chats first
+                    self._chats.move_to_end(chatId)
+                    return chat.messages[priority].popleft(), chat, None
+                wait = delay if wait == None else min(wait, delay)
+        return None, None, wait
+
+    def _remove_idle_chats(self, now):
+        # a chat's buckets are only dropped once they are full again, so dropping them does not reset a limit
+        for chatId in [chatId for chatId, chat in self._chats.items()
+                       if not chat.sending and chat.isEmpty() and all(bucket.isFull(now) for bucket in chat.buckets)]:
+            del self._chats[chatId]
+
+    def _run(self):
+        with self._changed:
+            while self._running or self._get_depth() > 0 or any(chat.sending for chat in self._chats.values()):
+                now = self._clock()
+                if now < self._holdUntil:
+                    self._changed.wait(self._holdUntil - now)
+                    continue
+                globalDelay = self._globalBucket.getDelay(now)
+                if globalDelay > 0:
+                    self._changed.wait(globalDelay)
+                    continue
+
+                message, chat, wait = self._next_message(now)
+                if message == None:
+                    self._remove_idle_chats(now)
+                    self._changed.wait(wait)
+                    continue
+
+                self._globalBucket.take(now)
+                for bucket in chat.buckets:
+                    bucket.take(now)
+                chat.sending = True
+                self._sendExecutor.submit(self._send, message, chat)
+
+    def _send(self, message, chat):
+        try:
+            message.attempts += 1
+            result = message.bot.send_message(message.chatId, *message.args, **message.kwargs)
+        except telegram.error.RetryAfter as e:
+            with self._changed:
+                chat.sending = False
+                if message.attempts <= self._maxRetries:
+                    LOG.info("Telegram asked to retry sending to %s after %s seconds" % (message.chatId, e.retry_after))
+                    self._retried += 1
+                    _SENDS.labels("retried").inc()
+                    self._holdUntil = max(self._holdUntil, self._clock() + e.retry_after)
+                    chat.messages[message.priority].appendleft(message)
+                    self._changed.notify()
+                    return
+                self._failed += 1
+                _SENDS.labels("failed").inc()
+                self._changed.notify()
+            LOG.error("Could not send message to %s: %s" % (message.chatId, e))
+            message.future.set_exception(e)
+            return
+        except Exception as e:
+            with self._changed:
+                chat.sending = False
+                self._failed += 1
+                _SENDS.labels("failed").inc()
+                self._changed.notify()
+            LOG.error("Could not send message to %s: %s" % (message.chatId, e))
+            message.future.set_exception(e)
+            return
+
+        with self._changed:
+            chat.sending = False
+            self._sent += 1
+            latency = self._clock() - message.enqueuedAt
+            self._latencies.append(latency)
+            _SENDS.labels("sent").inc()
+            _QUEUED_SECONDS.observe(latency)
+            self._changed.notify()
+        message.future.set_result(result)
+
+    def _get_depth(self, priority=None):
+        priorities = _PRIORITIES if priority == None else (priority,)
+        return sum(len(chat.messages[p]) for chat in self._chats.values() for p in priorities)
+
+    def getStats(self):
+        """Queue depth, counters and the latency from enqueue until sent over the recent sends."""
+        with self._changed:
+            latencies = sorted(self._latencies)
+            return {
+                "depth": self._get_depth(),
+                "interactiveDepth": self._get_depth(PRIORITY_INTERACTIVE),
+                "bulkDepth": self._get_depth(PRIORITY_BULK),
+                "sent": self._sent,
+                "failed": self._failed,
+                "retried": self._retried,
+                "latencyP50": latencies[len(latencies) // 2] if len(latencies) > 0 else None,
+                "latencyP95": latencies[int(len(latencies) * 0.95)] if len(latencies) > 0 else None,
+                "latencyMax": latencies[-1] if len(latencies) > 0 else None
+            }
+
+    def stop(self):
+        """Sends everything still queued, then stops."""
+        with self._changed:
+            self._running = False
+            self._changed.notify()
+        self._thread.join()
+        self._sendExecutor.shutdown(wait=True)
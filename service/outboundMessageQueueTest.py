@@ -0,0 +1,115 @@
+from service.outboundMessageQueue import OutboundMessageQueue, TokenBucket, PRIORITY_BULK
+import unittest
+from unittest import mock
+import threading
+import time
+import telegram
+
+class TokenBucketTest(unittest.TestCase):
+
+    def test_allows_bursts_up_to_capacity(self):
+        bucket = TokenBucket(1, 2, 0)
+        for i in range(2):
+            self.assertEqual(bucket.getDelay(0), 0)
+            bucket.take(0)
+        self.assertAlmostEqual(bucket.getDelay(0), 1)
+        self.assertAlmostEqual(bucket.getDelay(0.5), 0.5)
+        self.assertEqual(bucket.getDelay(1), 0)
+        self.assertFalse(bucket.isFull(1))
+        self.assertTrue(bucket.isFull(5))
+
+class OutboundMessageQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.bot = mock.MagicMock()
+
+    def test_sends_messages_in_order(self):
+        queue = OutboundMessageQueue()
+        futures = [queue.enqueue(self.bot, "chatId", "first", telegram.ParseMode.MARKDOWN),
+                   queue.enqueue(self.bot, "chatId", "second")]
+        for future in futures:
+            self.assertEqual(future.result(timeout=5), self.bot.send_message.return_value)
+        queue.stop()
+
+        self.assertEqual(self.bot.send_message.call_args_list,
+                         [mock.call("chatId", "first", telegram.ParseMode.MARKDOWN), mock.call("chatId", "second")])
+        self.assertEqual(queue.getStats()["sent"], 2)
+        self.assertEqual(queue.getStats()["depth"], 0)
+        self.assertIsNotNone(queue.getStats()["latencyP95"])
+
+    def test_keyword_arguments_are_sent(self):
+        queue = OutboundMessageQueue()
+        queue.enqueue(self.bot, "chatId", "text", reply_markup="keyboard").result(timeout=5)
+        queue.stop()
+        self.bot.send_message.assert_called_once_with("chatId", "text", reply_markup="keyboard")
+
+    def test_limits_messages_per_chat(self):
+        queue = OutboundMessageQueue(chatMessagesPerSecond=20, chatMessageBurst=1)
+        started = time.monotonic()
+        futures = [queue.enqueue(self.bot, "chatId", "message %d" % i) for i in range(4)]
+        otherChat = queue.enqueue(self.bot, "otherChatId", "message")
+        otherChat.result(timeout=5)
+        self.assertLess(time.monotonic() - started, 0.1)
+
+        for future in futures:
+            future.result(timeout=5)
+        # the first message uses the burst, the other three wait for a token each
+        self.assertGreaterEqual(time.monotonic() - started, 0.14)
+        queue.stop()
+
+    def test_limits_group_chats_per_minute(self):
+        queue = OutboundMessageQueue(chatMessagesPerSecond=100, chatMessageBurst=100, groupMessagesPerMinute=2)
+        futures = [queue.enqueue(self.bot, -100, "message %d" % i) for i in range(3)]
+        futures[1].result(timeout=5)
+        time.sleep(0.05)
+        self.assertFalse(futures[2].done())
+        self.assertEqual(queue.getStats()["depth"], 1)
+
+    def test_interactive_messages_go_before_bulk_messages(self):
+        sending = threading.Event()
+        release = threading.Event()
+        sentMessages = []
+        def sendMessage(chatId, text):
+            sentMessages.append(text)
+            if text == "first":
+                sending.set()
+                release.wait(5)
+        self.bot.send_message.side_effect = sendMessage
+
+        queue = OutboundMessageQueue()
+        queue.enqueue(self.bot, "chatId", "first")
+        sending.wait(5)
+        queue.enqueue(self.bot, "chatId", "bulk", priority=PRIORITY_BULK)
+        queue.enqueue(self.bot, "chatId", "interactive")
+        release.set()
+        queue.stop()
+
+        self.assertEqual(sentMessages, ["first", "interactive", "bulk"])
+
+    def test_retries_after_flood_control(self):
+        self.bot.send_message.side_effect = [telegram.error.RetryAfter(0.05), "sent"]
+        queue = OutboundMessageQueue()
+        started = time.monotonic()
+
+        self.assertEqual(queue.enqueue(self.bot, "chatId", "message").result(timeout=5), "sent")
+        self.assertGreaterEqual(time.monotonic() - started, 0.05)
+        self.assertEqual(queue.getStats()["retried"], 1)
+        queue.stop()
+
+    def test_gives_up_after_max_retries(self):
+        self.bot.send_message.side_effect = telegram.error.RetryAfter(0)
+        queue = OutboundMessageQueue(maxRetries=2)
+
+        future = queue.enqueue(self.bot, "chatId", "message")
+        self.assertIsInstance(future.exception(timeout=5), telegram.error.RetryAfter)
+        self.assertEqual(self.bot.send_message.call_count, 3)
+        self.assertEqual(queue.getStats()["failed"], 1)
+        queue.stop()
+
+    def test_failed_send_fails_future(self):
+        self.bot.send_message.side_effect = telegram.error.NetworkError("failed")
+        queue = OutboundMessageQueue()
+
+        future = queue.enqueue(self.bot, "chatId", "message")
+        self.assertIsInstance(future.exception(timeout=5), telegram.error.NetworkError)
+        queue.stop()
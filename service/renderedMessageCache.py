@@ -0,0 +1,64 @@
+import threading
+from collections import OrderedDict
+from service.memoryBudget import estimateSize
+
+class RenderedMessageCache(object):
+    """LRU cache of formatted bot messages keyed by (calendarId, command, event versions)."""
+
+    def __init__(self, maxSize, memoryBudget=None):
+        self._maxSize = maxSize
+        self._memoryBudget = memoryBudget
+        self._messages = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def getEventVersion(event):
+        return (event.get("id"), event.get("etag") or event.get("updated"))
+
+    def get(self, key):
+        with self._lock:
+            message = self._messages.get(key)
+            if message == None:
+                self.misses += 1
+                return None
+            self._messages.move_to_end(key)
+            self.hits += 1
+            if self._memoryBudget != None:
+                self._memoryBudget.touch(self, key)
+            return message
+
+    def put(self, key, message):
+        if self._maxSize <= 0:
+            return
+        with self._lock:
+            self._messages[key] = message
+            self._messages.move_to_end(key)
+            while len(self._messages) > self._maxSize:
+                self._release(self._messages.popitem(last=False)[0])
+        if self._memoryBudget != None:
+            self._memoryBudget.charge(self, key, estimateSize(message))
+
+    def _release(self, key):
+        if self._memoryBudget != None:
+            self._memoryBudget.release(self, key)
+
+    def evict(self, key):
+        """Called by the memory budget, which has already released the entry."""
+        with self._lock:
+            self._messages.pop(key, None)
+
+    def invalidateCalendar(self, calendarId):
+        with self._lock:
+            for key in [key for key in self._messages if key[0] == calendarId]:
+                del self._messages[key]
+                self._release(key)
+
+    def getStats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._messages)
+            }
@@ -0,0 +1,27 @@
+from service.renderedMessageCache import RenderedMessageCache
+import unittest
+
+class RenderedMessageCacheTest(unittest.TestCase):
+
+    def test_least_recently_used_message_is_evicted(self):
+        cache = RenderedMessageCache(2)
+        cache.put(("calendarId", "upcoming", ()), "first")
+        cache.put(("calendarId", "details", 0, ("eventId", "etag")), "second")
+        cache.get(("calendarId", "upcoming", ()))
+        cache.put(("calendarId", "details", 1, ("eventId", "etag")), "third")
+
+        self.assertIsNone(cache.get(("calendarId", "details", 0, ("eventId", "etag"))))
+        self.assertEqual(cache.get(("calendarId", "upcoming", ())), "first")
+        self.assertEqual(cache.getStats(), {"hits": 2, "misses": 1, "size": 2})
+
+    def test_invalidate_calendar(self):
+        cache = RenderedMessageCache(10)
+        cache.put(("calendarId", "upcoming", ()), "first")
+        cache.put(("otherCalendarId", "upcoming", ()), "second")
+        cache.invalidateCalendar("calendarId")
+        self.assertIsNone(cache.get(("calendarId", "upcoming", ())))
+        self.assertEqual(cache.get(("otherCalendarId", "upcoming", ())), "second")
+
+    def test_event_version(self):
+        self.assertEqual(RenderedMessageCache.getEventVersion({"id": "eventId", "etag": "etag", "updated": "updated"}), ("eventId", "etag"))
+        self.assertEqual(RenderedMessageCache.getEventVersion({"id": "eventId", "updated": "updated"}), ("eventId", "updated"))
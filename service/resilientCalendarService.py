@@ -0,0 +1,261 @@
+import logging
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from service.metrics import REGISTRY
+from support.properties import CALENDAR_READ_RETRIES, CALENDAR_RETRY_BASE_DELAY, CIRCUIT_BREAKER_FAILURES, \
+    CIRCUIT_BREAKER_RESET_TIMEOUT
+
+LOG = logging.getLogger(__name__)
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+# last good results kept per read, e.g. one per event for getCurrentEvent
+_MAX_LAST_GOOD_RESULTS = 256
+_CIRCUIT_OPEN = REGISTRY.gauge("google_circuit_breaker_open", "1 while calls to Google are short-circuited")
+_STALE_READS = REGISTRY.counter("calendar_stale_reads_total", "Reads answered with the last good result", ("method",))
+
+class CalendarUnavailableError(Exception):
+    """Google Calendar could not be reached and there is no earlier result to answer with."""
+    pass
+
+class StaleList(list):
+    """A last good list result, served while Google Calendar can not be reached."""
+    stale = True
+
+class StaleDict(dict):
+    """A last good dict result, served while Google Calendar can not be reached."""
+    stale = True
+
+def isStale(result):
+    return getattr(result, "stale", False)
+
+def isTransientError(error):
+    """Whether error means Google could not be reached or was overloaded, rather than that it rejected the call.
+
+    Only these errors are retried and counted by the circuit breaker, e.g. a write to a deleted event
+    fails the same way however often it is tried and says nothing about Google's health.
+    """
+    if isinstance(error, (requests.exceptions.RequestException, CalendarUnavailableError)):
+        return True
+    statusCode = getattr(error, "statusCode", None)
+    return statusCode != None and (statusCode >= 500 or statusCode == 429)
+
+def _mark_stale(result):
+    if isinstance(result, list):
+        return StaleList(result)
+    if isinstance(result, dict):
+        return StaleDict(result)
+    return result
+
+class CircuitBreaker(object):
+    """Stops calling Google after failureThreshold consecutive failures.
+
+    Once resetTimeout seconds have passed one trial call is let through, its outcome closes the
+    breaker again or keeps it open for another resetTimeout.
+    """
+
+    def __init__(self, failureThreshold=CIRCUIT_BREAKER_FAILURES, resetTimeout=CIRCUIT_BREAKER_RESET_TIMEOUT,
+                 clock=time.monotonic):
+        self._failureThreshold = failureThreshold
+        self._resetTimeout = resetTimeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._openedAt = None
+
+    def getState(self):
+        with self._lock:
+            return self._state
+
+    def allowRequest(self):
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN and self._clock() - self._openedAt >= self._resetTimeout:
+                # this caller makes the trial call, everyone else waits for its outcome
+                self._state = HALF_OPEN
+                return True
+            return False
+
+    def recordSuccess(self):
+        with self._lock:
+            if self._state != CLOSED:
+                LOG.info("Google Calendar is reachable again, closing the circuit breaker")
+            self._state = CLOSED
+            self._failures = 0
+            _CIRCUIT_OPEN.set(0)
+
+    def releaseTrial(self):
+        """Lets another caller make the trial call, after a call that says nothing about Google's health."""
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._state = OPEN
+
+    def recordFailure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or (self._state == CLOSED and self._failures >= self._failureThreshold):
+                LOG.error("Opening the circuit breaker after %d failed calls to Google Calendar" % self._failures)
+                self._state = OPEN
+                self._openedAt = self._clock()
+                _CIRCUIT_OPEN.set(1)
+
+class ResilientCalendarService(object):
+    """Wraps a GoogleCalendarService so that Google outages neither block handlers nor give wrong answers.
+
+    Reads are retried with jittered exponential backoff and remembered. While the circuit breaker is
+    open, or once the retries are used up, a read is answered with its last good result marked as
+    stale (see isStale) and refreshed from a background thread. Writes are not retried since they
+    are not idempotent, and fail fast while the breaker is open. Only transient errors (see
+    isTransientError) are retried and counted, others are raised as they are. Everything else is
+    passed through.
+    """
+
+    def __init__(self, calendarService, circuitBreaker=None, readRetries=CALENDAR_READ_RETRIES,
+                 retryBaseDelay=CALENDAR_RETRY_BASE_DELAY, sleep=time.sleep):
+        self._calendarService = calendarService
+        self._circuitBreaker = circuitBreaker if circuitBreaker != None else CircuitBreaker()
+        self._readRetries = readRetries
+        self._retryBaseDelay = retryBaseDelay
+        self._sleep = sleep
+        self._lastGood = OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._refreshExecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="calendar-refresh")
+
+    def __getattr__(self, name):
+        return getattr(self._calendarService, name)
+
+    def getCircuitBreaker(self):
+        return self._circuitBreaker
+
+    def getUpcomingEvents(self, calendarId):
+        # the wrapped service would hide failures behind its local copy of the calendar
+        load = getattr(self._calendarService, "loadUpcomingEvents", self._calendarService.getUpcomingEvents)
+        fallback = getattr(self._calendarService, "getLocalUpcomingEvents", None)
+        return self._read("getUpcomingEvents", load, (calendarId,), fallback)
+
+    def getCalendarEvents(self, calendarId):
+        return self._read("getCalendarEvents", self._calendarService.getCalendarEvents, (calendarId,))
+
+    def getCurrentEvent(self, calendarId, eventId):
+        return self._read("getCurrentEvent", self._calendarService.getCurrentEvent, (calendarId, eventId))
+
+    def setUserStatusesForEvent(self, calendarId, eventId, userStatuses, event=None):
+        return self._write("setUserStatusesForEvent", self._calendarService.setUserStatusesForEvent,
+                           calendarId, eventId, userStatuses, event)
+
+    def setGoingToEvent(self, calendarId, eventId, usersName, event=None):
+        return self._write("setGoingToEvent", self._calendarService.setGoingToEvent,
+                           calendarId, eventId, usersName, event)
+
+    def setNotGoingToEvent(self, calendarId, eventId, usersName, event=None):
+        return self._write("setNotGoingToEvent", self._calendarService.setNotGoingToEvent,
+                           calendarId, eventId, usersName, event)
+
+    def setUndecidedAboutEvent(self, calendarId, eventId, usersName, event=None):
+        return self._write("setUndecidedAboutEvent", self._calendarService.setUndecidedAboutEvent,
+                           calendarId, eventId, usersName, event)
+
+    def quickCreateEvent(self, calendarId, quickCreateString):
+        return self._write("quickCreateEvent", self._calendarService.quickCreateEvent, calendarId, quickCreateString)
+
+    def _write(self, method, function, *args):
+        if not self._circuitBreaker.allowRequest():
+            raise CalendarUnavailableError("Google Calendar is unavailable, not calling %s" % method)
+        try:
+            result = function(*args)
+        except Exception as e:
+            self._record_error(e)
+            raise
+        self._circuitBreaker.recordSuccess()
+        return result
+
+    def _record_error(self, error):
+        if isTransientError(error):
+            self._circuitBreaker.recordFailure()
+        else:
+            self._circuitBreaker.releaseTrial()
+
+    def _read(self, method, function, args, fallback=None):
+        key = (method,) + args
+        lastGood = self._get_last_good(key)
+        if lastGood != None and self._circuitBreaker.getState() != CLOSED:
+            # the background refresh makes the trial call, so no handler waits on a struggling Google
+            return self._serve_stale(method, key, function, args, lastGood)
+
+        try:
+            result = self._call_with_retries(function, args)
+        except Exception as e:
+            if not isTransientError(e):
+                raise
+            LOG.info("Could not %s%s: %s" % (method, args, e))
+            if lastGood != None:
+                return self._serve_stale(method, key, function, args, lastGood)
+            localResult = fallback(*args) if fallback != None else None
+            if localResult != None:
+                _STALE_READS.labels(method).inc()
+                return _mark_stale(localResult)
+            raise CalendarUnavailableError("Google Calendar is unavailable: %s" % e) from e
+        self._remember(key, result)
+        return result
+
+    def _call_with_retries(self, function, args):
+        attempt = 0
+        while True:
+            if not self._circuitBreaker.allowRequest():
+                raise CalendarUnavailableError("the circuit breaker is open")
+            try:
+                result = function(*args)
+            except Exception as e:
+                self._record_error(e)
+                if not isTransientError(e) or attempt >= self._readRetries:
+                    raise
+            else:
+                self._circuitBreaker.recordSuccess()
+                return result
+            # full jitter keeps the retries of many handlers from arriving together
+            self._sleep(random.uniform(0, self._retryBaseDelay * 2 ** attempt))
+            attempt += 1
+
+    def _get_last_good(self, key):
+        with self._lock:
+            return self._lastGood.get(key)
+
+    def _remember(self, key, result):
+        with self._lock:
+            self._lastGood[key] = result
+            self._lastGood.move_to_end(key)
+            if len(self._lastGood) > _MAX_LAST_GOOD_RESULTS:
+                self._lastGood.popitem(last=False)
+
+    def _serve_stale(self, method, key, function, args, lastGood):
+        _STALE_READS.labels(method).inc()
+        with self._lock:
+            refresh = key not in self._refreshing
+            self._refreshing.add(key)
+        if refresh:
+            self._refreshExecutor.submit(self._refresh, key, function, args)
+        return _mark_stale(lastGood)
+
+    def _refresh(self, key, function, args):
+        try:
+            # skipped until the breaker lets a trial call through, the next stale read tries again
+            if self._circuitBreaker.allowRequest():
+                try:
+                    result = function(*args)
+                except Exception as e:
+                    self._record_error(e)
+                    LOG.info("Background refresh of %s failed: %s" % (key, e))
+                else:
+                    self._circuitBreaker.recordSuccess()
+                    self._remember(key, result)
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
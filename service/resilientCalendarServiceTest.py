@@ -0,0 +1,150 @@
+from service.resilientCalendarService import ResilientCalendarService, CircuitBreaker, CalendarUnavailableError, \
+    isStale, CLOSED, OPEN, HALF_OPEN
+from service.googleCalendarService import GoogleCalendarError
+import unittest
+from unittest import mock
+import requests
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+class CircuitBreakerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.circuitBreaker = CircuitBreaker(failureThreshold=2, resetTimeout=30, clock=self.clock)
+
+    def test_opens_after_consecutive_failures(self):
+        self.circuitBreaker.recordFailure()
+        self.circuitBreaker.recordSuccess()
+        self.circuitBreaker.recordFailure()
+        self.assertEqual(self.circuitBreaker.getState(), CLOSED)
+
+        self.circuitBreaker.recordFailure()
+        self.assertEqual(self.circuitBreaker.getState(), OPEN)
+        self.assertFalse(self.circuitBreaker.allowRequest())
+
+    def test_one_trial_call_after_reset_timeout(self):
+        self.circuitBreaker.recordFailure()
+        self.circuitBreaker.recordFailure()
+        self.clock.now = 30
+        self.assertTrue(self.circuitBreaker.allowRequest())
+        self.assertEqual(self.circuitBreaker.getState(), HALF_OPEN)
+        self.assertFalse(self.circuitBreaker.allowRequest())
+
+        self.circuitBreaker.recordFailure()
+        self.assertEqual(self.circuitBreaker.getState(), OPEN)
+        self.clock.now = 59
+        self.assertFalse(self.circuitBreaker.allowRequest())
+
+        self.clock.now = 60
+        self.assertTrue(self.circuitBreaker.allowRequest())
+        self.circuitBreaker.recordSuccess()
+        self.assertEqual(self.circuitBreaker.getState(), CLOSED)
+
+class ResilientCalendarServiceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.calendarService = mock.MagicMock()
+        self.calendarService.getLocalUpcomingEvents.return_value = None
+        self.clock = FakeClock()
+        self.circuitBreaker = CircuitBreaker(failureThreshold=3, resetTimeout=30, clock=self.clock)
+        self.sleep = mock.MagicMock()
+        self.resilientCalendarService = ResilientCalendarService(self.calendarService, self.circuitBreaker,
+                                                                 readRetries=2, retryBaseDelay=0.5, sleep=self.sleep)
+
+    def waitForRefresh(self):
+        self.resilientCalendarService._refreshExecutor.submit(lambda: None).result()
+
+    def test_reads_are_retried_with_backoff(self):
+        self.calendarService.loadUpcomingEvents.side_effect = [requests.exceptions.Timeout("timed out"), requests.exceptions.Timeout("timed out"), [{"id": "1"}]]
+        events = self.resilientCalendarService.getUpcomingEvents("calendarId")
+        self.assertEqual(events, [{"id": "1"}])
+        self.assertFalse(isStale(events))
+        self.assertEqual(self.calendarService.loadUpcomingEvents.call_count, 3)
+        firstDelay, secondDelay = [call.args[0] for call in self.sleep.call_args_list]
+        self.assertTrue(0 <= firstDelay <= 0.5)
+        self.assertTrue(0 <= secondDelay <= 1)
+
+    def test_last_good_result_is_served_stale_and_refreshed(self):
+        self.calendarService.loadUpcomingEvents.side_effect = [[{"id": "1"}], GoogleCalendarError("500", 500), GoogleCalendarError("500", 500),
+                                                               GoogleCalendarError("500", 500), [{"id": "2"}], [{"id": "3"}]]
+        self.resilientCalendarService.getUpcomingEvents("calendarId")
+        # the third failure opens the breaker
+        events = self.resilientCalendarService.getUpcomingEvents("calendarId")
+        self.assertEqual(events, [{"id": "1"}])
+        self.assertTrue(isStale(events))
+        self.assertEqual(self.circuitBreaker.getState(), OPEN)
+
+        self.waitForRefresh()
+        events = self.resilientCalendarService.getUpcomingEvents("calendarId")
+        self.assertTrue(isStale(events))
+        self.assertEqual(self.calendarService.loadUpcomingEvents.call_count, 4)
+
+        # once the reset timeout passed the background refresh makes the trial call
+        self.clock.now = 30
+        self.resilientCalendarService.getUpcomingEvents("calendarId")
+        self.waitForRefresh()
+        self.assertEqual(self.circuitBreaker.getState(), CLOSED)
+        events = self.resilientCalendarService.getUpcomingEvents("calendarId")
+        self.assertEqual(events, [{"id": "3"}])
+        self.assertFalse(isStale(events))
+
+    def test_local_copy_served_when_there_is_no_last_good_result(self):
+        self.calendarService.loadUpcomingEvents.side_effect = GoogleCalendarError("500", 500)
+        self.calendarService.getLocalUpcomingEvents.return_value = [{"id": "stored"}]
+        events = self.resilientCalendarService.getUpcomingEvents("calendarId")
+        self.assertEqual(events, [{"id": "stored"}])
+        self.assertTrue(isStale(events))
+
+    def test_unavailable_without_any_result(self):
+        self.calendarService.getCurrentEvent.side_effect = GoogleCalendarError("500", 500)
+        with self.assertRaises(CalendarUnavailableError):
+            self.resilientCalendarService.getCurrentEvent("calendarId", "eventId")
+        with self.assertRaises(CalendarUnavailableError):
+            self.resilientCalendarService.getCurrentEvent("calendarId", "eventId")
+        self.assertEqual(self.calendarService.getCurrentEvent.call_count, 3)
+
+    def test_writes_are_not_retried_and_fail_fast_while_open(self):
+        self.calendarService.setGoingToEvent.side_effect = GoogleCalendarError("500", 500)
+        for i in range(3):
+            with self.assertRaises(Exception):
+                self.resilientCalendarService.setGoingToEvent("calendarId", "eventId", "User A")
+        self.assertEqual(self.calendarService.setGoingToEvent.call_count, 3)
+
+        with self.assertRaises(CalendarUnavailableError):
+            self.resilientCalendarService.setGoingToEvent("calendarId", "eventId", "User A")
+        self.assertEqual(self.calendarService.setGoingToEvent.call_count, 3)
+        self.sleep.assert_not_called()
+
+    def test_client_errors_are_not_retried_or_counted(self):
+        self.calendarService.setGoingToEvent.side_effect = Exception("Event eventId of calendar calendarId no longer exists")
+        for i in range(5):
+            with self.assertRaisesRegex(Exception, "no longer exists"):
+                self.resilientCalendarService.setGoingToEvent("calendarId", "eventId", "User A")
+        self.assertEqual(self.circuitBreaker.getState(), CLOSED)
+
+        self.calendarService.getCurrentEvent.side_effect = GoogleCalendarError("403", 403)
+        with self.assertRaises(GoogleCalendarError):
+            self.resilientCalendarService.getCurrentEvent("calendarId", "eventId")
+        self.assertEqual(self.calendarService.getCurrentEvent.call_count, 1)
+        self.assertEqual(self.circuitBreaker.getState(), CLOSED)
+        self.sleep.assert_not_called()
+
+    def test_client_error_of_the_trial_call_lets_another_trial_through(self):
+        self.circuitBreaker.recordFailure()
+        self.circuitBreaker.recordFailure()
+        self.circuitBreaker.recordFailure()
+        self.clock.now = 30
+        self.calendarService.setGoingToEvent.side_effect = GoogleCalendarError("404", 404)
+        with self.assertRaises(GoogleCalendarError):
+            self.resilientCalendarService.setGoingToEvent("calendarId", "eventId", "User A")
+        self.assertTrue(self.circuitBreaker.allowRequest())
+
+    def test_other_calls_pass_through(self):
+        self.resilientCalendarService.refreshCalendar("calendarId")
+        self.calendarService.refreshCalendar.assert_called_once_with("calendarId")
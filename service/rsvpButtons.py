@@ -0,0 +1,70 @@
+import threading
+from collections import OrderedDict
+
+import telegram
+from service.googleCalendarService import _GOING, _NOT, _UNDECIDED
+from support.properties import RSVP_BUTTON_MAX_SHORT_KEYS
+
+CALLBACK_DATA_PATTERN = "^rsvp:"
+# Telegram rejects callback data longer than this
+_MAX_CALLBACK_DATA_BYTES = 64
+_SHORT_KEY_MARKER = "#"
+_STATUS_CODES = OrderedDict([("g", _GOING), ("n", _NOT), ("u", _UNDECIDED)])
+_STATUS_LABELS = {_GOING: "Going", _NOT: "Not", _UNDECIDED: "Undecided"}
+
+class RsvpButtons(object):
+    """Builds Going / Not / Undecided inline keyboards for events and reads their callback data back.
+
+    The callback data is "rsvp:<status>:<event id>". Event ids too long for Telegram's 64 bytes are
+    replaced by a short key, remembered for the maxShortKeys most recently listed events.
+    """
+
+    def __init__(self, maxShortKeys=RSVP_BUTTON_MAX_SHORT_KEYS):
+        self._maxShortKeys = maxShortKeys
+        self._shortKeys = OrderedDict()
+        self._eventIdKeys = {}
+        self._nextShortKey = 0
+        self._lock = threading.Lock()
+
+    def _get_short_key(self, eventId):
+        with self._lock:
+            shortKey = self._eventIdKeys.get(eventId)
+            if shortKey == None:
+                shortKey = _SHORT_KEY_MARKER + format(self._nextShortKey, "x")
+                self._nextShortKey += 1
+                self._eventIdKeys[eventId] = shortKey
+                self._shortKeys[shortKey] = eventId
+                while len(self._shortKeys) > self._maxShortKeys:
+                    del self._eventIdKeys[self._shortKeys.popitem(last=False)[1]]
+            self._shortKeys.move_to_end(shortKey)
+            return shortKey
+
+    def getCallbackData(self, eventId, status):
+        code = next(code for code, codeStatus in _STATUS_CODES.items() if codeStatus == status)
+        data = "rsvp:%s:%s" % (code, eventId)
+        if len(data.encode("utf-8")) > _MAX_CALLBACK_DATA_BYTES or eventId.startswith(_SHORT_KEY_MARKER):
+            data = "rsvp:%s:%s" % (code, self._get_short_key(eventId))
+        return data
+
+    def parseCallbackData(self, data):
+        """Returns (event id, status), None for data that is not an RSVP or whose short key was forgotten."""
+        parts = data.split(":", 2) if data != None else []
+        if len(parts) != 3 or parts[0] != "rsvp" or parts[1] not in _STATUS_CODES:
+            return None
+        eventId = parts[2]
+        if eventId.startswith(_SHORT_KEY_MARKER):
+            with self._lock:
+                eventId = self._shortKeys.get(eventId)
+            if eventId == None:
+                return None
+        return eventId, _STATUS_CODES[parts[1]]
+
+    def getKeyboard(self, eventIds, numbered=True):
+        """One row of buttons per event, labelled with the events' numbers in the listing when numbered."""
+        rows = []
+        for index, eventId in enumerate(eventIds):
+            prefix = "%d. " % (index + 1) if numbered else ""
+            rows.append([telegram.InlineKeyboardButton(prefix + _STATUS_LABELS[status],
+                                                       callback_data=self.getCallbackData(eventId, status))
+                         for status in _STATUS_CODES.values()])
+        return telegram.InlineKeyboardMarkup(rows)
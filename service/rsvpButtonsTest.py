@@ -0,0 +1,35 @@
+from service.rsvpButtons import RsvpButtons
+from service.googleCalendarService import _GOING, _NOT, _UNDECIDED
+import unittest
+
+class RsvpButtonsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rsvpButtons = RsvpButtons(maxShortKeys=2)
+
+    def test_event_id_is_carried_in_callback_data(self):
+        data = self.rsvpButtons.getCallbackData("eventId", _NOT)
+        self.assertEqual(data, "rsvp:n:eventId")
+        self.assertEqual(self.rsvpButtons.parseCallbackData(data), ("eventId", _NOT))
+
+    def test_long_event_ids_use_short_keys(self):
+        eventId = "_71338dhh8cqj8ba2690jab9k8h1k8b9o61336ba564p3ihi468skaca288_20191221T041500Z"
+        data = self.rsvpButtons.getCallbackData(eventId, _GOING)
+        self.assertLessEqual(len(data.encode("utf-8")), 64)
+        self.assertEqual(self.rsvpButtons.getCallbackData(eventId, _UNDECIDED), data.replace(":g:", ":u:"))
+        self.assertEqual(self.rsvpButtons.parseCallbackData(data), (eventId, _GOING))
+
+    def test_forgotten_short_keys_and_other_data_are_not_parsed(self):
+        data = self.rsvpButtons.getCallbackData("a" * 64, _GOING)
+        self.rsvpButtons.getCallbackData("b" * 64, _GOING)
+        self.rsvpButtons.getCallbackData("c" * 64, _GOING)
+        self.assertIsNone(self.rsvpButtons.parseCallbackData(data))
+        self.assertIsNone(self.rsvpButtons.parseCallbackData("rsvp:x:eventId"))
+        self.assertIsNone(self.rsvpButtons.parseCallbackData("other"))
+
+    def test_keyboard_has_a_row_per_event(self):
+        keyboard = self.rsvpButtons.getKeyboard(["1", "2"]).inline_keyboard
+        self.assertEqual([[button.text for button in row] for row in keyboard],
+                         [["1. Going", "1. Not", "1. Undecided"], ["2. Going", "2. Not", "2. Undecided"]])
+        self.assertEqual(keyboard[1][0].callback_data, "rsvp:g:2")
+        self.assertEqual(self.rsvpButtons.getKeyboard(["1"], numbered=False).inline_keyboard[0][0].text, "Going")
@@ -0,0 +1,81 @@
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+LOG = logging.getLogger(__name__)
+
+class _PendingWrite(object):
+    def __init__(self, event):
+        self.event = event
+        self.userStatuses = OrderedDict()
+        self.futures = []
+        self.timer = None
+
+class RsvpWriteBuffer(object):
+    """Collects status changes for an event for a short time and writes them to the calendar together."""
+
+    def __init__(self, calendarService, flushDelaySeconds, maxPendingPerEvent, maxConcurrentFlushes=4):
+        self._calendarService = calendarService
+        self._flushDelay = flushDelaySeconds
+        self._maxPending = maxPendingPerEvent
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flushExecutor = ThreadPoolExecutor(max_workers=maxConcurrentFlushes, thread_name_prefix="rsvp-flush")
+
+    def submit(self, calendarId, event, usersName, updatedStatus):
+        """Returns a Future that completes once the status has been written to the calendar."""
+        future = Future()
+        key = (calendarId, event["id"])
+        flushNow = False
+        with self._lock:
+            pendingWrite = self._pending.get(key)
+            if pendingWrite == None:
+                pendingWrite = _PendingWrite(event)
+                self._pending[key] = pendingWrite
+                pendingWrite.timer = threading.Timer(self._flushDelay, self._flush, args=(key, pendingWrite))
+                pendingWrite.timer.daemon = True
+                pendingWrite.timer.start()
+
+            # a later command from the same user replaces their earlier one
+            pendingWrite.userStatuses[usersName] = updatedStatus
+            pendingWrite.futures.append(future)
+            if len(pendingWrite.userStatuses) >= self._maxPending:
+                pendingWrite.timer.cancel()
+                flushNow = True
+
+        if flushNow:
+            self._flush(key, pendingWrite)
+        return future
+
+    def _flush(self, key, pendingWrite):
+        with self._lock:
+            if self._pending.get(key) is not pendingWrite:
+                # already flushed because it reached the size threshold
+                return
+            del self._pending[key]
+        self._flushExecutor.submit(self._write, key[0], key[1], pendingWrite)
+
+    def _write(self, calendarId, eventId, pendingWrite):
+        try:
+            self._calendarService.setUserStatusesForEvent(calendarId, eventId, pendingWrite.userStatuses, pendingWrite.event)
+        except Exception as e:
+            LOG.error(e)
+            for future in pendingWrite.futures:
+                future.set_exception(e)
+            return
+
+        LOG.info("Wrote %d status changes to event %s" % (len(pendingWrite.userStatuses), eventId))
+        for future in pendingWrite.futures:
+            future.set_result(None)
+
+    def flushAll(self):
+        with self._lock:
+            pending = list(self._pending.items())
+        for key, pendingWrite in pending:
+            pendingWrite.timer.cancel()
+            self._flush(key, pendingWrite)
+
+    def stop(self):
+        self.flushAll()
+        self._flushExecutor.shutdown(wait=True)
@@ -0,0 +1,52 @@
+from service.rsvpWriteBuffer import RsvpWriteBuffer
+from service.googleCalendarService import _GOING, _NOT
+import unittest
+from unittest import mock
+import threading
+
+class RsvpWriteBufferTest(unittest.TestCase):
+
+    def setUp(self):
+        self.calendarService = mock.MagicMock()
+        self.event = {"id": "eventId", "etag": "etag"}
+
+    def test_coalesces_statuses_until_deadline(self):
+        rsvpWriteBuffer = RsvpWriteBuffer(self.calendarService, 0.05, 10)
+        futures = [rsvpWriteBuffer.submit("calendarId", self.event, "first", _GOING),
+                   rsvpWriteBuffer.submit("calendarId", self.event, "second", _NOT),
+                   rsvpWriteBuffer.submit("calendarId", self.event, "first", _NOT)]
+        for future in futures:
+            self.assertIsNone(future.result(timeout=5))
+
+        self.calendarService.setUserStatusesForEvent.assert_called_once_with(
+            "calendarId", "eventId", {"first": _NOT, "second": _NOT}, self.event)
+        rsvpWriteBuffer.stop()
+
+    def test_flushes_when_size_threshold_is_reached(self):
+        rsvpWriteBuffer = RsvpWriteBuffer(self.calendarService, 60, 2)
+        first = rsvpWriteBuffer.submit("calendarId", self.event, "first", _GOING)
+        second = rsvpWriteBuffer.submit("calendarId", self.event, "second", _GOING)
+        second.result(timeout=5)
+        self.assertTrue(first.done())
+
+        third = rsvpWriteBuffer.submit("calendarId", self.event, "third", _GOING)
+        self.assertFalse(third.done())
+        rsvpWriteBuffer.stop()
+        self.assertTrue(third.done())
+        self.assertEqual(self.calendarService.setUserStatusesForEvent.call_count, 2)
+
+    def test_failed_write_fails_every_pending_status(self):
+        self.calendarService.setUserStatusesForEvent.side_effect = Exception("failed")
+        rsvpWriteBuffer = RsvpWriteBuffer(self.calendarService, 60, 2)
+        futures = [rsvpWriteBuffer.submit("calendarId", self.event, "first", _GOING),
+                   rsvpWriteBuffer.submit("calendarId", self.event, "second", _GOING)]
+        for future in futures:
+            self.assertIsNotNone(future.exception(timeout=5))
+        rsvpWriteBuffer.stop()
+
+    def test_events_are_buffered_separately(self):
+        rsvpWriteBuffer = RsvpWriteBuffer(self.calendarService, 60, 10)
+        rsvpWriteBuffer.submit("calendarId", self.event, "first", _GOING)
+        rsvpWriteBuffer.submit("calendarId", {"id": "otherEventId"}, "first", _GOING)
+        rsvpWriteBuffer.stop()
+        self.assertEqual(self.calendarService.setUserStatusesForEvent.call_count, 2)
@@ -0,0 +1,185 @@
+import json
+import sqlite3
+import threading
+from datetime import timezone
+
+from service.calendarMirror import _get_event_time
+
+_CANCELLED = "cancelled"
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    calendar_id TEXT NOT NULL,
+    event_id TEXT NOT NULL,
+    start_time TEXT,
+    end_time TEXT,
+    attendee_status TEXT,
+    event TEXT NOT NULL,
+    PRIMARY KEY (calendar_id, event_id)
+);
+CREATE INDEX IF NOT EXISTS events_by_start ON events (calendar_id, start_time);
+CREATE INDEX IF NOT EXISTS events_by_end ON events (calendar_id, end_time);
+CREATE TABLE IF NOT EXISTS sync_state (
+    calendar_id TEXT PRIMARY KEY,
+    sync_token TEXT
+);
+"""
+
+def _format_time(time):
+    # UTC at second precision, so the stored times sort and compare as text
+    return time.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ") if time != None else None
+
+class SqliteEventStore(object):
+    """Calendar events and sync tokens kept in one SQLite file, so they survive restarts and Google outages.
+
+    Events are indexed by calendar and by start and end time. attendeeStatusReader(event), when given,
+    fills the attendee_status column, e.g. with UserEventStatusService.getAttendeeStatusStringForEvent.
+    """
+
+    def __init__(self, path, attendeeStatusReader=None):
+        self._attendeeStatusReader = attendeeStatusReader
+        # one connection shared by every thread, serialised by the lock
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._calendars = {}
+        with self._lock, self._connection:
+            if path != ":memory:":
+                self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def getCalendar(self, calendarId):
+        """The calendar as a CalendarMirror backed by this store."""
+        with self._lock:
+            if calendarId not in self._calendars:
+                self._calendars[calendarId] = StoredCalendar(self, calendarId)
+            return self._calendars[calendarId]
+
+    def _to_row(self, calendarId, event):
+        attendeeStatus = self._attendeeStatusReader(event) if self._attendeeStatusReader != None else None
+        return (calendarId, event["id"], _format_time(_get_event_time(event, "start")),
+                _format_time(_get_event_time(event, "end")), attendeeStatus, json.dumps(event))
+
+    def _apply(self, calendarId, events):
+        removedIds = [(calendarId, event["id"]) for event in events if event.get("status") == _CANCELLED]
+        rows = [self._to_row(calendarId, event) for event in events if event.get("status") != _CANCELLED]
+        self._connection.executemany("DELETE FROM events WHERE calendar_id = ? AND event_id = ?", removedIds)
+        self._connection.executemany("INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    def _set_sync_token(self, calendarId, syncToken):
+        self._connection.execute("INSERT OR REPLACE INTO sync_state VALUES (?, ?)", (calendarId, syncToken))
+
+    def upsertEvents(self, calendarId, events, syncToken=None):
+        """Stores events, removing cancelled ones, and the sync token they were listed with when given."""
+        with self._lock, self._connection:
+            self._apply(calendarId, events)
+            if syncToken != None:
+                self._set_sync_token(calendarId, syncToken)
+
+    def replaceEvents(self, calendarId, events, syncToken):
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM events WHERE calendar_id = ?", (calendarId,))
+            self._apply(calendarId, events)
+            self._set_sync_token(calendarId, syncToken)
+
+    def replaceUpcomingEvents(self, calendarId, events, now, complete=True):
+        """Stores events as the calendar's upcoming events at now, e.g. a fresh events.list result.
+
+        Events that ended by now are pruned and stored upcoming events missing from events, e.g. deleted
+        ones, are removed. When the list was cut short (complete is False) only stored events starting
+        before its last event are replaced, since later ones may simply not have been listed.
+        """
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM events WHERE calendar_id = ? AND end_time <= ?",
+                                     (calendarId, _format_time(now)))
+            lastStart = _get_event_time(events[-1], "start") if not complete and len(events) > 0 else None
+            if lastStart != None:
+                self._connection.execute("DELETE FROM events WHERE calendar_id = ? AND start_time < ?",
+                                         (calendarId, _format_time(lastStart)))
+            elif complete:
+                self._connection.execute("DELETE FROM events WHERE calendar_id = ?", (calendarId,))
+            self._apply(calendarId, events)
+
+    def clear(self, calendarId):
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM events WHERE calendar_id = ?", (calendarId,))
+            self._connection.execute("DELETE FROM sync_state WHERE calendar_id = ?", (calendarId,))
+
+    def getSyncToken(self, calendarId):
+        with self._lock:
+            row = self._connection.execute("SELECT sync_token FROM sync_state WHERE calendar_id = ?",
+                                           (calendarId,)).fetchone()
+        return row[0] if row != None else None
+
+    def getEvent(self, calendarId, eventId):
+        with self._lock:
+            row = self._connection.execute("SELECT event FROM events WHERE calendar_id = ? AND event_id = ?",
+                                           (calendarId, eventId)).fetchone()
+        return json.loads(row[0]) if row != None else None
+
+    def getEvents(self, calendarId):
+        with self._lock:
+            rows = self._connection.execute("SELECT event FROM events WHERE calendar_id = ?", (calendarId,)).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def getUpcomingEvents(self, calendarId, now, maxResults):
+        """Events that have not ended at now, by start time, like events.list with orderBy=startTime."""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT event FROM events WHERE calendar_id = ? AND end_time > ? AND start_time IS NOT NULL "
+                "ORDER BY start_time LIMIT ?", (calendarId, _format_time(now), maxResults)).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def getAttendeeStatus(self, calendarId, eventId):
+        with self._lock:
+            row = self._connection.execute("SELECT attendee_status FROM events WHERE calendar_id = ? AND event_id = ?",
+                                           (calendarId, eventId)).fetchone()
+        return row[0] if row != None else None
+
+class StoredCalendar(object):
+    """CalendarMirror for one calendar of a SqliteEventStore.
+
+    The events and sync token are read from the store, only when the calendar was last synced is
+    kept in memory, so a restarted bot serves the stored events and syncs them incrementally.
+    """
+
+    def __init__(self, store, calendarId):
+        self.syncLock = threading.Lock()
+        self._store = store
+        self._calendarId = calendarId
+        self._lastSynced = None
+
+    def getSyncToken(self):
+        return self._store.getSyncToken(self._calendarId)
+
+    def isStale(self, now, maxAge):
+        return self._lastSynced == None or now - self._lastSynced >= maxAge
+
+    def markStale(self):
+        self._lastSynced = None
+
+    def replaceAll(self, events, syncToken, syncedAt):
+        self._store.replaceEvents(self._calendarId, events, syncToken)
+        self._lastSynced = syncedAt
+
+    def applyChanges(self, events, syncToken, syncedAt):
+        self._store.upsertEvents(self._calendarId, events, syncToken)
+        self._lastSynced = syncedAt
+
+    def upsert(self, event):
+        self._store.upsertEvents(self._calendarId, [event])
+
+    def clear(self):
+        self._store.clear(self._calendarId)
+        self._lastSynced = None
+
+    def getEvent(self, eventId):
+        return self._store.getEvent(self._calendarId, eventId)
+
+    def getEvents(self):
+        return self._store.getEvents(self._calendarId)
+
+    def getUpcomingEvents(self, now, maxResults):
+        return self._store.getUpcomingEvents(self._calendarId, now, maxResults)
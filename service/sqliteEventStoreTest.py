@@ -0,0 +1,89 @@
+from service.sqliteEventStore import SqliteEventStore
+from service.calendarMirror import CalendarMirror
+from service.userEventStatusService import UserEventStatusService
+import unittest
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+def createEvent(eventId, startsInHours, description="", status="confirmed"):
+    start = datetime.now(timezone.utc) + timedelta(hours=startsInHours)
+    return {
+        "id": eventId,
+        "status": status,
+        "summary": "Event %s" % eventId,
+        "description": description,
+        "start": {"dateTime": start.strftime("%Y-%m-%dT%H:%M:%S%z")},
+        "end": {"dateTime": (start + timedelta(hours=1)).strftime("%Y-%m-%dT%H:%M:%S%z")}
+    }
+
+class SqliteEventStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "events.db")
+        self.eventStore = SqliteEventStore(self.path)
+
+    def tearDown(self):
+        self.eventStore.close()
+
+    def test_upcoming_events_by_start_time(self):
+        self.eventStore.upsertEvents("calendarId", [createEvent("later", 5), createEvent("ended", -3),
+                                                    createEvent("soon", 1), createEvent("ongoing", -0.5)])
+        self.eventStore.upsertEvents("otherCalendarId", [createEvent("other", 2)])
+
+        upcoming = self.eventStore.getUpcomingEvents("calendarId", CalendarMirror.now(), 10)
+        self.assertEqual([event["id"] for event in upcoming], ["ongoing", "soon", "later"])
+        self.assertEqual(len(self.eventStore.getUpcomingEvents("calendarId", CalendarMirror.now(), 2)), 2)
+
+    def test_cancelled_events_are_removed(self):
+        self.eventStore.upsertEvents("calendarId", [createEvent("1", 1), createEvent("2", 2)])
+        self.eventStore.upsertEvents("calendarId", [{"id": "1", "status": "cancelled"}], "syncToken2")
+        self.assertEqual([event["id"] for event in self.eventStore.getEvents("calendarId")], ["2"])
+        self.assertEqual(self.eventStore.getSyncToken("calendarId"), "syncToken2")
+
+    def test_replace_and_clear(self):
+        self.eventStore.upsertEvents("calendarId", [createEvent("1", 1)])
+        self.eventStore.replaceEvents("calendarId", [createEvent("2", 1)], "syncToken1")
+        self.assertIsNone(self.eventStore.getEvent("calendarId", "1"))
+        self.assertEqual(self.eventStore.getEvent("calendarId", "2")["id"], "2")
+
+        self.eventStore.clear("calendarId")
+        self.assertEqual(self.eventStore.getEvents("calendarId"), [])
+        self.assertIsNone(self.eventStore.getSyncToken("calendarId"))
+
+    def test_replace_upcoming_events(self):
+        self.eventStore.upsertEvents("calendarId", [createEvent("ended", -3), createEvent("a", 1),
+                                                    createEvent("deleted", 2)])
+        self.eventStore.replaceUpcomingEvents("calendarId", [createEvent("a", 1)], CalendarMirror.now())
+        self.assertEqual([event["id"] for event in self.eventStore.getEvents("calendarId")], ["a"])
+
+        # events after the last one of a cut short list may still exist
+        self.eventStore.upsertEvents("calendarId", [createEvent("deleted", 2), createEvent("later", 5)])
+        self.eventStore.replaceUpcomingEvents("calendarId", [createEvent("a", 1), createEvent("b", 3)],
+                                              CalendarMirror.now(), complete=False)
+        upcoming = self.eventStore.getUpcomingEvents("calendarId", CalendarMirror.now(), 10)
+        self.assertEqual([event["id"] for event in upcoming], ["a", "b", "later"])
+
+    def test_survives_restart(self):
+        self.eventStore.getCalendar("calendarId").replaceAll([createEvent("1", 1)], "syncToken1", 0)
+        self.eventStore.close()
+
+        self.eventStore = SqliteEventStore(self.path)
+        storedCalendar = self.eventStore.getCalendar("calendarId")
+        self.assertEqual(storedCalendar.getSyncToken(), "syncToken1")
+        self.assertTrue(storedCalendar.isStale(0, 60))
+        self.assertEqual([event["id"] for event in storedCalendar.getUpcomingEvents(CalendarMirror.now(), 10)], ["1"])
+
+    def test_attendee_status_column(self):
+        userEventStatusService = UserEventStatusService()
+        self.eventStore.close()
+        self.eventStore = SqliteEventStore(self.path, userEventStatusService.getAttendeeStatusStringForEvent)
+        description = userEventStatusService.getUpdatedDescToUpdateUserStatus("", "User A", "is going to this event")
+        self.eventStore.upsertEvents("calendarId", [createEvent("1", 1, description)])
+        self.assertIn("User A", self.eventStore.getAttendeeStatus("calendarId", "1"))
+
+    def test_upcoming_query_uses_an_index(self):
+        plan = self.eventStore._connection.execute(
+            "EXPLAIN QUERY PLAN SELECT event FROM events WHERE calendar_id = ? AND end_time > ? "
+            "AND start_time IS NOT NULL ORDER BY start_time LIMIT ?", ("calendarId", "2020-01-01T00:00:00Z", 10)).fetchall()
+        self.assertIn("USING INDEX", " ".join(str(row) for row in plan))
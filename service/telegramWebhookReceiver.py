@@ -0,0 +1,31 @@
+import hmac
+import logging
+import queue
+
+import telegram
+
+LOG = logging.getLogger(__name__)
+
+class TelegramWebhookReceiver(object):
+    """Accepts updates POSTed by Telegram and hands them to the dispatcher's bounded update queue."""
+
+    def __init__(self, bot, updateQueue, secretPath):
+        self._bot = bot
+        self._updateQueue = updateQueue
+        self._secretPath = secretPath
+
+    def receive(self, secretPath, payload):
+        """Returns the HTTP status code to answer Telegram with."""
+        if not self._secretPath or not hmac.compare_digest(secretPath, self._secretPath):
+            return 404
+        if not isinstance(payload, dict):
+            return 400
+
+        update = telegram.Update.de_json(payload, self._bot)
+        try:
+            self._updateQueue.put_nowait(update)
+        except queue.Full:
+            # Telegram redelivers updates that were not acknowledged with a 2xx
+            LOG.info("Update queue is full, rejecting update %s" % update.update_id)
+            return 503
+        return 200
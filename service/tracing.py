@@ -0,0 +1,245 @@
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from support.properties import ENABLE_TRACING, TRACE_FILE, TRACE_COLLECTOR_URL
+
+LOG = logging.getLogger(__name__)
+_SERVICE_NAME = "TelegramCalendarBot"
+_STATUS_ERROR = 2
+_KIND_INTERNAL = 1
+
+def _to_attribute(key, value):
+    if isinstance(value, bool):
+        attributeValue = {"boolValue": value}
+    elif isinstance(value, int):
+        # OTLP JSON encodes 64 bit integers as strings
+        attributeValue = {"intValue": str(value)}
+    elif isinstance(value, float):
+        attributeValue = {"doubleValue": value}
+    else:
+        attributeValue = {"stringValue": str(value)}
+    return {"key": key, "value": attributeValue}
+
+def toOtlpJson(spans):
+    """Wraps finished spans in an OTLP/JSON ExportTraceServiceRequest."""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [_to_attribute("service.name", _SERVICE_NAME)]},
+            "scopeSpans": [{
+                "scope": {"name": __name__},
+                "spans": [span.toJson() for span in spans]
+            }]
+        }]
+    }
+
+class Span(object):
+    def __init__(self, tracer, name, traceId, parentSpanId, attributes):
+        self._tracer = tracer
+        self.name = name
+        self.traceId = traceId
+        self.spanId = os.urandom(8).hex()
+        self.parentSpanId = parentSpanId
+        # exported together with the other finished spans of its trace when it ends
+        self.exportsTrace = parentSpanId == None
+        self.attributes = dict(attributes)
+        self.error = None
+        self.startTime = None
+        self.endTime = None
+
+    def setAttribute(self, key, value):
+        self.attributes[key] = value
+
+    def __enter__(self):
+        self.startTime = time.time_ns()
+        self._tracer._push(self)
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.endTime = time.time_ns()
+        if excValue != None:
+            self.error = repr(excValue)
+        self._tracer._finish(self)
+        return False
+
+    def toJson(self):
+        span = {
+            "traceId": self.traceId,
+            "spanId": self.spanId,
+            "name": self.name,
+            "kind": _KIND_INTERNAL,
+            "startTimeUnixNano": str(self.startTime),
+            "endTimeUnixNano": str(self.endTime),
+            "attributes": [_to_attribute(key, value) for key, value in self.attributes.items()],
+            "status": {"code": _STATUS_ERROR, "message": self.error} if self.error != None else {}
+        }
+        if self.parentSpanId != None:
+            span["parentSpanId"] = self.parentSpanId
+        return span
+
+class _NullSpan(object):
+    def setAttribute(self, key, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+class _RemoteParent(object):
+    """Stands in on a worker thread for the span that was open where the work was handed over."""
+
+    def __init__(self, traceId, spanId):
+        self.traceId = traceId
+        self.spanId = spanId
+
+    def setAttribute(self, key, value):
+        pass
+
+class Tracer(object):
+    """Records nested spans per thread and exports each trace once its root span ends.
+
+    Spans started on a thread belong to the trace of the span already open on that thread, so an
+    update handled by one dispatcher thread ends up as one trace. Work handed to another thread
+    through wrap() continues that trace, its spans are exported once the outermost of them ends.
+    Without an exporter span() hands out a shared span that records nothing.
+    """
+
+    def __init__(self, exporter=None):
+        self.exporter = exporter
+        self._local = threading.local()
+        self._pendingSpans = {}
+        self._lock = threading.Lock()
+
+    def _get_stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def span(self, name, **attributes):
+        if self.exporter == None:
+            return _NULL_SPAN
+        stack = self._get_stack()
+        parent = stack[-1] if len(stack) > 0 else None
+        if parent == None:
+            return Span(self, name, os.urandom(16).hex(), None, attributes)
+        span = Span(self, name, parent.traceId, parent.spanId, attributes)
+        # the parent ends on another thread, possibly before this span does
+        span.exportsTrace = isinstance(parent, _RemoteParent)
+        return span
+
+    def wrap(self, function):
+        """Returns function continuing the trace of the span open on this thread, for running on another thread."""
+        parent = self.currentSpan()
+        if parent is _NULL_SPAN:
+            return function
+        remoteParent = _RemoteParent(parent.traceId, parent.spanId)
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            stack = self._get_stack()
+            stack.append(remoteParent)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                stack.pop()
+        return wrapper
+
+    def currentSpan(self):
+        stack = self._get_stack() if self.exporter != None else []
+        return stack[-1] if len(stack) > 0 else _NULL_SPAN
+
+    def _push(self, span):
+        self._get_stack().append(span)
+
+    def _finish(self, span):
+        stack = self._get_stack()
+        if len(stack) > 0 and stack[-1] is span:
+            stack.pop()
+        with self._lock:
+            spans = self._pendingSpans.setdefault(span.traceId, [])
+            spans.append(span)
+            if not span.exportsTrace:
+                return
+            del self._pendingSpans[span.traceId]
+        try:
+            self.exporter.export(spans)
+        except Exception as e:
+            LOG.error("Could not export trace %s: %s" % (span.traceId, e))
+
+def traced(name=None, tracer=None):
+    """Decorator running the function inside a span named after it."""
+    def decorator(function):
+        spanName = name if name != None else function.__qualname__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            activeTracer = tracer if tracer != None else TRACER
+            if activeTracer.exporter == None:
+                return function(*args, **kwargs)
+            with activeTracer.span(spanName):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def traceMethods(cls):
+    """Class decorator tracing every public method of cls.
+
+    Generators are left alone since their span would end before the caller reads from them.
+    """
+    for attributeName, attribute in list(vars(cls).items()):
+        if not attributeName.startswith("_") and callable(attribute) and not inspect.isgeneratorfunction(attribute):
+            setattr(cls, attributeName, traced()(attribute))
+    return cls
+
+class FileSpanExporter(object):
+    """Appends each trace to path as one line of OTLP/JSON."""
+
+    def __init__(self, path):
+        self._path = path
+        self._lock = threading.Lock()
+
+    def export(self, spans):
+        line = json.dumps(toOtlpJson(spans))
+        with self._lock:
+            with open(self._path, "a") as traceFile:
+                traceFile.write(line + "\n")
+
+class CollectorSpanExporter(object):
+    """Posts each trace to an OTLP/HTTP collector, e.g. http://localhost:4318/v1/traces, from a background thread."""
+
+    def __init__(self, url, timeout=5):
+        self._url = url
+        self._timeout = timeout
+        self._session = requests.Session()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="trace-export")
+
+    def export(self, spans):
+        self._executor.submit(self._post, toOtlpJson(spans))
+
+    def _post(self, body):
+        try:
+            response = self._session.post(self._url, json=body, timeout=self._timeout)
+            if not response.ok:
+                LOG.info("Collector rejected trace: %s" % response.text)
+        except Exception as e:
+            LOG.info("Could not send trace to collector: %s" % e)
+
+def _create_exporter():
+    if not ENABLE_TRACING:
+        return None
+    if TRACE_COLLECTOR_URL:
+        return CollectorSpanExporter(TRACE_COLLECTOR_URL)
+    return FileSpanExporter(TRACE_FILE)
+
+# shared by every module, enabled with ENABLE_TRACING
+TRACER = Tracer(_create_exporter())
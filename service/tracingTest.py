@@ -0,0 +1,117 @@
+from service.tracing import Tracer, FileSpanExporter, traced, traceMethods
+import unittest
+from unittest import mock
+import json
+import os
+import tempfile
+import threading
+
+class ListExporter(object):
+    def __init__(self):
+        self.traces = []
+
+    def export(self, spans):
+        self.traces.append(spans)
+
+class TracerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.exporter = ListExporter()
+        self.tracer = Tracer(self.exporter)
+
+    def test_nested_spans_are_exported_with_their_root(self):
+        with self.tracer.span("dispatch update", **{"telegram.update_id": 1}):
+            with self.tracer.span("google events.list") as span:
+                span.setAttribute("http.status_code", "200")
+            self.assertEqual(len(self.exporter.traces), 0)
+
+        self.assertEqual(len(self.exporter.traces), 1)
+        child, root = self.exporter.traces[0]
+        self.assertEqual(root.name, "dispatch update")
+        self.assertEqual(child.traceId, root.traceId)
+        self.assertEqual(child.parentSpanId, root.spanId)
+        self.assertIsNone(root.parentSpanId)
+        self.assertLessEqual(root.startTime, child.startTime)
+        self.assertLessEqual(child.endTime, root.endTime)
+
+    def test_wrapped_work_continues_the_trace_on_another_thread(self):
+        def write():
+            with self.tracer.span("google events.patch"):
+                pass
+
+        with self.tracer.span("dispatch update") as root:
+            wrapped = self.tracer.wrap(write)
+        thread = threading.Thread(target=wrapped)
+        thread.start()
+        thread.join()
+
+        self.assertEqual(len(self.exporter.traces), 2)
+        child, = self.exporter.traces[1]
+        self.assertEqual(child.traceId, root.traceId)
+        self.assertEqual(child.parentSpanId, root.spanId)
+        self.assertIs(self.tracer.wrap(write), write)
+
+    def test_separate_roots_get_separate_traces(self):
+        with self.tracer.span("first"):
+            pass
+        with self.tracer.span("second"):
+            pass
+        self.assertNotEqual(self.exporter.traces[0][0].traceId, self.exporter.traces[1][0].traceId)
+
+    def test_exception_marks_span_as_error(self):
+        with self.assertRaises(ValueError):
+            with self.tracer.span("failing"):
+                raise ValueError("failed")
+        spanJson = self.exporter.traces[0][0].toJson()
+        self.assertEqual(spanJson["status"]["code"], 2)
+        self.assertIn("failed", spanJson["status"]["message"])
+
+    def test_disabled_tracer_records_nothing(self):
+        tracer = Tracer()
+        with tracer.span("ignored") as span:
+            span.setAttribute("key", "value")
+        self.assertIs(tracer.currentSpan(), span)
+
+    def test_traced_methods(self):
+        @traceMethods
+        class Service(object):
+            def getEvents(self):
+                return "events"
+
+            def _private(self):
+                return "private"
+
+        with mock.patch("service.tracing.TRACER", self.tracer):
+            self.assertEqual(Service().getEvents(), "events")
+            self.assertEqual(Service()._private(), "private")
+        self.assertEqual([trace[0].name for trace in self.exporter.traces], ["TracerTest.test_traced_methods.<locals>.Service.getEvents"])
+
+    def test_traced_with_name(self):
+        @traced("work", tracer=self.tracer)
+        def work():
+            return 1
+
+        self.assertEqual(work(), 1)
+        self.assertEqual(self.exporter.traces[0][0].name, "work")
+
+class FileSpanExporterTest(unittest.TestCase):
+
+    def test_writes_otlp_json_lines(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, "traces.jsonl")
+        tracer = Tracer(FileSpanExporter(path))
+        with tracer.span("dispatch update", **{"telegram.update_id": 7, "bot.command": "details"}):
+            with tracer.span("format message"):
+                pass
+
+        with open(path) as traceFile:
+            lines = traceFile.readlines()
+        self.assertEqual(len(lines), 1)
+        resourceSpans = json.loads(lines[0])["resourceSpans"][0]
+        self.assertEqual(resourceSpans["resource"]["attributes"][0]["value"]["stringValue"], "TelegramCalendarBot")
+        spans = resourceSpans["scopeSpans"][0]["spans"]
+        self.assertEqual([span["name"] for span in spans], ["format message", "dispatch update"])
+        self.assertEqual(len(spans[1]["traceId"]), 32)
+        self.assertEqual(len(spans[1]["spanId"]), 16)
+        self.assertIn({"key": "telegram.update_id", "value": {"intValue": "7"}}, spans[1]["attributes"])
+        self.assertIn({"key": "bot.command", "value": {"stringValue": "details"}}, spans[1]["attributes"])
@@ -0,0 +1,78 @@
+import threading
+import time
+from collections import OrderedDict
+from service.memoryBudget import estimateSize
+
+class UpcomingEventsCache(object):
+    """Caches the upcoming events list per calendar for a limited amount of time."""
+
+    def __init__(self, ttlSeconds, maxSize, clock=time.monotonic, memoryBudget=None):
+        self._ttl = ttlSeconds
+        self._maxSize = maxSize
+        self._clock = clock
+        self._memoryBudget = memoryBudget
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, calendarId):
+        with self._lock:
+            entry = self._entries.get(calendarId)
+            if entry is not None and entry[0] > self._clock():
+                self._entries.move_to_end(calendarId)
+                self.hits += 1
+                if self._memoryBudget != None:
+                    self._memoryBudget.touch(self, calendarId)
+                return entry[1]
+
+            if entry is not None:
+                del self._entries[calendarId]
+                self._release(calendarId)
+            self.misses += 1
+            return None
+
+    def peek(self, calendarId):
+        """The cached events like get, without counting a hit or miss or keeping the entry in use."""
+        with self._lock:
+            entry = self._entries.get(calendarId)
+            return entry[1] if entry is not None and entry[0] > self._clock() else None
+
+    def put(self, calendarId, events):
+        if self._ttl <= 0 or self._maxSize <= 0:
+            return
+        with self._lock:
+            self._entries[calendarId] = (self._clock() + self._ttl, events)
+            self._entries.move_to_end(calendarId)
+            while len(self._entries) > self._maxSize:
+                self._release(self._entries.popitem(last=False)[0])
+        if self._memoryBudget != None:
+            self._memoryBudget.charge(self, calendarId, estimateSize(events))
+
+    def _release(self, calendarId):
+        if self._memoryBudget != None:
+            self._memoryBudget.release(self, calendarId)
+
+    def evict(self, calendarId):
+        """Called by the memory budget, which has already released the entry."""
+        with self._lock:
+            self._entries.pop(calendarId, None)
+
+    def invalidate(self, calendarId):
+        with self._lock:
+            if self._entries.pop(calendarId, None) != None:
+                self._release(calendarId)
+
+    def clear(self):
+        with self._lock:
+            for calendarId in self._entries:
+                self._release(calendarId)
+            self._entries.clear()
+
+    def getStats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries)
+            }
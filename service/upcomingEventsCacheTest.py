@@ -0,0 +1,43 @@
+from service.upcomingEventsCache import UpcomingEventsCache
+import unittest
+
+class UpcomingEventsCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0
+        self.cache = UpcomingEventsCache(10, 2, clock=lambda: self.now)
+
+    def test_hit_before_ttl_expires(self):
+        events = [{"id": "event"}]
+        self.assertIsNone(self.cache.get("calendarId"))
+        self.cache.put("calendarId", events)
+        self.now = 9
+        self.assertEqual(self.cache.get("calendarId"), events)
+        self.assertEqual(self.cache.getStats(), {"hits": 1, "misses": 1, "size": 1})
+
+    def test_miss_after_ttl_expires(self):
+        self.cache.put("calendarId", [])
+        self.now = 10
+        self.assertIsNone(self.cache.get("calendarId"))
+        self.assertEqual(self.cache.getStats(), {"hits": 0, "misses": 1, "size": 0})
+
+    def test_evicts_least_recently_used_calendar(self):
+        self.cache.put("first", [])
+        self.cache.put("second", [])
+        self.cache.get("first")
+        self.cache.put("third", [])
+        self.assertIsNone(self.cache.get("second"))
+        self.assertEqual(self.cache.get("first"), [])
+        self.assertEqual(self.cache.get("third"), [])
+
+    def test_invalidate(self):
+        self.cache.put("calendarId", [])
+        self.cache.put("otherCalendarId", [])
+        self.cache.invalidate("calendarId")
+        self.assertIsNone(self.cache.get("calendarId"))
+        self.assertEqual(self.cache.get("otherCalendarId"), [])
+
+    def test_disabled_when_ttl_is_zero(self):
+        cache = UpcomingEventsCache(0, 2)
+        cache.put("calendarId", [])
+        self.assertIsNone(cache.get("calendarId"))
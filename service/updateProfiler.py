@@ -0,0 +1,161 @@
+import cProfile
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+LOG = logging.getLogger(__name__)
+MODE_CPROFILE = "cprofile"
+MODE_SAMPLING = "sampling"
+_SUMMARY_LINES = 10
+
+class _StackSampler(object):
+    """Samples the stacks of the threads handling an update from within those threads.
+
+    A profile hook set on each profiled thread charges the time since its last sample to the thread's
+    current stack, at most every interval seconds. Unlike reading other threads' frames with
+    sys._current_frames from a sampler thread, this is safe to run alongside the garbage collector.
+    """
+
+    def __init__(self, interval):
+        self._interval = interval
+        self._lock = threading.Lock()
+        self._running = True
+        self.stacks = Counter()
+
+    def sample(self, function, *args):
+        """Returns function(*args), sampling this thread's stack while it runs."""
+        lastSampleAt = [time.perf_counter()]
+
+        def hook(frame, event, arg):
+            elapsed = time.perf_counter() - lastSampleAt[0]
+            if elapsed < self._interval or not self._running:
+                return
+            lastSampleAt[0] += elapsed
+            stack = []
+            while frame != None:
+                stack.append("%s (%s:%d)" % (frame.f_code.co_name, os.path.basename(frame.f_code.co_filename),
+                                             frame.f_code.co_firstlineno))
+                frame = frame.f_back
+            with self._lock:
+                self.stacks[";".join(reversed(stack))] += int(elapsed / self._interval)
+
+        previousHook = sys.getprofile()
+        sys.setprofile(hook)
+        try:
+            return function(*args)
+        finally:
+            sys.setprofile(previousHook)
+
+    def stop(self):
+        self._running = False
+
+class UpdateProfiler(object):
+    """Profiles the next updateCount updates with cProfile or a stack sampler and writes the result to outputDir.
+
+    cProfile results are written as .pstats files, sampled stacks in the folded format flame graph
+    tools read. onDone(path, summary) is called once the last update has been profiled.
+    """
+
+    def __init__(self, outputDir, sampleInterval=0.005):
+        self._outputDir = outputDir
+        self._sampleInterval = sampleInterval
+        self._lock = threading.Lock()
+        # cProfile can only follow one update at a time, sampled updates may run side by side
+        self._cProfileLock = threading.Lock()
+        self._remaining = 0
+        self._inFlight = 0
+        self._mode = None
+        self._profile = None
+        self._sampler = None
+        self._onDone = None
+
+    def start(self, updateCount, mode=MODE_CPROFILE, onDone=None):
+        if mode not in (MODE_CPROFILE, MODE_SAMPLING):
+            raise ValueError("Unknown profiling mode %s" % mode)
+        with self._lock:
+            if self._remaining > 0 or self._inFlight > 0:
+                return False
+            self._remaining = updateCount
+            self._mode = mode
+            self._onDone = onDone
+            if mode == MODE_CPROFILE:
+                self._profile = cProfile.Profile()
+            else:
+                self._sampler = _StackSampler(self._sampleInterval)
+        return True
+
+    def stop(self):
+        """Profiles no further updates, a profile is still written once the updates being profiled finish."""
+        with self._lock:
+            self._remaining = 0
+            if self._inFlight == 0:
+                self._profile = None
+                self._sampler = None
+                self._onDone = None
+
+    def isActive(self):
+        return self._remaining > 0
+
+    def profile(self, function, *args):
+        with self._lock:
+            profiled = self._remaining > 0
+            if profiled:
+                self._remaining -= 1
+                self._inFlight += 1
+                mode = self._mode
+        if not profiled:
+            return function(*args)
+
+        try:
+            if mode == MODE_CPROFILE:
+                with self._cProfileLock:
+                    return self._profile.runcall(function, *args)
+            return self._sampler.sample(function, *args)
+        finally:
+            with self._lock:
+                self._inFlight -= 1
+                finished = self._remaining == 0 and self._inFlight == 0
+            if finished:
+                self._finish()
+
+    def _finish(self):
+        os.makedirs(self._outputDir, exist_ok=True)
+        name = os.path.join(self._outputDir, "profile-%s" % datetime.now().strftime("%Y%m%d-%H%M%S"))
+        if self._mode == MODE_CPROFILE:
+            path = name + ".pstats"
+            self._profile.dump_stats(path)
+            summary = self._summarize_profile(pstats.Stats(self._profile))
+        else:
+            self._sampler.stop()
+            path = name + ".folded"
+            with open(path, "w+") as foldedFile:
+                for stack, count in self._sampler.stacks.items():
+                    foldedFile.write("%s %d\n" % (stack, count))
+            summary = self._summarize_samples(self._sampler.stacks)
+        LOG.info("Wrote profile to %s" % path)
+
+        with self._lock:
+            onDone = self._onDone
+            self._profile = None
+            self._sampler = None
+            self._onDone = None
+        if onDone != None:
+            onDone(path, summary)
+
+    def _summarize_profile(self, stats):
+        # stats maps (file, line, function) to (calls, primitive calls, own time, cumulative time, callers)
+        slowest = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:_SUMMARY_LINES]
+        return "\n".join("%.3fs %s (%s:%d)" % (timing[3], function, os.path.basename(fileName), line)
+                         for (fileName, line, function), timing in slowest)
+
+    def _summarize_samples(self, stacks):
+        # the frames samples most often ended in
+        leaves = Counter()
+        for stack, count in stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        return "\n".join("%d samples %s" % (count, leaf) for leaf, count in leaves.most_common(_SUMMARY_LINES))
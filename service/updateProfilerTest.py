@@ -0,0 +1,62 @@
+from service.updateProfiler import UpdateProfiler, MODE_SAMPLING
+import unittest
+from unittest import mock
+import os
+import pstats
+import sys
+import tempfile
+import time
+
+def slowUpdate(seconds):
+    time.sleep(seconds)
+    return "handled"
+
+class UpdateProfilerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.outputDir = os.path.join(tempfile.mkdtemp(), "profiles")
+        self.onDone = mock.MagicMock()
+        self.updateProfiler = UpdateProfiler(self.outputDir, sampleInterval=0.001)
+
+    def tearDown(self):
+        self.updateProfiler.stop()
+
+    def test_cprofile_next_updates(self):
+        self.assertTrue(self.updateProfiler.start(2, onDone=self.onDone))
+        self.assertFalse(self.updateProfiler.start(2))
+
+        self.assertEqual(self.updateProfiler.profile(slowUpdate, 0), "handled")
+        self.onDone.assert_not_called()
+        self.assertEqual(self.updateProfiler.profile(slowUpdate, 0), "handled")
+
+        self.assertFalse(self.updateProfiler.isActive())
+        path, summary = self.onDone.call_args.args
+        self.assertTrue(path.endswith(".pstats"))
+        self.assertIn("slowUpdate", summary)
+        functions = [function for fileName, line, function in pstats.Stats(path).stats]
+        self.assertIn("slowUpdate", functions)
+
+    def test_sampling(self):
+        self.updateProfiler.start(1, MODE_SAMPLING, self.onDone)
+        self.updateProfiler.profile(slowUpdate, 0.05)
+
+        path, summary = self.onDone.call_args.args
+        self.assertTrue(path.endswith(".folded"))
+        with open(path) as foldedFile:
+            self.assertIn("slowUpdate", foldedFile.read())
+
+    def test_stop(self):
+        self.updateProfiler.start(2, MODE_SAMPLING, self.onDone)
+        self.updateProfiler.stop()
+        self.assertFalse(self.updateProfiler.isActive())
+        self.assertEqual(self.updateProfiler.profile(slowUpdate, 0), "handled")
+        self.onDone.assert_not_called()
+        self.assertIsNone(sys.getprofile())
+
+    def test_not_profiled_when_inactive(self):
+        self.assertEqual(self.updateProfiler.profile(slowUpdate, 0), "handled")
+        self.assertFalse(os.path.exists(self.outputDir))
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            self.updateProfiler.start(1, "unknown")
@@ -5,28 +5,34 @@ class UserEventStatusService(object):
     def _get_attendees_info(self, existingAttendeesStr):
         return existingAttendeesStr.splitlines()
 
-    def _update_user_for_event(self, usersName, attendeeLines, updatedStatus):
+    def _update_users_for_event(self, userStatuses, attendeeLines):
         updatedAttendeeLines = []
-        userFound = False
+        usersFound = set()
         for attendeeLine in attendeeLines:
-            if attendeeLine.split(_HIDDEN_CHAR)[0] == usersName:
-                updatedAttendeeLines.append("%s%c%s" % (usersName, _HIDDEN_CHAR, updatedStatus))
-                userFound = True
+            usersName = attendeeLine.split(_HIDDEN_CHAR)[0]
+            if usersName in userStatuses:
+                updatedAttendeeLines.append("%s%c%s" % (usersName, _HIDDEN_CHAR, userStatuses[usersName]))
+                usersFound.add(usersName)
             else:
                 updatedAttendeeLines.append(attendeeLine)
 
-        if not userFound:
-            updatedAttendeeLines.append("%s%c%s" % (usersName, _HIDDEN_CHAR, updatedStatus))
+        for usersName, updatedStatus in userStatuses.items():
+            if usersName not in usersFound:
+                updatedAttendeeLines.append("%s%c%s" % (usersName, _HIDDEN_CHAR, updatedStatus))
 
         return updatedAttendeeLines
-        
+
     def getUpdatedDescToUpdateUserStatus(self, formattedExistingDesc, usersName, updatedStatus):
+        return self.getUpdatedDescToUpdateUserStatuses(formattedExistingDesc, {usersName: updatedStatus})
+
+    def getUpdatedDescToUpdateUserStatuses(self, formattedExistingDesc, userStatuses):
+        """userStatuses maps each user's name to their new status, new users are added in iteration order."""
         attendeeLines = []
         startAttendeeInfo = formattedExistingDesc.find(_START_OF_ATTENDEE_INFO)
         if startAttendeeInfo != -1:
             attendeeLines = self._get_attendees_info(formattedExistingDesc[startAttendeeInfo+len(_START_OF_ATTENDEE_INFO):])
 
-        updatedAttendeeLines = self._update_user_for_event(usersName, attendeeLines, updatedStatus)
+        updatedAttendeeLines = self._update_users_for_event(userStatuses, attendeeLines)
 
         description = self.getDescriptionFromFormattedDescription(formattedExistingDesc, startAttendeeInfo=startAttendeeInfo) \
              if startAttendeeInfo != -1 else formattedExistingDesc
@@ -41,3 +47,16 @@ class UserEventStatusService(object):
         if startAttendeeInfo == None:
             startAttendeeInfo = formattedExistingDesc.find(_START_OF_ATTENDEE_INFO)
         return formattedExistingDesc[0:startAttendeeInfo] if startAttendeeInfo != -1 else formattedExistingDesc
+
+    def _get_event_description(self, event):
+        return event["description"] if "description" in event else ""
+
+    def getEventUpdateForUserStatuses(self, event, userStatuses):
+        """Returns the fields to PATCH on the event to store the users' new statuses."""
+        return {"description": self.getUpdatedDescToUpdateUserStatuses(self._get_event_description(event), userStatuses)}
+
+    def getDescriptionForEvent(self, event):
+        return self.getDescriptionFromFormattedDescription(self._get_event_description(event))
+
+    def getAttendeeStatusStringForEvent(self, event):
+        return self.getAttendeeStatusString(self._get_event_description(event))
@@ -4,9 +4,73 @@ import os
 BOT_TOKEN = os.environ.get('BOT_TOKEN')
 CALENDER_ID = os.environ.get('CALENDAR_ID')
 SCOPE = 'https://www.googleapis.com/auth/calendar.events'
+GOOGLE_CALENDAR_API_URL = os.environ.get('GOOGLE_CALENDAR_API_URL', 'https://www.googleapis.com/calendar/v3')
 TOKEN_FILE = 'token.json'
 CLIENT_SECRET_FILE = 'client_secret.json'
 LOG_LEVEL=INFO
 LOG_DATE_FORMAT='%m-%d-%y %H:%M:%S'
 LOG_FORMAT='[%(asctime)s] p%(process)s:%(thread)d {%(filename)s::%(funcName)s:%(lineno)d} %(levelname)s - %(message)s'
 ENABLE_FLASK_SERVER = os.environ.get('ENABLE_FLASK_SERVER', 'False').upper() == 'TRUE'
+UPCOMING_EVENTS_CACHE_TTL = int(os.environ.get('UPCOMING_EVENTS_CACHE_TTL', '30'))
+UPCOMING_EVENTS_CACHE_MAX_SIZE = int(os.environ.get('UPCOMING_EVENTS_CACHE_MAX_SIZE', '16'))
+ENABLE_CALENDAR_SYNC = os.environ.get('ENABLE_CALENDAR_SYNC', 'False').upper() == 'TRUE'
+CALENDAR_SYNC_INTERVAL = int(os.environ.get('CALENDAR_SYNC_INTERVAL', '60'))
+CALENDAR_WATCH_ADDRESS = os.environ.get('CALENDAR_WATCH_ADDRESS')
+CALENDAR_WATCH_TOKEN = os.environ.get('CALENDAR_WATCH_TOKEN')
+CALENDAR_WATCH_TTL = int(os.environ.get('CALENDAR_WATCH_TTL', '604800'))
+CALENDAR_WATCH_RENEW_BEFORE = int(os.environ.get('CALENDAR_WATCH_RENEW_BEFORE', '3600'))
+TELEGRAM_DELIVERY_MODE = os.environ.get('TELEGRAM_DELIVERY_MODE', 'polling').lower()
+TELEGRAM_WEBHOOK_URL = os.environ.get('TELEGRAM_WEBHOOK_URL')
+TELEGRAM_WEBHOOK_SECRET = os.environ.get('TELEGRAM_WEBHOOK_SECRET')
+TELEGRAM_UPDATE_QUEUE_SIZE = int(os.environ.get('TELEGRAM_UPDATE_QUEUE_SIZE', '100'))
+ENABLE_ASYNC_CALENDAR_CLIENT = os.environ.get('ENABLE_ASYNC_CALENDAR_CLIENT', 'False').upper() == 'TRUE'
+CALENDAR_MAX_CONNECTIONS = int(os.environ.get('CALENDAR_MAX_CONNECTIONS', '100'))
+CALENDAR_MAX_CONNECTIONS_PER_HOST = int(os.environ.get('CALENDAR_MAX_CONNECTIONS_PER_HOST', '10'))
+RSVP_WRITE_BUFFER_DELAY = float(os.environ.get('RSVP_WRITE_BUFFER_DELAY', '0'))
+RSVP_WRITE_BUFFER_MAX_PENDING = int(os.environ.get('RSVP_WRITE_BUFFER_MAX_PENDING', '20'))
+ATTENDEE_STATUS_STORE = os.environ.get('ATTENDEE_STATUS_STORE', 'description')
+RENDER_ATTENDEE_SUMMARY_IN_DESCRIPTION = os.environ.get('RENDER_ATTENDEE_SUMMARY_IN_DESCRIPTION', 'False').upper() == 'TRUE'
+RENDERED_MESSAGE_CACHE_SIZE = int(os.environ.get('RENDERED_MESSAGE_CACHE_SIZE', '256'))
+# base url of the Bot API, the bot token is appended to it
+TELEGRAM_API_URL = os.environ.get('TELEGRAM_API_URL', 'https://api.telegram.org/bot')
+ENABLE_OUTBOUND_MESSAGE_QUEUE = os.environ.get('ENABLE_OUTBOUND_MESSAGE_QUEUE', 'True').upper() == 'TRUE'
+TELEGRAM_MESSAGES_PER_SECOND = float(os.environ.get('TELEGRAM_MESSAGES_PER_SECOND', '30'))
+TELEGRAM_CHAT_MESSAGES_PER_SECOND = float(os.environ.get('TELEGRAM_CHAT_MESSAGES_PER_SECOND', '1'))
+TELEGRAM_CHAT_MESSAGE_BURST = int(os.environ.get('TELEGRAM_CHAT_MESSAGE_BURST', '3'))
+TELEGRAM_GROUP_MESSAGES_PER_MINUTE = int(os.environ.get('TELEGRAM_GROUP_MESSAGES_PER_MINUTE', '20'))
+TELEGRAM_SEND_MAX_RETRIES = int(os.environ.get('TELEGRAM_SEND_MAX_RETRIES', '3'))
+CHAT_CALENDARS = os.environ.get('CHAT_CALENDARS')
+CHAT_CALENDARS_FILE = os.environ.get('CHAT_CALENDARS_FILE', 'chat_calendars.json')
+ADMIN_USER_IDS = [int(userId) for userId in os.environ.get('ADMIN_USER_IDS', '').split(',') if userId.strip()]
+CACHE_MEMORY_BUDGET_MB = float(os.environ.get('CACHE_MEMORY_BUDGET_MB', '32'))
+ENABLE_METRICS = os.environ.get('ENABLE_METRICS', 'False').upper() == 'TRUE'
+ENABLE_TRACING = os.environ.get('ENABLE_TRACING', 'False').upper() == 'TRUE'
+TRACE_FILE = os.environ.get('TRACE_FILE', 'traces.jsonl')
+# OTLP/HTTP endpoint traces are posted to instead of TRACE_FILE, e.g. http://localhost:4318/v1/traces
+TRACE_COLLECTOR_URL = os.environ.get('TRACE_COLLECTOR_URL')
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+EVENT_LIST_PAGE_SIZE = int(os.environ.get('EVENT_LIST_PAGE_SIZE', '250'))
+# only request the event fields the bot uses, gzipped, from the Calendar API
+MINIMAL_PAYLOADS = os.environ.get('MINIMAL_PAYLOADS', 'False').upper() == 'TRUE'
+LOG_PAYLOAD_MAX_CHARS = int(os.environ.get('LOG_PAYLOAD_MAX_CHARS', '1000'))
+# refresh the Google access token from a background thread this many seconds before it expires
+PROACTIVE_TOKEN_REFRESH = os.environ.get('PROACTIVE_TOKEN_REFRESH', 'True').upper() == 'TRUE'
+TOKEN_REFRESH_MARGIN = int(os.environ.get('TOKEN_REFRESH_MARGIN', '300'))
+# SQLite file keeping the calendars' events between restarts, empty to keep them in memory only
+EVENT_STORE_FILE = os.environ.get('EVENT_STORE_FILE', 'events.db')
+# seconds a Google request may wait to connect or for the next bytes of the response
+GOOGLE_REQUEST_TIMEOUT = float(os.environ.get('GOOGLE_REQUEST_TIMEOUT', '10'))
+CALENDAR_READ_RETRIES = int(os.environ.get('CALENDAR_READ_RETRIES', '2'))
+CALENDAR_RETRY_BASE_DELAY = float(os.environ.get('CALENDAR_RETRY_BASE_DELAY', '0.5'))
+# consecutive failed Google calls that open the circuit breaker, 0 to call Google without one
+CIRCUIT_BREAKER_FAILURES = int(os.environ.get('CIRCUIT_BREAKER_FAILURES', '5'))
+CIRCUIT_BREAKER_RESET_TIMEOUT = float(os.environ.get('CIRCUIT_BREAKER_RESET_TIMEOUT', '30'))
+# worker threads running the bot commands' calendar calls, 0 to run them on the dispatcher thread
+CALENDAR_IO_WORKERS = int(os.environ.get('CALENDAR_IO_WORKERS', '8'))
+CALENDAR_IO_MAX_PENDING = int(os.environ.get('CALENDAR_IO_MAX_PENDING', '100'))
+# seconds numbered commands keep referring to the /upcoming listing last shown in a chat, 0 to always list again
+LISTING_SNAPSHOT_TTL = int(os.environ.get('LISTING_SNAPSHOT_TTL', '600'))
+LISTING_SNAPSHOT_MAX_CHATS = int(os.environ.get('LISTING_SNAPSHOT_MAX_CHATS', '1000'))
+# attach Going / Not / Undecided buttons to /upcoming and /details
+ENABLE_RSVP_BUTTONS = os.environ.get('ENABLE_RSVP_BUTTONS', 'True').upper() == 'TRUE'
+RSVP_BUTTON_MAX_SHORT_KEYS = int(os.environ.get('RSVP_BUTTON_MAX_SHORT_KEYS', '1000'))